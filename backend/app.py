@@ -3,21 +3,41 @@ Simple FastAPI backend for Doomscroll Detox
 Basic API to log extension events
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Annotated, Tuple
 import sqlite3
 import hashlib
 import json
 from collections import defaultdict
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 import os
-import threading
+import asyncio
+import functools
+import zlib
+import db
 import time
-from services.ml import classify_content
+from urllib.parse import urlparse
+from services.ml import BACKENDS, InferenceExecutor, InferenceUnavailable, registry as classifier_registry, result_cache
+from services.ingest import (
+    GzipTrailingData,
+    IngestQueue,
+    IngestQueueClosed,
+    IngestQueueFull,
+    ML_COLUMNS,
+    insert_columnar_events,
+    insert_events,
+    iter_ndjson_lines,
+    utc_now,
+    write_event_rows,
+)
+from services.batching import MicroBatcher
+from services.cache import TTLCache
+from services.retention import RetentionJob
+from services.rollup import RollupJob, day_cutoff, facts_cte
 
 # FastAPI app
 app = FastAPI(
@@ -36,8 +56,11 @@ app.add_middleware(
 )
 
 # Pydantic models
+EventId = Annotated[str, Field(max_length=64)]  # client-generated, used to drop retried events
+
 class EventData(BaseModel):
     user_id: str
+    event_id: Optional[EventId] = None
     event_type: str  # page_view, scroll, focus_alert, content_analysis, etc.
     domain: str
     url: Optional[str] = None
@@ -53,6 +76,37 @@ class EventData(BaseModel):
 class EventBatch(BaseModel):
     events: List[EventData]
 
+class ColumnarEventBatch(BaseModel):
+    """Struct-of-arrays batch: shared fields once, per-event fields as parallel arrays.
+
+    Every per-event array must have the same length as event_type. Optional arrays
+    may be omitted entirely when no event in the batch carries that field.
+    """
+    # Shared by every event in the batch
+    user_id: str
+    extension_version: Optional[str] = None
+    browser: Optional[str] = None
+    # Per-event columns
+    event_type: List[str]
+    domain: List[str]
+    event_id: Optional[List[Optional[EventId]]] = None
+    url: Optional[List[Optional[str]]] = None
+    duration: Optional[List[Optional[int]]] = None
+    snippet_opt_in: Optional[List[Optional[int]]] = None
+    snippet_text: Optional[List[Optional[str]]] = None
+    behavior_json: Optional[List[Optional[Dict[str, Any]]]] = None
+    vision_json: Optional[List[Optional[Dict[str, Any]]]] = None
+
+    @model_validator(mode="after")
+    def check_column_lengths(self):
+        size = len(self.event_type)
+        for name in ("domain", "event_id", "url", "duration", "snippet_opt_in",
+                     "snippet_text", "behavior_json", "vision_json"):
+            column = getattr(self, name)
+            if column is not None and len(column) != size:
+                raise ValueError(f"column '{name}' has {len(column)} values, expected {size}")
+        return self
+
 class UserSettings(BaseModel):
     user_id: str
     daily_limit: int = 30
@@ -83,8 +137,23 @@ class MLAnalyzeResponse(BaseModel):
     model_version: str
     timestamp: float
 
+# Largest batch accepted by /api/v1/ml/analyze_batch
+ML_MAX_BATCH_ITEMS = int(os.getenv("ML_MAX_BATCH_ITEMS", "64"))
+
+class MLAnalyzeBatchRequest(BaseModel):
+    items: List[MLAnalyzeRequest] = Field(..., max_length=ML_MAX_BATCH_ITEMS)
+
+class MLAnalyzeBatchResponse(BaseModel):
+    results: List[MLAnalyzeResponse]  # same order as the request items
+
+class MLModelReloadRequest(BaseModel):
+    backend: Optional[str] = None  # default: the configured ML_BACKEND
+    # Omitted: the configured path for the same backend, none for another; null clears it
+    model_path: Optional[str] = None
+
 class MLAnalyzeAndLogRequest(MLAnalyzeRequest):
     user_id: str
+    event_id: Optional[str] = Field(None, max_length=64)
     event_type: Optional[str] = "content_analysis"
     domain: Optional[str] = None
     extension_version: Optional[str] = None
@@ -92,98 +161,132 @@ class MLAnalyzeAndLogRequest(MLAnalyzeRequest):
 
 class MLAnalyzeAndLogResponse(MLAnalyzeResponse):
     persisted: bool
+    duplicate: Optional[bool] = None  # True when event_id was already stored
 
 
 # Database helper
 def get_db():
-    return sqlite3.connect("doomscroll_detox.db")
+    """Pooled connection for the calling thread; never close it"""
+    return db.get_connection()
+
+# --- Write-behind ingestion queue ---
+# "commit": respond once the group transaction holding the write has committed
+# "enqueue": respond as soon as the write is queued (fire-and-forget)
+INGEST_ACK_MODE = os.getenv("INGEST_ACK_MODE", "commit")
+
+ingest_queue = IngestQueue(
+    connect=lambda: db.connect(isolation_level=None),
+    max_batch=int(os.getenv("INGEST_MAX_BATCH", "256")),
+    max_linger_ms=float(os.getenv("INGEST_MAX_LINGER_MS", "5")),
+    max_size=int(os.getenv("INGEST_QUEUE_SIZE", "10000")),
+    retry_after=int(os.getenv("INGEST_RETRY_AFTER", "1")),
+    shards=db.shards,
+    activity_flush_seconds=float(os.getenv("INGEST_ACTIVITY_FLUSH_SECONDS", "5")),
+)
+
+# Classification is CPU work: keep it off the event loop on a small bounded pool.
+# ML_EXECUTOR: inline (event loop), thread, or process (one classifier per worker process)
+ML_WORKERS = int(os.getenv("ML_WORKERS", "2"))
+ml_executor = InferenceExecutor(
+    result_cache,
+    mode=os.getenv("ML_EXECUTOR", "thread"),
+    workers=ML_WORKERS,
+    max_pending=int(os.getenv("ML_MAX_PENDING", "64")),
+    timeout_seconds=float(os.getenv("ML_TIMEOUT_SECONDS", "2")),
+    fallback_max_items=int(os.getenv("ML_FALLBACK_MAX_ITEMS", "8")),
+)
+
+async def run_classifier_batch(payloads: List[Dict[str, Any]],
+                               request_items: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Classify on ml_executor; a saturated executor becomes 503 with Retry-After."""
+    try:
+        return await ml_executor.classify(payloads, request_items)
+    except InferenceUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+# Single-text requests arriving while the classifier is busy are scored together; each
+# is still its own request for the fallback cap, so a coalesced batch degrades, never 503s
+ml_batcher = MicroBatcher(
+    functools.partial(run_classifier_batch, request_items=1),
+    max_batch=int(os.getenv("ML_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("ML_BATCH_MAX_WAIT_MS", "2")),
+    max_inflight=ML_WORKERS if ml_executor.mode != "inline" else 1,
+)
+
+async def run_classifier(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await ml_batcher.submit(payload)
+
+async def enqueue_write(job, wait: Optional[bool] = None):
+    """Hand a write job to the ingest writer.
+
+    Maps a full queue to 429 and a stopped writer to 503, both with Retry-After.
+    Returns the job result when waiting for commit, otherwise None.
+    """
+    try:
+        future = ingest_queue.submit(job)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except IngestQueueClosed as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if wait is None:
+        wait = INGEST_ACK_MODE != "enqueue"
+    if not wait:
+        return None
+    return await asyncio.wrap_future(future)
 
 def hash_user_id(user_id: str) -> str:
     return hashlib.sha256(user_id.encode()).hexdigest()
 
+# Shutdown waits this long for a running rollup or retention pass before closing the pools
+JOB_STOP_TIMEOUT_SECONDS = float(os.getenv("JOB_STOP_TIMEOUT_SECONDS", "30"))
+
 # --- Periodic Rollup Job (every 30 minutes) ---
-SECONDS_PER_ANALYSIS = 30
+rollup_job = RollupJob(
+    get_connection=db.get_connection,
+    interval_seconds=int(os.getenv("ROLLUP_INTERVAL_SECONDS", "1800")),
+    chunk_size=int(os.getenv("ROLLUP_CHUNK_SIZE", "5000")),
+    shards=db.shards,
+)
 
-def _compute_sentiment_seconds(days: int = 2):
-    """Compute doom/neutral/positive seconds per (user_id, date) from usage_events.
-    Overwrites daily_stats for those days to avoid double counting.
-    """
-    conn = get_db()
-    cursor = conn.cursor()
-    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-    cursor.execute(
-        """
-        SELECT user_id, timestamp, behavior_json
-        FROM usage_events
-        WHERE event_type = 'content_analysis' AND timestamp >= ?
-        """,
-        (cutoff,)
-    )
-    rows = cursor.fetchall()
-    # Aggregate in Python to avoid requiring SQLite JSON1 extension
-    aggregates: Dict[tuple, Dict[str, int]] = {}
-    for user_id, ts, behavior in rows:
-        try:
-            sent = None
-            if behavior:
-                data = json.loads(behavior)
-                sent = str(data.get("sentiment")) if isinstance(data, dict) else None
-            date_key = datetime.fromisoformat(ts).date().isoformat() if ts else datetime.now().date().isoformat()
-            key = (user_id, date_key)
-            if key not in aggregates:
-                aggregates[key] = {"doom": 0, "neutral": 0, "positive": 0}
-            if sent == "negative":
-                aggregates[key]["doom"] += SECONDS_PER_ANALYSIS
-            elif sent == "neutral":
-                aggregates[key]["neutral"] += SECONDS_PER_ANALYSIS
-            elif sent == "positive":
-                aggregates[key]["positive"] += SECONDS_PER_ANALYSIS
-        except Exception:
-            continue
-
-    # Upsert: set values to computed seconds for exactness
-    for (user_id, date_str), vals in aggregates.items():
-        cursor.execute(
-            """
-            INSERT INTO daily_stats (user_id, date, doom_seconds, neutral_seconds, positive_seconds)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(user_id, date) DO UPDATE SET
-              doom_seconds=excluded.doom_seconds,
-              neutral_seconds=excluded.neutral_seconds,
-              positive_seconds=excluded.positive_seconds
-            """,
-            (
-                user_id,
-                # Store full datetime at midnight
-                datetime.fromisoformat(date_str + "T00:00:00").isoformat(),
-                int(vals.get("doom", 0)),
-                int(vals.get("neutral", 0)),
-                int(vals.get("positive", 0)),
-            ),
-        )
-    conn.commit()
-    conn.close()
+# --- Retention (raw events and snippet text; rollups are kept) ---
+retention_job = RetentionJob(
+    get_connection=db.get_connection,
+    event_days=int(os.getenv("RETENTION_EVENT_DAYS", "90")),
+    snippet_days=int(os.getenv("RETENTION_SNIPPET_DAYS", "30")),
+    interval_seconds=int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600")),
+    batch_size=int(os.getenv("RETENTION_BATCH_SIZE", "1000")),
+    pause_ms=int(os.getenv("RETENTION_BATCH_PAUSE_MS", "10")),
+    shards=db.shards,
+)
 
-def _rollup_loop(interval_seconds: int = 1800):
-    while True:
-        try:
-            _compute_sentiment_seconds(days=2)
-        except Exception:
-            pass
-        time.sleep(interval_seconds)
+@app.on_event("startup")
+async def start_rollup_job():
+    rollup_job.start()
+    retention_job.start()
 
-_rollup_thread_started = False
+@app.on_event("startup")
+async def start_classifier_loading():
+    # Loads ML_BACKEND on a background thread; the heuristic serves until it is warm
+    classifier_registry.start()
 
 @app.on_event("startup")
-async def start_rollup_job():
-    global _rollup_thread_started
-    if _rollup_thread_started:
-        return
-    # Avoid double-start under reload by checking process role
-    if os.getenv("RUN_MAIN") == "true" or True:
-        t = threading.Thread(target=_rollup_loop, args=(1800,), daemon=True)
-        t.start()
-        _rollup_thread_started = True
+async def start_ingest_queue():
+    ingest_queue.start()
+    if db.ANALYTICS_SOURCE == "snapshot":
+        db.snapshot.start()
+
+@app.on_event("shutdown")
+async def drain_ingest_queue():
+    # Blocks until every accepted write is committed
+    await asyncio.to_thread(ingest_queue.stop)
+    for executor in db.read_executors.values():
+        executor.shutdown()
+    ml_executor.shutdown()
+    await asyncio.to_thread(rollup_job.stop, JOB_STOP_TIMEOUT_SECONDS)
+    await asyncio.to_thread(retention_job.stop, JOB_STOP_TIMEOUT_SECONDS)
+    await asyncio.to_thread(db.snapshot.stop)
+    for pool in (db.pool, db.readonly_pool, db.snapshot_pool):
+        pool.close_all()
 
 # API endpoints
 @app.get("/")
@@ -194,62 +297,32 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/health/db")
+async def db_health_check():
+    """Database round-trip check plus connection pool statistics"""
+    return {**db.pool.health(), "pool": db.pool.stats()}
+
 @app.post("/api/v1/events")
 async def log_events(event_batch: EventBatch):
     """Log events from extension"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        processed_count = 0
-        
-        for event in event_batch.events:
-            # Hash user ID for privacy
-            hashed_user_id = hash_user_id(event.user_id)
-            
-            # Insert event
-            # Prepare ML JSON fields
-            behavior_json_str = json.dumps(event.behavior_json) if event.behavior_json else None
-            vision_json_str = json.dumps(event.vision_json) if event.vision_json else None
-
-            cursor.execute("""
-                INSERT INTO usage_events 
-                (user_id, event_type, timestamp, domain, url, duration, extension_version, browser,
-                 snippet_opt_in, snippet_text, behavior_json, vision_json)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                hashed_user_id,
-                event.event_type,
-                datetime.now().isoformat(),
-                event.domain,
-                event.url,
-                event.duration,
-                event.extension_version,
-                event.browser,
-                int(event.snippet_opt_in or 0),
-                event.snippet_text,
-                behavior_json_str,
-                vision_json_str
-            ))
-            
-            # Update user last_active
-            cursor.execute("""
-                INSERT OR REPLACE INTO users 
-                (id, last_active, daily_limit, break_reminder, focus_mode_enabled, analytics_enabled)
-                VALUES (?, ?, 30, 15, 0, 1)
-            """, (hashed_user_id, datetime.now().isoformat()))
-            
-            processed_count += 1
-        
-        conn.commit()
-        conn.close()
+        received_at = utc_now()
+        accepted_count = await enqueue_write(functools.partial(
+            insert_events, events=event_batch.events, now=received_at,
+            lookups=ingest_queue.lookups, shards=ingest_queue.shards, activity=ingest_queue.activity))
+        processed_count = len(event_batch.events)
         
+        # Counts are only known once committed; None in "enqueue" ack mode
         return {
             "success": True,
             "processed_count": processed_count,
+            "accepted_count": accepted_count,
+            "duplicate_count": processed_count - accepted_count if accepted_count is not None else None,
             "message": f"Successfully logged {processed_count} events"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         return {
             "success": False,
@@ -257,6 +330,109 @@ async def log_events(event_batch: EventBatch):
             "message": "Failed to log events"
         }
 
+@app.post("/api/v1/events/columnar")
+async def log_events_columnar(batch: ColumnarEventBatch):
+    """Log events sent as parallel arrays (see ColumnarEventBatch)"""
+    received_at = utc_now()
+    accepted_count = await enqueue_write(functools.partial(
+        insert_columnar_events, batch=batch, now=received_at,
+        lookups=ingest_queue.lookups, shards=ingest_queue.shards, activity=ingest_queue.activity))
+    processed_count = len(batch.event_type)
+    return {
+        "success": True,
+        "processed_count": processed_count,
+        "accepted_count": accepted_count,
+        "duplicate_count": processed_count - accepted_count if accepted_count is not None else None,
+        "message": f"Successfully logged {processed_count} events"
+    }
+
+# --- Streaming NDJSON ingestion ---
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", str(1 << 20)))
+STREAM_MAX_REPORTED_ERRORS = 100
+STREAM_ENQUEUE_TIMEOUT = 30  # seconds to wait on a full queue before giving up
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+async def _write_stream_chunk(chunk: List[EventData], received_at: str) -> int:
+    """Write one chunk, waiting out a full queue instead of failing the upload."""
+    deadline = time.monotonic() + STREAM_ENQUEUE_TIMEOUT
+    job = functools.partial(
+        insert_events, events=chunk, now=received_at, lookups=ingest_queue.lookups, shards=ingest_queue.shards,
+        activity=ingest_queue.activity)
+    while True:
+        try:
+            return await enqueue_write(job, wait=True)
+        except HTTPException as e:
+            if e.status_code != 429 or time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+@app.post("/api/v1/events/stream")
+async def log_events_stream(request: Request):
+    """Log events from an NDJSON body (one EventData object per line).
+
+    Accepts Content-Encoding: gzip, including concatenated gzip members; data
+    after the last member that is not gzip is rejected with 400. Lines are
+    validated one at a time and written in chunks of STREAM_CHUNK_SIZE, so memory
+    does not grow with upload size.
+    Invalid lines are skipped and reported by line number.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Expected application/x-ndjson")
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding not in ("identity", "gzip"):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+
+    received_at = utc_now()
+    chunk: List[EventData] = []
+    processed_count = 0
+    accepted_count = 0
+    error_count = 0
+    errors: List[Dict[str, Any]] = []
+
+    def record_error(line_no: int, message: str):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < STREAM_MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "error": message})
+
+    try:
+        lines = iter_ndjson_lines(request.stream(), gzipped=encoding == "gzip", max_line_bytes=STREAM_MAX_LINE_BYTES)
+        async for line_no, line in lines:
+            if line is None:
+                record_error(line_no, f"Line exceeds {STREAM_MAX_LINE_BYTES} bytes")
+                continue
+            try:
+                chunk.append(EventData.model_validate_json(line))
+            except ValidationError as e:
+                record_error(line_no, "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc']) or 'line'}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                accepted_count += await _write_stream_chunk(chunk, received_at)
+                processed_count += len(chunk)
+                chunk = []
+        if chunk:
+            accepted_count += await _write_stream_chunk(chunk, received_at)
+            processed_count += len(chunk)
+    except GzipTrailingData as e:
+        # Lines before the garbage may already be written; retrying is safe with event ids
+        raise HTTPException(status_code=400, detail=f"{e} ({accepted_count} events accepted before it)")
+    except zlib.error as e:
+        record_error(0, f"Invalid gzip stream: {e}")
+
+    return {
+        "success": error_count == 0,
+        "processed_count": processed_count,
+        "accepted_count": accepted_count,
+        "duplicate_count": processed_count - accepted_count,
+        "error_count": error_count,
+        "errors": errors,
+        "errors_truncated": error_count > len(errors),
+    }
+
 @app.post("/api/v1/ml/analyze", response_model=MLAnalyzeResponse)
 async def ml_analyze(payload: MLAnalyzeRequest):
     """Server-side content analysis using heuristic classifier.
@@ -264,88 +440,115 @@ async def ml_analyze(payload: MLAnalyzeRequest):
     This endpoint will later route to a Hugging Face model. For now, hf_ok=False.
     """
     try:
-        result = classify_content(payload.dict())
+        result = await run_classifier(payload.dict())
         return MLAnalyzeResponse(**result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/ml/analyze_batch", response_model=MLAnalyzeBatchResponse)
+async def ml_analyze_batch(payload: MLAnalyzeBatchRequest):
+    """Classify up to ML_MAX_BATCH_ITEMS texts in one request and one classifier call."""
+    try:
+        results = await run_classifier_batch([item.dict() for item in payload.items])
+        return MLAnalyzeBatchResponse(results=[MLAnalyzeResponse(**result) for result in results])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/ml/model")
+async def ml_model_status():
+    """Active and configured classifier backend, and the state of the last load."""
+    return classifier_registry.stats()
+
+@app.post("/api/v1/ml/model/reload", status_code=202)
+async def ml_model_reload(payload: Optional[MLModelReloadRequest] = None):
+    """Load a classifier backend in the background and swap it in once warmed up.
+
+    Requests keep being served by the current model until the swap; a failed load
+    leaves it in place (see GET /api/v1/ml/model).
+    """
+    payload = payload or MLModelReloadRequest()
+    if payload.backend is not None and payload.backend not in BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown backend {payload.backend!r}; known: {sorted(BACKENDS)}")
+    paths = {"model_path": payload.model_path} if "model_path" in payload.model_fields_set else {}
+    if not classifier_registry.reload(payload.backend, **paths):
+        raise HTTPException(status_code=409, detail="A classifier is already loading")
+    return classifier_registry.stats()
+
 @app.post("/api/v1/ml/analyze_and_log", response_model=MLAnalyzeAndLogResponse)
 async def ml_analyze_and_log(payload: MLAnalyzeAndLogRequest):
     """Analyze content and persist result into usage_events in one call."""
+    domain = payload.hostname or (urlparse(payload.url).hostname if payload.url else None)
+    if not domain:
+        raise HTTPException(status_code=422, detail="hostname or a url with a host is required")
     try:
-        analysis = classify_content(payload.dict())
+        analysis = await run_classifier(payload.dict())
 
         # Persist event with ML fields
-        conn = get_db()
-        cursor = conn.cursor()
         hashed_user_id = hash_user_id(payload.user_id)
-        cursor.execute(
-            """
-            INSERT INTO usage_events 
-            (user_id, event_type, timestamp, domain, url, duration, extension_version, browser,
-             snippet_opt_in, snippet_text, behavior_json, vision_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                hashed_user_id,
-                payload.event_type or "content_analysis",
-                datetime.now().isoformat(),
-                payload.hostname or (payload.url or "").split("/")[2] if payload.url else None,
-                payload.url,
-                0,
-                payload.extension_version,
-                payload.browser,
-                1 if payload.visible_text else 0,
-                payload.visible_text,
-                json.dumps({
-                    "sentiment": analysis["sentiment"],
-                    "content_type": analysis["content_type"],
-                    "doom_score": analysis["doom_score"],
-                    "scroll_score": analysis["scroll_score"],
-                    "hf_ok": analysis["hf_ok"],
-                    "model_version": analysis["model_version"]
-                }),
-                None
-            )
+        logged_at = utc_now()
+        row = (
+            hashed_user_id,
+            payload.event_id,
+            payload.event_type or "content_analysis",
+            logged_at,
+            domain,
+            payload.url,
+            0,
+            payload.extension_version,
+            payload.browser,
+            1 if payload.visible_text else 0,
+            payload.visible_text,
+            json.dumps({
+                "sentiment": analysis["sentiment"],
+                "content_type": analysis["content_type"],
+                "doom_score": analysis["doom_score"],
+                "scroll_score": analysis["scroll_score"],
+                "hf_ok": analysis["hf_ok"],
+                "model_version": analysis["model_version"]
+            }),
+            None,
+            *(analysis[column] for column in ML_COLUMNS)
+        )
+        inserted = await enqueue_write(
+            lambda cursor: write_event_rows(cursor, [row], [], logged_at, ingest_queue.lookups, ingest_queue.shards)
         )
-        conn.commit()
-        conn.close()
 
-        return MLAnalyzeAndLogResponse(**analysis, persisted=True)
+        # In "enqueue" ack mode the row is queued but not yet committed
+        return MLAnalyzeAndLogResponse(
+            **analysis,
+            persisted=INGEST_ACK_MODE != "enqueue",
+            duplicate=inserted == 0 if inserted is not None else None,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/users/{user_id}/stats")
 async def get_user_stats(user_id: str, days: int = 7):
     """Get user statistics"""
+    return await db.run_read(_get_user_stats, user_id, days, pool="read")
+
+def _get_user_stats(user_id: str, days: int):
     try:
         hashed_user_id = hash_user_id(user_id)
         conn = get_db()
         cursor = conn.cursor()
         
-        # Get total events
-        cursor.execute("""
-            SELECT COUNT(*) FROM usage_events 
-            WHERE user_id = ? AND timestamp >= datetime('now', '-{} days')
-        """.format(days), (hashed_user_id,))
-        total_events = cursor.fetchone()[0]
-        
-        # Get total time
-        cursor.execute("""
-            SELECT COALESCE(SUM(duration), 0) FROM usage_events 
-            WHERE user_id = ? AND timestamp >= datetime('now', '-{} days')
-        """.format(days), (hashed_user_id,))
-        total_time = cursor.fetchone()[0]
-        
-        # Get focus alerts
-        cursor.execute("""
-            SELECT COUNT(*) FROM usage_events 
-            WHERE user_id = ? AND event_type = 'focus_alert' 
-            AND timestamp >= datetime('now', '-{} days')
-        """.format(days), (hashed_user_id,))
-        focus_alerts = cursor.fetchone()[0]
-        
-        conn.close()
+        # Totals from daily rollups plus events not yet rolled up
+        months = db.attach_event_shards(conn, days)
+        cursor.execute(facts_cte(user_filter=True, months=months) + """
+            SELECT 
+                COALESCE(SUM(event_count), 0),
+                COALESCE(SUM(duration_sum), 0),
+                COALESCE(SUM(CASE WHEN event_type = 'focus_alert' THEN event_count END), 0)
+            FROM facts
+        """, {"cutoff": day_cutoff(days), "user_id": hashed_user_id})
+        total_events, total_time, focus_alerts = cursor.fetchone()
         
         return {
             "user_id": user_id[:8] + "...",
@@ -363,122 +566,195 @@ async def get_user_stats(user_id: str, days: int = 7):
             "message": "Failed to get user stats"
         }
 
+# Sites shown for a stored user whose monitored_websites was never set
+DEFAULT_MONITORED_WEBSITES = [
+    {"domain": "facebook.com", "name": "Facebook", "enabled": True, "isDefault": True},
+    {"domain": "x.com", "name": "X (Twitter)", "enabled": True, "isDefault": True},
+    {"domain": "instagram.com", "name": "Instagram", "enabled": True, "isDefault": True},
+    {"domain": "tiktok.com", "name": "TikTok", "enabled": True, "isDefault": True},
+    {"domain": "reddit.com", "name": "Reddit", "enabled": True, "isDefault": True},
+    {"domain": "youtube.com", "name": "YouTube", "enabled": True, "isDefault": True},
+    {"domain": "linkedin.com", "name": "LinkedIn", "enabled": False, "isDefault": True},
+    {"domain": "snapchat.com", "name": "Snapchat", "enabled": False, "isDefault": True}
+]
+
+def settings_body(payload: Dict[str, Any]) -> bytes:
+    """Serialize a settings response the way JSONResponse would"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def settings_etag(version: int) -> str:
+    """ETag of a user's settings: users.settings_version, 0 while there is no row"""
+    return f'"v{version}"'
+
+def etag_listed(header: str, etag: str, weak: bool = True) -> bool:
+    """Whether an If-None-Match / If-Match list names etag ("*" is left to the caller)"""
+    tags = [tag.strip() for tag in header.split(",")]
+    if weak:
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return etag in tags
+
+# Response for a user with no row yet, built once
+DEFAULT_SETTINGS_BODY = settings_body({
+    "success": True,
+    "settings": {
+        "daily_limit": 30,
+        "break_reminder": 15,
+        "focus_mode_enabled": False,
+        "focus_sensitivity": "medium",
+        "show_overlays": True,
+        "enabled": True,
+        "monitored_websites": [
+            {"domain": "facebook.com", "name": "Facebook", "enabled": True, "isDefault": True},
+            {"domain": "twitter.com", "name": "Twitter/X", "enabled": True, "isDefault": True},
+            *DEFAULT_MONITORED_WEBSITES[1:],
+        ]
+    }
+})
+
+DEFAULT_SETTINGS_ENTRY = (settings_etag(0), DEFAULT_SETTINGS_BODY)
+
+# (ETag, serialized GET settings response) by hashed user id; extensions re-sync every
+# few minutes, and a matching If-None-Match is answered from here without the database
+settings_cache = TTLCache(
+    max_entries=int(os.getenv("SETTINGS_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "600")),
+)
+
 @app.get("/api/v1/users/{user_id}/settings")
-async def get_user_settings(user_id: str):
-    """Get user settings"""
-    try:
-        hashed_user_id = hash_user_id(user_id)
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT daily_limit, break_reminder, focus_mode_enabled, 
-                   focus_sensitivity, show_overlays, enabled, monitored_websites
-            FROM users 
-            WHERE id = ?
-        """, (hashed_user_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            # Parse monitored_websites JSON string back to list
-            if result[6]:
-                monitored_websites = json.loads(result[6])
-            else:
-                # Return default websites if null
-                monitored_websites = [
-                    {"domain": "facebook.com", "name": "Facebook", "enabled": True, "isDefault": True},
-                    {"domain": "x.com", "name": "X (Twitter)", "enabled": True, "isDefault": True},
-                    {"domain": "instagram.com", "name": "Instagram", "enabled": True, "isDefault": True},
-                    {"domain": "tiktok.com", "name": "TikTok", "enabled": True, "isDefault": True},
-                    {"domain": "reddit.com", "name": "Reddit", "enabled": True, "isDefault": True},
-                    {"domain": "youtube.com", "name": "YouTube", "enabled": True, "isDefault": True},
-                    {"domain": "linkedin.com", "name": "LinkedIn", "enabled": False, "isDefault": True},
-                    {"domain": "snapchat.com", "name": "Snapchat", "enabled": False, "isDefault": True}
-                ]
-            
+async def get_user_settings(user_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get user settings (304 when If-None-Match has the current ETag)"""
+    hashed_user_id = hash_user_id(user_id)
+    entry = settings_cache.get(hashed_user_id)
+    if entry is None:
+        stamp = settings_cache.stamp()
+        try:
+            entry = await db.run_read(_get_user_settings, hashed_user_id, pool="read")
+        except Exception as e:
             return {
-                "success": True,
-                "settings": {
-                    "daily_limit": result[0],
-                    "break_reminder": result[1],
-                    "focus_mode_enabled": result[2],
-                    "focus_sensitivity": result[3],
-                    "show_overlays": result[4],
-                    "enabled": result[5],
-                    "monitored_websites": monitored_websites
-                }
+                "success": False,
+                "error": str(e),
+                "message": "Failed to get settings"
             }
+        if entry is None:
+            # Not cached: the row ingestion creates on the first event reads differently
+            entry = DEFAULT_SETTINGS_ENTRY
         else:
-            # Return default settings if user doesn't exist
-            default_websites = [
-                {"domain": "facebook.com", "name": "Facebook", "enabled": True, "isDefault": True},
-                {"domain": "twitter.com", "name": "Twitter/X", "enabled": True, "isDefault": True},
-                {"domain": "x.com", "name": "X (Twitter)", "enabled": True, "isDefault": True},
-                {"domain": "instagram.com", "name": "Instagram", "enabled": True, "isDefault": True},
-                {"domain": "tiktok.com", "name": "TikTok", "enabled": True, "isDefault": True},
-                {"domain": "reddit.com", "name": "Reddit", "enabled": True, "isDefault": True},
-                {"domain": "youtube.com", "name": "YouTube", "enabled": True, "isDefault": True},
-                {"domain": "linkedin.com", "name": "LinkedIn", "enabled": False, "isDefault": True},
-                {"domain": "snapchat.com", "name": "Snapchat", "enabled": False, "isDefault": True}
-            ]
-            return {
-                "success": True,
-                "settings": {
-                    "daily_limit": 30,
-                    "break_reminder": 15,
-                    "focus_mode_enabled": False,
-                    "focus_sensitivity": "medium",
-                    "show_overlays": True,
-                    "enabled": True,
-                    "monitored_websites": default_websites
-                }
-            }
-        
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "message": "Failed to get settings"
+            settings_cache.put(hashed_user_id, entry, stamp)
+    etag, body = entry
+    # no-cache: clients may store the body but revalidate it on every sync
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and (if_none_match.strip() == "*" or etag_listed(if_none_match, etag)):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _get_user_settings(hashed_user_id: str) -> Optional[Tuple[str, bytes]]:
+    """(ETag, serialized settings response) for a stored user, None if there is no row"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT daily_limit, break_reminder, focus_mode_enabled, 
+               focus_sensitivity, show_overlays, enabled, monitored_websites, settings_version
+        FROM users 
+        WHERE id = ?
+    """, (hashed_user_id,))
+    
+    result = cursor.fetchone()
+    if not result:
+        return None
+    
+    return settings_etag(result[7]), settings_body({
+        "success": True,
+        "settings": {
+            "daily_limit": result[0],
+            "break_reminder": result[1],
+            "focus_mode_enabled": result[2],
+            "focus_sensitivity": result[3],
+            "show_overlays": result[4],
+            "enabled": result[5],
+            # Parse monitored_websites JSON string back to list
+            "monitored_websites": json.loads(result[6]) if result[6] else DEFAULT_MONITORED_WEBSITES
         }
+    })
+
+class SettingsVersionConflict(Exception):
+    """If-Match on a settings save didn't name the stored version"""
+
+    def __init__(self, etag: str) -> None:
+        super().__init__(f"Settings are at {etag}")
+        self.etag = etag
 
 @app.post("/api/v1/users/{user_id}/settings")
-async def update_user_settings(user_id: str, settings: UserSettings):
-    """Update user settings"""
+async def update_user_settings(user_id: str, settings: UserSettings, response: Response,
+                               if_match: Optional[str] = Header(None)):
+    """Update user settings (412 when If-Match doesn't name the current ETag)"""
     try:
         hashed_user_id = hash_user_id(user_id)
-        conn = get_db()
-        cursor = conn.cursor()
         
         # Convert monitored_websites list to JSON string
         monitored_websites_json = json.dumps(settings.monitored_websites)
         
-        cursor.execute("""
-            INSERT OR REPLACE INTO users 
-            (id, last_active, daily_limit, break_reminder, focus_mode_enabled, 
-             focus_sensitivity, show_overlays, enabled, monitored_websites, analytics_enabled)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
-        """, (
-            hashed_user_id,
-            datetime.now().isoformat(),
-            settings.daily_limit,
-            settings.break_reminder,
-            settings.focus_mode_enabled,
-            settings.focus_sensitivity,
-            settings.show_overlays,
-            settings.enabled,
-            monitored_websites_json
-        ))
+        now = datetime.now().isoformat()
         
-        conn.commit()
-        conn.close()
+        # Upsert: an existing row keeps created_at and analytics_enabled (REPLACE would
+        # delete and reinsert it). last_active goes through the writer's activity tracker.
+        def write_settings(cursor):
+            # Checked on the writer thread, in the transaction that writes, so the
+            # version can't move in between
+            if if_match is not None:
+                cursor.execute("SELECT settings_version FROM users WHERE id = ?", (hashed_user_id,))
+                row = cursor.fetchone()
+                current = settings_etag(row[0] if row else 0)
+                matched = row is not None if if_match.strip() == "*" else etag_listed(if_match, current, weak=False)
+                if not matched:
+                    raise SettingsVersionConflict(current)
+            cursor.execute("""
+                INSERT INTO users 
+                (id, created_at, last_active, daily_limit, break_reminder, focus_mode_enabled, 
+                 focus_sensitivity, show_overlays, enabled, monitored_websites, analytics_enabled)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT(id) DO UPDATE SET
+                    daily_limit = excluded.daily_limit,
+                    break_reminder = excluded.break_reminder,
+                    focus_mode_enabled = excluded.focus_mode_enabled,
+                    focus_sensitivity = excluded.focus_sensitivity,
+                    show_overlays = excluded.show_overlays,
+                    enabled = excluded.enabled,
+                    monitored_websites = excluded.monitored_websites,
+                    settings_version = users.settings_version + 1
+                RETURNING settings_version
+            """, (
+                hashed_user_id,
+                now,
+                now,
+                settings.daily_limit,
+                settings.break_reminder,
+                settings.focus_mode_enabled,
+                settings.focus_sensitivity,
+                settings.show_overlays,
+                settings.enabled,
+                monitored_websites_json
+            ))
+            version = cursor.fetchone()[0]
+            ingest_queue.activity.touch([hashed_user_id], now)
+            return version
+        
+        # Written by the ingest writer thread, like every other write
+        try:
+            version = await enqueue_write(write_settings, wait=True)
+        except SettingsVersionConflict as e:
+            raise HTTPException(status_code=412, detail=str(e), headers={"ETag": e.etag})
+        # After the commit, so the next read loads the new row (reads in flight won't cache)
+        settings_cache.invalidate(hashed_user_id)
+        response.headers["ETag"] = settings_etag(version)
         
         return {
             "success": True,
             "message": "Settings updated successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         return {
             "success": False,
@@ -491,21 +767,24 @@ async def update_user_settings(user_id: str, settings: UserSettings):
 @app.get("/api/v1/analytics/overview")
 async def get_analytics_overview(days: int = 7):
     """Get overall analytics for all users"""
-    conn = get_db()
+    return await db.run_read(_get_analytics_overview, days, pool="analytics")
+
+def _get_analytics_overview(days: int):
+    conn, freshness = db.get_analytics_connection()
     cursor = conn.cursor()
     
-    cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
+    params = {"cutoff": day_cutoff(days)}
+    facts = facts_cte(months=db.attach_event_shards(conn, days))
     
     # Overall stats
-    cursor.execute("""
+    cursor.execute(facts + """
         SELECT 
             COUNT(DISTINCT user_id) as active_users,
-            COUNT(*) as total_events,
-            AVG(duration) as avg_duration,
-            SUM(duration) as total_duration_minutes
-        FROM usage_events 
-        WHERE timestamp >= ?
-    """, (cutoff_date,))
+            SUM(event_count) as total_events,
+            SUM(duration_sum) * 1.0 / NULLIF(SUM(duration_count), 0) as avg_duration,
+            SUM(duration_sum) as total_duration_minutes
+        FROM facts
+    """, params)
     
     overall_stats = cursor.fetchone()
     
@@ -523,50 +802,46 @@ async def get_analytics_overview(days: int = 7):
     user_settings = cursor.fetchone()
     
     # Events by type
-    cursor.execute("""
-        SELECT event_type, COUNT(*) as count
-        FROM usage_events 
-        WHERE timestamp >= ?
+    cursor.execute(facts + """
+        SELECT event_type, SUM(event_count) as count
+        FROM facts
         GROUP BY event_type
         ORDER BY count DESC
-    """, (cutoff_date,))
+    """, params)
     
     events_by_type = dict(cursor.fetchall())
     
     # Top domains
-    cursor.execute("""
-        SELECT domain, COUNT(*) as visits, AVG(duration) as avg_duration
-        FROM usage_events 
-        WHERE timestamp >= ? AND event_type = 'usage_sync'
+    cursor.execute(facts + """
+        SELECT domain, SUM(event_count) as visits, SUM(duration_sum) * 1.0 / NULLIF(SUM(duration_count), 0) as avg_duration
+        FROM facts
+        WHERE event_type = 'usage_sync'
         GROUP BY domain
         ORDER BY visits DESC
         LIMIT 10
-    """, (cutoff_date,))
+    """, params)
     
     top_domains = [{"domain": row[0], "visits": row[1], "avg_duration": round(row[2] or 0, 1)} for row in cursor.fetchall()]
     
     # Daily usage trends
-    cursor.execute("""
+    cursor.execute(facts + """
         SELECT 
-            DATE(timestamp) as date,
+            substr(date, 1, 10) as day,
             COUNT(DISTINCT user_id) as active_users,
-            COUNT(*) as total_events,
-            AVG(duration) as avg_duration
-        FROM usage_events 
-        WHERE timestamp >= ?
-        GROUP BY DATE(timestamp)
-        ORDER BY date DESC
-    """, (cutoff_date,))
+            SUM(event_count) as total_events,
+            SUM(duration_sum) * 1.0 / NULLIF(SUM(duration_count), 0) as avg_duration
+        FROM facts
+        GROUP BY day
+        ORDER BY day DESC
+    """, params)
     
     daily_trends = [{"date": row[0], "active_users": row[1], "total_events": row[2], "avg_duration": round(row[3] or 0, 1)} for row in cursor.fetchall()]
     
-    conn.close()
-    
     return {
         "period_days": days,
         "overall_stats": {
             "active_users": overall_stats[0],
-            "total_events": overall_stats[1],
+            "total_events": overall_stats[1] or 0,
             "avg_duration_minutes": round(overall_stats[2] or 0, 1),
             "total_duration_minutes": overall_stats[3] or 0,
             "total_duration_hours": round((overall_stats[3] or 0) / 60, 1)
@@ -580,15 +855,18 @@ async def get_analytics_overview(days: int = 7):
         },
         "events_by_type": events_by_type,
         "top_domains": top_domains,
-        "daily_trends": daily_trends
+        "daily_trends": daily_trends,
+        "data_freshness": freshness
     }
 
 @app.get("/api/v1/analytics/sentiment-seconds")
 async def get_sentiment_seconds(days: int = 7):
     """Aggregate doom/neutral/positive seconds from daily_stats."""
-    conn = get_db()
+    return await db.run_read(_get_sentiment_seconds, days, pool="analytics")
+
+def _get_sentiment_seconds(days: int):
+    conn, freshness = db.get_analytics_connection()
     cursor = conn.cursor()
-    cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
     cursor.execute(
         """
         SELECT 
@@ -598,27 +876,29 @@ async def get_sentiment_seconds(days: int = 7):
         FROM daily_stats
         WHERE date >= ?
         """,
-        (cutoff_date,)
+        (day_cutoff(days),)
     )
     row = cursor.fetchone()
-    conn.close()
     return {
         "doom_seconds": row[0] or 0,
         "neutral_seconds": row[1] or 0,
         "positive_seconds": row[2] or 0,
-        "period_days": days
+        "period_days": days,
+        "data_freshness": freshness
     }
 
 @app.get("/api/v1/analytics/users")
 async def get_user_analytics(days: int = 7, limit: int = 10):
     """Get analytics for top users with full user information"""
-    conn = get_db()
+    return await db.run_read(_get_user_analytics, days, limit, pool="analytics")
+
+def _get_user_analytics(days: int, limit: int):
+    conn, freshness = db.get_analytics_connection()
     cursor = conn.cursor()
     
-    cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-    
     # Get top users with full user information
-    cursor.execute("""
+    months = db.attach_event_shards(conn, days)
+    cursor.execute(facts_cte(months=months) + """
         SELECT 
             u.id as user_id,
             u.created_at,
@@ -627,22 +907,34 @@ async def get_user_analytics(days: int = 7, limit: int = 10):
             u.break_reminder,
             u.focus_mode_enabled,
             u.analytics_enabled,
-            COUNT(e.id) as total_events,
-            COUNT(DISTINCT e.domain) as unique_domains,
-            AVG(e.duration) as avg_duration,
-            MAX(e.duration) as max_duration,
-            SUM(e.duration) as total_duration_minutes,
-            COUNT(CASE WHEN e.event_type = 'focus_alert' THEN 1 END) as focus_alerts,
-            COUNT(CASE WHEN e.event_type = 'break_reminder' THEN 1 END) as break_reminders,
-            COUNT(CASE WHEN e.event_type = 'daily_limit_reached' THEN 1 END) as limit_reached,
-            COUNT(CASE WHEN e.event_type = 'page_view' THEN 1 END) as page_views
+            COALESCE(f.total_events, 0) as total_events,
+            COALESCE(f.unique_domains, 0) as unique_domains,
+            f.avg_duration,
+            f.max_duration,
+            f.total_duration_minutes,
+            COALESCE(f.focus_alerts, 0) as focus_alerts,
+            COALESCE(f.break_reminders, 0) as break_reminders,
+            COALESCE(f.limit_reached, 0) as limit_reached,
+            COALESCE(f.page_views, 0) as page_views
         FROM users u
-        LEFT JOIN usage_events e ON u.id = e.user_id AND e.timestamp >= ?
-        GROUP BY u.id, u.created_at, u.last_active, u.daily_limit, u.break_reminder, 
-                 u.focus_mode_enabled, u.analytics_enabled
+        LEFT JOIN (
+            SELECT 
+                user_id,
+                SUM(event_count) as total_events,
+                COUNT(DISTINCT domain) as unique_domains,
+                SUM(duration_sum) * 1.0 / NULLIF(SUM(duration_count), 0) as avg_duration,
+                MAX(duration_max) as max_duration,
+                SUM(duration_sum) as total_duration_minutes,
+                SUM(CASE WHEN event_type = 'focus_alert' THEN event_count ELSE 0 END) as focus_alerts,
+                SUM(CASE WHEN event_type = 'break_reminder' THEN event_count ELSE 0 END) as break_reminders,
+                SUM(CASE WHEN event_type = 'daily_limit_reached' THEN event_count ELSE 0 END) as limit_reached,
+                SUM(CASE WHEN event_type = 'page_view' THEN event_count ELSE 0 END) as page_views
+            FROM facts
+            GROUP BY user_id
+        ) f ON f.user_id = u.id
         ORDER BY total_events DESC
-        LIMIT ?
-    """, (cutoff_date, limit))
+        LIMIT :limit
+    """, {"cutoff": day_cutoff(days), "limit": limit})
     
     top_users = []
     for row in cursor.fetchall():
@@ -686,38 +978,38 @@ async def get_user_analytics(days: int = 7, limit: int = 10):
             }
         })
     
-    conn.close()
-    
     return {
         "period_days": days,
         "total_users": len(top_users),
-        "top_users": top_users
+        "top_users": top_users,
+        "data_freshness": freshness
     }
 
 @app.get("/api/v1/analytics/domains")
 async def get_domain_analytics(days: int = 7):
     """Get detailed domain analytics"""
-    conn = get_db()
+    return await db.run_read(_get_domain_analytics, days, pool="analytics")
+
+def _get_domain_analytics(days: int):
+    conn, freshness = db.get_analytics_connection()
     cursor = conn.cursor()
     
-    cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-    
     # Domain usage stats
-    cursor.execute("""
+    months = db.attach_event_shards(conn, days)
+    cursor.execute(facts_cte(months=months) + """
         SELECT 
             domain,
-            COUNT(*) as total_events,
+            SUM(event_count) as total_events,
             COUNT(DISTINCT user_id) as unique_users,
-            AVG(duration) as avg_duration,
-            MAX(duration) as max_duration,
-            SUM(duration) as total_duration_minutes,
-            COUNT(CASE WHEN event_type = 'daily_limit_reached' THEN 1 END) as limit_reached_count,
-            COUNT(CASE WHEN event_type = 'break_reminder' THEN 1 END) as break_reminder_count
-        FROM usage_events 
-        WHERE timestamp >= ?
+            SUM(duration_sum) * 1.0 / NULLIF(SUM(duration_count), 0) as avg_duration,
+            MAX(duration_max) as max_duration,
+            SUM(duration_sum) as total_duration_minutes,
+            SUM(CASE WHEN event_type = 'daily_limit_reached' THEN event_count ELSE 0 END) as limit_reached_count,
+            SUM(CASE WHEN event_type = 'break_reminder' THEN event_count ELSE 0 END) as break_reminder_count
+        FROM facts
         GROUP BY domain
         ORDER BY total_duration_minutes DESC
-    """, (cutoff_date,))
+    """, {"cutoff": day_cutoff(days)})
     
     domain_stats = []
     for row in cursor.fetchall():
@@ -732,11 +1024,28 @@ async def get_domain_analytics(days: int = 7):
             "break_reminder_count": row[7]
         })
     
-    conn.close()
-    
     return {
         "period_days": days,
-        "domain_stats": domain_stats
+        "domain_stats": domain_stats,
+        "data_freshness": freshness
+    }
+
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    """Runtime metrics for in-process subsystems"""
+    return {
+        "ingest_queue": ingest_queue.stats(),
+        "rollup": rollup_job.stats(),
+        "retention": retention_job.stats(),
+        "settings_cache": settings_cache.stats(),
+        "ml_cache": result_cache.stats(),
+        "ml_executor": ml_executor.stats(),
+        "ml_batcher": ml_batcher.stats(),
+        "ml_model": classifier_registry.stats(),
+        "shards": db.shards.stats() if db.shards is not None else None,
+        "db_pool": db.pool.stats(),
+        "analytics_pools": {"readonly": db.readonly_pool.stats(), "snapshot": db.snapshot_pool.stats()},
+        "read_executors": {name: executor.stats() for name, executor in db.read_executors.items()}
     }
 
 @app.get("/analytics")
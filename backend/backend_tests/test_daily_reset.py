@@ -47,8 +47,8 @@ def test_daily_reset():
     # Check recent usage events
     cursor.execute("""
         SELECT event_type, domain, timestamp, duration
-        FROM usage_events 
-        ORDER BY timestamp DESC 
+        FROM usage_events_v 
+        ORDER BY ts_ms DESC 
         LIMIT 10
     """)
     
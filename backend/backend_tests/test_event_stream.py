@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the NDJSON streaming ingestion endpoint
+"""
+
+import gzip
+import json
+import uuid
+
+import requests
+
+API_URL = "http://127.0.0.1:8000"
+
+def make_body(count=1200):
+    lines = [
+        json.dumps({
+            "user_id": "stream_test_user",
+            "event_id": str(uuid.uuid4()),
+            "event_type": "page_view",
+            "domain": "youtube.com",
+            "duration": 30,
+        })
+        for _ in range(count)
+    ]
+    # One malformed line and one line failing validation
+    lines.insert(3, "{not json")
+    lines.insert(7, json.dumps({"user_id": "stream_test_user"}))
+    return ("\n".join(lines) + "\n").encode()
+
+def test_event_stream():
+    """Upload the same NDJSON body plain and gzip-encoded"""
+    print("🧪 Testing NDJSON Event Stream")
+    print("=" * 50)
+
+    body = make_body()
+    ndjson = {"Content-Type": "application/x-ndjson"}
+
+    # Test 1: plain upload
+    print("\n1️⃣ Plain NDJSON upload...")
+    try:
+        response = requests.post(f"{API_URL}/api/v1/events/stream", data=body, headers=ndjson)
+        data = response.json()
+        print(f"✅ Status: {response.status_code}")
+        print(f"   processed={data.get('processed_count')} accepted={data.get('accepted_count')} errors={data.get('error_count')}")
+        print(f"   First errors: {data.get('errors', [])[:2]}")
+    except Exception as e:
+        print(f"❌ Plain upload error: {e}")
+        return
+
+    # Test 2: same body gzip-encoded; every event_id is a duplicate now
+    print("\n2️⃣ Gzip upload of the same body (expect all duplicates)...")
+    try:
+        response = requests.post(
+            f"{API_URL}/api/v1/events/stream",
+            data=gzip.compress(body),
+            headers={**ndjson, "Content-Encoding": "gzip"},
+        )
+        data = response.json()
+        print(f"✅ Status: {response.status_code}")
+        print(f"   accepted={data.get('accepted_count')} duplicates={data.get('duplicate_count')}")
+    except Exception as e:
+        print(f"❌ Gzip upload error: {e}")
+
+    # Test 3: two concatenated gzip members, split mid-line; every line must arrive
+    print("\n3️⃣ Two-member gzip upload...")
+    try:
+        fresh = make_body(count=500)
+        cut = len(fresh) // 2
+        response = requests.post(
+            f"{API_URL}/api/v1/events/stream",
+            data=gzip.compress(fresh[:cut]) + gzip.compress(fresh[cut:]),
+            headers={**ndjson, "Content-Encoding": "gzip"},
+        )
+        data = response.json()
+        print(f"✅ Status: {response.status_code}")
+        print(f"   processed={data.get('processed_count')} accepted={data.get('accepted_count')} errors={data.get('error_count')}")
+        assert data.get("accepted_count") == 500, "lines after the first gzip member were lost"
+        assert data.get("error_count") == 2
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Two-member gzip error: {e}")
+
+    # Test 4: trailing bytes after the gzip member
+    print("\n4️⃣ Gzip upload with trailing garbage (expect 400)...")
+    try:
+        response = requests.post(
+            f"{API_URL}/api/v1/events/stream",
+            data=gzip.compress(body) + b"not gzip",
+            headers={**ndjson, "Content-Encoding": "gzip"},
+        )
+        print(f"✅ Status: {response.status_code}")
+        assert response.status_code == 400
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Trailing garbage error: {e}")
+
+    # Test 5: wrong content type
+    print("\n5️⃣ Wrong Content-Type (expect 415)...")
+    try:
+        response = requests.post(f"{API_URL}/api/v1/events/stream", data=body, headers={"Content-Type": "application/json"})
+        print(f"✅ Status: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Content-Type check error: {e}")
+
+    print("\n🎉 Stream test complete!")
+
+if __name__ == "__main__":
+    test_event_stream()
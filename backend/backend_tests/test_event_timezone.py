@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Test script for EVENT_TIMEZONE coming from config.env
+"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_backend(code):
+    """Run `code` in a fresh interpreter in the backend directory, without EVENT_TIMEZONE in the environment."""
+    env = {name: value for name, value in os.environ.items() if name != "EVENT_TIMEZONE"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+def test_event_timezone_from_config():
+    """A zone loaded after services.shards is imported still sets the day keys"""
+    print("🧪 Testing EVENT_TIMEZONE from config.env")
+    print("=" * 50)
+
+    # Test 1: config loaded after the import, as db does
+    print("\n1️⃣ Zone set after importing services.shards...")
+    zone = run_backend(
+        "import io\n"
+        "import services.shards as shards\n"
+        "from dotenv import load_dotenv\n"
+        "load_dotenv(stream=io.StringIO('EVENT_TIMEZONE=Asia/Tokyo'))\n"
+        "print(shards.event_tz(), shards.event_day(15 * 3600 * 1000))\n"
+    )
+    print(f"✅ event_tz() and event_day: {zone}")
+    # 1970-01-01T15:00Z is already 1970-01-02 in Tokyo
+    assert zone == "Asia/Tokyo 1", "EVENT_TIMEZONE loaded after import was ignored"
+
+    # Test 2: the real config.env through db
+    print("\n2️⃣ Zone after importing db...")
+    zone = run_backend(
+        "import os\n"
+        "import db\n"
+        "from services.shards import event_tz\n"
+        "print(repr(os.getenv('EVENT_TIMEZONE') or None), repr(event_tz() and str(event_tz())))\n"
+    )
+    configured, active = zone.split(" ")
+    print(f"✅ config.env: {configured}, event_tz(): {active}")
+    assert configured == active, "config.env EVENT_TIMEZONE did not take effect"
+
+    print("\n🎉 EVENT_TIMEZONE test complete!")
+
+if __name__ == "__main__":
+    test_event_timezone_from_config()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for classifier hot reloading
+"""
+
+import time
+
+import requests
+
+API_URL = "http://127.0.0.1:8000"
+
+def wait_for_load(timeout=10.0):
+    """Poll GET /api/v1/ml/model until the running load has finished."""
+    deadline = time.monotonic() + timeout
+    while True:
+        stats = requests.get(f"{API_URL}/api/v1/ml/model").json()
+        if stats["state"] != "loading" or time.monotonic() > deadline:
+            return stats
+        time.sleep(0.1)
+
+def test_ml_model_reload():
+    """A reload that fails keeps the configured and active classifier"""
+    print("🧪 Testing Classifier Reload")
+    print("=" * 50)
+
+    # Test 1: current model
+    print("\n1️⃣ Current model...")
+    try:
+        before = wait_for_load()
+        print(f"✅ Active: {before['active']}")
+        print(f"   Configured: {before['configured']}")
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Model status error: {e}")
+        return
+
+    # Test 2: reload from an artifact that does not exist
+    print("\n2️⃣ Reload with a missing artifact (expect failed, old model kept)...")
+    try:
+        response = requests.post(
+            f"{API_URL}/api/v1/ml/model/reload",
+            json={"backend": "lexicon", "model_path": "/nonexistent/lexicon.json"},
+        )
+        print(f"✅ Status: {response.status_code}")
+        after = wait_for_load()
+        print(f"   state={after['state']} error={after['error']}")
+        assert after["state"] == "failed"
+        assert after["configured"] == before["configured"], "a failed load changed the configured spec"
+        assert after["active"] == before["active"], "a failed load replaced the active backend"
+        assert after["swaps"] == before["swaps"]
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Reload error: {e}")
+
+    # Test 3: classification still works on the old model
+    print("\n3️⃣ Analyze after the failed reload...")
+    try:
+        response = requests.post(f"{API_URL}/api/v1/ml/analyze", json={"visible_text": "Breaking news today"})
+        data = response.json()
+        print(f"✅ Status: {response.status_code}")
+        print(f"   model_version={data.get('model_version')}")
+        assert data.get("model_version") == before["active"]["model_version"]
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Analyze error: {e}")
+
+    # Test 4: switch backend without a path, then clear the path explicitly
+    print("\n4️⃣ Reload heuristic without a path, then with model_path null...")
+    try:
+        for body in ({"backend": "heuristic"}, {"model_path": None}):
+            response = requests.post(f"{API_URL}/api/v1/ml/model/reload", json=body)
+            after = wait_for_load()
+            print(f"✅ {body}: {response.status_code} state={after['state']} configured={after['configured']}")
+            assert after["state"] == "ready"
+            assert after["configured"] == {"backend": "heuristic", "model_path": None}
+            assert after["active"]["model_version"] == after["fallback"]
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Reload error: {e}")
+
+    print("\n🎉 Reload test complete!")
+
+if __name__ == "__main__":
+    test_ml_model_reload()
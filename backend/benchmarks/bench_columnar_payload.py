@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare EventBatch (array of objects) with ColumnarEventBatch (parallel arrays).
+Reports payload bytes (raw and gzip) and server CPU to parse, validate and
+build insert rows per 1000 events. No database is touched.
+
+Usage:
+    python benchmarks/bench_columnar_payload.py [--events N] [--repeat N]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ColumnarEventBatch, EventBatch
+from services.ingest import build_columnar_rows, build_event_rows
+
+
+def make_events(n):
+    return [
+        {
+            "user_id": "bench_user_123",
+            "event_id": f"0b7c6a52-1f4e-4c39-9d7e-{i:012d}",
+            "event_type": "content_analysis" if i % 3 else "page_view",
+            "domain": "www.youtube.com",
+            "url": f"https://www.youtube.com/watch?v={i:011d}",
+            "duration": 30,
+            "extension_version": "1.0.0",
+            "browser": "Chrome",
+            "snippet_opt_in": 0,
+            "behavior_json": {"sentiment": "neutral", "doom_score": 0.5} if i % 3 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def to_columnar(events):
+    shared = ("user_id", "extension_version", "browser")
+    columns = ("event_id", "event_type", "domain", "url", "duration", "snippet_opt_in", "behavior_json")
+    payload = {name: events[0][name] for name in shared}
+    payload.update({name: [e.get(name) for e in events] for name in columns})
+    return payload
+
+
+def cpu_per_run(parse, build, body, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        build(parse(body), "2026-01-01T00:00:00")
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    row_body = json.dumps({"events": events}, separators=(",", ":")).encode()
+    col_body = json.dumps(to_columnar(events), separators=(",", ":")).encode()
+
+    row_cpu = cpu_per_run(
+        EventBatch.model_validate_json,
+        lambda batch, now: build_event_rows(batch.events, now),
+        row_body, args.repeat,
+    )
+    col_cpu = cpu_per_run(ColumnarEventBatch.model_validate_json, build_columnar_rows, col_body, args.repeat)
+
+    print(f"Per {args.events} events")
+    print(f"{'format':>10} | {'bytes':>9} | {'gzip bytes':>10} | {'server CPU ms':>13}")
+    print("-" * 52)
+    for name, body, cpu in (("EventBatch", row_body, row_cpu), ("columnar", col_body, col_cpu)):
+        print(f"{name:>10} | {len(body):>9,} | {len(gzip.compress(body)):>10,} | {cpu * 1000:>13.2f}")
+    print(f"\nbytes: {len(col_body) / len(row_body):.0%} of EventBatch, CPU: {col_cpu / row_cpu:.0%} of EventBatch")
+
+
+if __name__ == "__main__":
+    main()
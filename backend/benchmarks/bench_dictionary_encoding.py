@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Storage and scan cost of dictionary-encoded usage_events against the previous
+text-column layout. Writes the same N generated events into two throwaway
+databases (text columns with their old indexes, and the current schema through
+write_event_rows), then reports file, table and index sizes and times a 30-day
+GROUP BY domain / event_type over each.
+
+Usage:
+    python benchmarks/bench_dictionary_encoding.py [--events N] [--chunk N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from models import Base
+from services.ingest import EVENT_COLUMNS, LookupCache, epoch_ms, write_event_rows
+from services.rollup import day_cutoff
+
+DOMAINS = [f"www.site{i}.com" for i in range(300)] + ["www.youtube.com", "www.reddit.com", "www.tiktok.com"]
+EVENT_TYPES = ("page_view", "content_analysis", "scroll", "focus_alert", "break_reminder", "tab_switch")
+EVENT_TYPE_WEIGHTS = (40, 30, 20, 4, 3, 3)
+BROWSERS = ("Chrome", "Firefox", "Edge")
+VERSIONS = ("1.0.0", "1.0.1", "1.1.0", "1.2.0", "1.2.1")
+SENTIMENTS = ("negative", "neutral", "positive")
+LOOKUP_TABLES = ("event_types", "domains", "extension_versions", "browsers")
+
+# usage_events before dictionary encoding: text columns and the indexes on them
+TEXT_SCHEMA_SQL = """
+    CREATE TABLE usage_events (
+        id INTEGER PRIMARY KEY, user_id VARCHAR(64) NOT NULL, event_id VARCHAR(64),
+        event_type VARCHAR(50) NOT NULL, timestamp DATETIME NOT NULL, domain VARCHAR(255) NOT NULL,
+        url TEXT, duration INTEGER, extension_version VARCHAR(20), browser VARCHAR(50),
+        snippet_opt_in INTEGER, snippet_text TEXT, behavior_json TEXT, vision_json TEXT,
+        sentiment VARCHAR(16), content_type VARCHAR(32), doom_score FLOAT, scroll_score FLOAT,
+        model_version VARCHAR(64)
+    );
+    CREATE INDEX ix_usage_events_user_id ON usage_events (user_id);
+    CREATE INDEX ix_usage_events_timestamp ON usage_events (timestamp);
+    CREATE INDEX ix_usage_events_domain ON usage_events (domain);
+    CREATE INDEX idx_usage_user_timestamp ON usage_events (user_id, timestamp);
+    CREATE INDEX idx_usage_domain ON usage_events (domain);
+    CREATE INDEX idx_usage_event_type ON usage_events (event_type);
+    CREATE UNIQUE INDEX uq_usage_user_event_id ON usage_events (user_id, event_id);
+    CREATE INDEX idx_usage_user_ts_sentiment ON usage_events (user_id, timestamp, sentiment, doom_score)
+        WHERE sentiment IS NOT NULL;
+"""
+TEXT_INSERT_SQL = f"INSERT INTO usage_events ({', '.join(EVENT_COLUMNS)}) VALUES ({', '.join('?' * len(EVENT_COLUMNS))})"
+
+GROUP_BY_QUERIES = {
+    "text": """
+        SELECT domain, event_type, COUNT(*), SUM(duration)
+        FROM usage_events WHERE timestamp >= ? GROUP BY domain, event_type
+    """,
+    "encoded": """
+        SELECT d.name, t.name, g.n, g.total
+        FROM (SELECT domain_id, event_type_id, COUNT(*) AS n, SUM(duration) AS total
+              FROM usage_events WHERE ts_ms >= ? GROUP BY domain_id, event_type_id) g
+        JOIN domains d ON d.id = g.domain_id
+        JOIN event_types t ON t.id = g.event_type_id
+    """,
+}
+
+
+def generate_rows(n, chunk, users=5000, days=90):
+    """Yield chunks of EVENT_COLUMNS rows, ordered by id like real appends."""
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / max(n, 1)
+    user_ids = [f"{random.getrandbits(256):064x}" for _ in range(users)]
+    for offset in range(0, n, chunk):
+        rows = []
+        for i in range(offset, min(offset + chunk, n)):
+            domain = random.choice(DOMAINS)
+            event_type = random.choices(EVENT_TYPES, EVENT_TYPE_WEIGHTS)[0]
+            fields = {
+                "user_id": random.choice(user_ids),
+                "event_id": f"evt-{i}",
+                "event_type": event_type,
+                "timestamp": (start + timedelta(seconds=i * step)).isoformat(),
+                "domain": domain,
+                "url": f"https://{domain}/watch?v={random.randrange(20_000)}",
+                "duration": random.randrange(1, 120),
+                "extension_version": random.choice(VERSIONS),
+                "browser": random.choice(BROWSERS),
+            }
+            if event_type == "content_analysis":
+                sentiment, doom_score = random.choice(SENTIMENTS), round(random.random(), 3)
+                fields.update(
+                    behavior_json=json.dumps({"sentiment": sentiment, "doom_score": doom_score}),
+                    sentiment=sentiment,
+                    doom_score=doom_score,
+                )
+            rows.append(tuple(fields.get(column) for column in EVENT_COLUMNS))
+        yield rows
+
+
+def object_sizes(conn):
+    """Bytes per table and for all of its indexes, from the dbstat virtual table."""
+    sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+    indexes = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'usage_events'"
+    ).fetchall()
+    lookup_objects = {
+        name for (name,) in conn.execute(
+            f"SELECT name FROM sqlite_master WHERE tbl_name IN ({', '.join('?' * len(LOOKUP_TABLES))})", LOOKUP_TABLES
+        )
+    }
+    return {
+        "table": sizes.get("usage_events", 0),
+        "indexes": sum(sizes.get(name, 0) for (name,) in indexes),
+        "lookups": sum(sizes.get(name, 0) for name in lookup_objects),
+    }
+
+
+def timed_query(conn, sql, params, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--chunk", type=int, default=50_000)
+    args = parser.parse_args()
+    random.seed(12)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path, encoded_path = os.path.join(tmp, "text.db"), os.path.join(tmp, "encoded.db")
+        engine = create_engine(f"sqlite:///{encoded_path}")
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+
+        text_conn, encoded_conn = sqlite3.connect(text_path), sqlite3.connect(encoded_path)
+        text_conn.executescript(TEXT_SCHEMA_SQL)
+        lookups = LookupCache()
+        now = datetime.now().isoformat()
+        for rows in generate_rows(args.events, args.chunk):
+            text_conn.executemany(TEXT_INSERT_SQL, rows)
+            text_conn.commit()
+            write_event_rows(encoded_conn.cursor(), rows, sorted({row[0] for row in rows}), now, lookups)
+            encoded_conn.commit()
+            lookups.commit()
+        # the text database has no users table; drop them so sizes compare usage_events only
+        encoded_conn.execute("DELETE FROM users")
+        encoded_conn.commit()
+
+        cutoff = day_cutoff(30)
+        params = {"text": (cutoff,), "encoded": (epoch_ms(cutoff),)}
+        for name, conn, path in (("text", text_conn, text_path), ("encoded", encoded_conn, encoded_path)):
+            conn.execute("VACUUM")
+            results[name] = {
+                "file": os.path.getsize(path),
+                **object_sizes(conn),
+                "query_ms": timed_query(conn, GROUP_BY_QUERIES[name], params[name]),
+            }
+            conn.close()
+
+    mb = 1024 * 1024
+    print(f"{args.events:,} events")
+    print(f"{'layout':>8} | {'file MB':>9} | {'table MB':>9} | {'index MB':>9} | {'lookup MB':>9} | {'30d group ms':>12}")
+    print("-" * 72)
+    for name, r in results.items():
+        print(f"{name:>8} | {r['file'] / mb:>9.1f} | {r['table'] / mb:>9.1f} | {r['indexes'] / mb:>9.1f} | "
+              f"{r['lookups'] / mb:>9.1f} | {r['query_ms']:>12.1f}")
+    print(f"\nfile size ratio encoded/text: {results['encoded']['file'] / results['text']['file']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark for POST /api/v1/events write path.
+Compares the old per-event INSERT path against the set-based batch path.
+
+Usage:
+    python benchmarks/bench_event_ingest.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from models import Base, hash_user_id
+from services.ingest import LookupCache, insert_events
+
+BATCH_SIZES = (1, 100, 1000)
+
+
+def make_events(n, first=0, users=10):
+    """`n` events numbered from `first`; every event has its own URL, as real page views mostly do."""
+    return [
+        SimpleNamespace(
+            user_id=f"bench_user_{i % users}",
+            event_id=None,
+            event_type="content_analysis" if i % 3 else "page_view",
+            domain="www.youtube.com",
+            url=f"https://www.youtube.com/watch?v={i}",
+            duration=30,
+            extension_version="1.0.0",
+            browser="Chrome",
+            snippet_opt_in=1,
+            snippet_text="endless scrolling feed text " * 4,
+            behavior_json={"sentiment": "neutral", "doom_score": 0.5},
+            vision_json=None,
+        )
+        for i in range(first, first + n)
+    ]
+
+
+# usage_events as the per-event path wrote it: text columns and their indexes
+LEGACY_SCHEMA_SQL = """
+    CREATE TABLE usage_events_legacy (
+        id INTEGER PRIMARY KEY, user_id VARCHAR(64) NOT NULL, event_type VARCHAR(50) NOT NULL,
+        timestamp DATETIME NOT NULL, domain VARCHAR(255) NOT NULL, url TEXT, duration INTEGER,
+        extension_version VARCHAR(20), browser VARCHAR(50), snippet_opt_in INTEGER, snippet_text TEXT,
+        behavior_json TEXT, vision_json TEXT
+    );
+    CREATE INDEX ix_legacy_user_id ON usage_events_legacy (user_id);
+    CREATE INDEX ix_legacy_timestamp ON usage_events_legacy (timestamp);
+    CREATE INDEX ix_legacy_domain ON usage_events_legacy (domain);
+    CREATE INDEX idx_legacy_user_timestamp ON usage_events_legacy (user_id, timestamp);
+    CREATE INDEX idx_legacy_domain ON usage_events_legacy (domain);
+    CREATE INDEX idx_legacy_event_type ON usage_events_legacy (event_type);
+"""
+
+
+def legacy_insert_events(cursor, events, lookups=None):
+    """Previous log_events body: two statements per event (into the pre-lookup-table schema)."""
+    processed_count = 0
+    for event in events:
+        hashed_user_id = hash_user_id(event.user_id)
+        behavior_json_str = json.dumps(event.behavior_json) if event.behavior_json else None
+        vision_json_str = json.dumps(event.vision_json) if event.vision_json else None
+        cursor.execute("""
+            INSERT INTO usage_events_legacy
+            (user_id, event_type, timestamp, domain, url, duration, extension_version, browser,
+             snippet_opt_in, snippet_text, behavior_json, vision_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            hashed_user_id, event.event_type, datetime.now().isoformat(), event.domain, event.url,
+            event.duration, event.extension_version, event.browser, int(event.snippet_opt_in or 0),
+            event.snippet_text, behavior_json_str, vision_json_str,
+        ))
+        cursor.execute("""
+            INSERT OR REPLACE INTO users
+            (id, last_active, daily_limit, break_reminder, focus_mode_enabled, analytics_enabled)
+            VALUES (?, ?, 30, 15, 0, 1)
+        """, (hashed_user_id, datetime.now().isoformat()))
+        processed_count += 1
+    return processed_count
+
+
+def fresh_db(path):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA_SQL)
+    conn.close()
+
+
+def batched_insert_events(cursor, events, lookups):
+    """Current path, with the lookup cache the ingest writer keeps across requests."""
+    insert_events(cursor, events, lookups=lookups)
+
+
+def run(writer, db_path, batch_size, repeat):
+    """Time `repeat` requests of `batch_size` events, one connection + commit per request."""
+    fresh_db(db_path)
+    batches = [make_events(batch_size, first=i * batch_size) for i in range(repeat)]
+    lookups = LookupCache()
+    start = time.perf_counter()
+    for events in batches:
+        conn = sqlite3.connect(db_path)
+        writer(conn.cursor(), events, lookups)
+        conn.commit()
+        lookups.commit()
+        conn.close()
+    elapsed = time.perf_counter() - start
+    return (batch_size * repeat) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20, help="requests per batch size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print(f"{'batch':>6} | {'before ev/s':>12} | {'after ev/s':>12} | {'speedup':>7}")
+        print("-" * 48)
+        for size in BATCH_SIZES:
+            before = run(legacy_insert_events, db_path, size, args.repeat)
+            after = run(batched_insert_events, db_path, size, args.repeat)
+            print(f"{size:>6} | {before:>12,.0f} | {after:>12,.0f} | {after / before:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Classification throughput and event loop responsiveness for each ML_EXECUTOR mode.
+Runs the app in-process on a throwaway database with the result cache disabled.
+Clients post /api/v1/ml/analyze_batch with long, unique feed texts while a probe
+polls GET /health every 5 ms. The probe latency, counted from when each probe was
+due, shows how much scoring holds up unrelated requests. Cores on the machine bound what the process mode can gain.
+
+Usage:
+    python benchmarks/bench_inference_executor.py [--seconds S] [--clients N] [--workers N]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp(prefix="doomscroll-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+os.environ["ML_CACHE_SIZE"] = "0"
+
+import httpx
+from sqlalchemy import create_engine
+
+import db
+from models import Base
+from services.ml import InferenceExecutor
+
+WORDS = ("the of and to in is you that it for on are with this from watch video like share "
+         "comment new top funny breaking news learn how to sale amazing terrible endless "
+         "scrolling interesting skip my story").split()
+MODES = ("inline", "thread", "process")
+
+
+def card(words):
+    # A unique token per card keeps the matcher memo from making texts free
+    return {"visible_text": f"{random.getrandbits(64):x} " + " ".join(random.choices(WORDS, k=words))}
+
+
+async def ml_client(client, deadline, args, done):
+    while time.monotonic() < deadline:
+        items = [card(args.card_words) for _ in range(args.batch)]
+        response = await client.post("/api/v1/ml/analyze_batch", json={"items": items})
+        response.raise_for_status()
+        done.append(len(items))
+        await asyncio.sleep(0)  # the in-process transport never yields on its own
+
+
+async def probe(client, deadline, latencies):
+    """Every 5 ms, GET /health; latency counts from when the probe was due."""
+    while time.monotonic() < deadline:
+        due = time.perf_counter() + 0.005
+        await asyncio.sleep(0.005)
+        (await client.get("/health")).raise_for_status()
+        latencies.append((time.perf_counter() - due) * 1000)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+
+async def run_mode(app_module, client, mode, args):
+    app_module.ml_executor.shutdown()
+    app_module.ml_executor = InferenceExecutor(
+        app_module.result_cache, mode=mode, workers=args.workers, timeout_seconds=0)
+    await app_module.ml_executor.classify([card(args.card_words)])  # start the pool
+    deadline = time.monotonic() + args.seconds
+    done, latencies = [], []
+    await asyncio.gather(
+        *(ml_client(client, deadline, args, done) for _ in range(args.clients)),
+        probe(client, deadline, latencies),
+    )
+    return sum(done) / args.seconds, percentile(latencies, 0.5), percentile(latencies, 0.99), len(latencies)
+
+
+async def main(args):
+    engine = create_engine(db.DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    import app as app_module
+    app = app_module.app
+    await app.router.startup()
+    rows = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for mode in MODES:
+                rows.append((mode, *await run_mode(app_module, client, mode, args)))
+    finally:
+        await app.router.shutdown()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients x {args.batch}-card batches of "
+          f"{args.card_words} words, {args.workers} workers, {args.seconds:g}s per mode")
+    print(f"{'mode':>8} | {'cards/s':>8} | {'probes':>6} | {'probe p50 ms':>12} | {'probe p99 ms':>12}")
+    print("-" * 59)
+    for mode, rate, p50, p99, probes in rows:
+        print(f"{mode:>8} | {rate:>8.0f} | {probes:>6} | {p50:>12.2f} | {p99:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--card-words", type=int, default=400)
+    asyncio.run(main(parser.parse_args()))
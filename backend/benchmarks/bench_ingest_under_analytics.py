@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Concurrency check: POST /api/v1/events latency with and without heavy analytics load.
+Runs the app in-process on a throwaway database seeded with synthetic events, then
+measures ingest latency percentiles while idle and while analytics clients hammer
+the /api/v1/analytics/* endpoints.
+
+Usage:
+    python benchmarks/bench_ingest_under_analytics.py [--seed-events N] [--seconds S]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp(prefix="doomscroll-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+
+import httpx
+from sqlalchemy import create_engine
+
+import db
+from models import Base
+from services.ingest import EVENT_COLUMNS, write_event_rows
+
+ANALYTICS_PATHS = (
+    "/api/v1/analytics/overview?days=30",
+    "/api/v1/analytics/domains?days=30",
+    "/api/v1/analytics/users?days=30&limit=50",
+)
+DOMAINS = ["www.youtube.com", "www.reddit.com", "x.com", "www.instagram.com", "www.tiktok.com", "news.ycombinator.com"]
+EVENT_TYPES = ["page_view", "content_analysis", "usage_sync", "focus_alert", "break_reminder"]
+
+
+def seed(n):
+    engine = create_engine(db.DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    conn = db.connect()
+    now = datetime.now()
+    rows = [
+        tuple({
+            "user_id": f"{random.randrange(500):064x}",
+            "event_type": random.choice(EVENT_TYPES),
+            "timestamp": (now - timedelta(seconds=random.randrange(30 * 86400))).isoformat(),
+            "domain": random.choice(DOMAINS),
+            "duration": random.randrange(120),
+            "extension_version": "1.0.0",
+            "browser": "Chrome",
+        }.get(column) for column in EVENT_COLUMNS)
+        for _ in range(n)
+    ]
+    write_event_rows(conn.cursor(), rows, sorted({row[0] for row in rows}), now.isoformat())
+    conn.commit()
+    conn.close()
+
+
+async def ingest_client(client, deadline, latencies, idx):
+    batch = {"events": [
+        {"user_id": f"bench_{idx}", "event_type": "page_view", "domain": "www.youtube.com", "duration": 5}
+        for _ in range(10)
+    ]}
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/events", json=batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        await asyncio.sleep(0.01)
+
+
+async def analytics_client(client, deadline, counter):
+    while time.monotonic() < deadline:
+        response = await client.get(random.choice(ANALYTICS_PATHS))
+        response.raise_for_status()
+        counter.append(1)
+
+
+def percentiles(values):
+    values = sorted(values)
+    q = statistics.quantiles(values, n=100)
+    return {"n": len(values), "p50": q[49], "p95": q[94], "p99": q[98], "max": values[-1]}
+
+
+async def phase(client, seconds, ingest_clients, analytics_clients):
+    deadline = time.monotonic() + seconds
+    latencies, analytics_done = [], []
+    await asyncio.gather(
+        *(ingest_client(client, deadline, latencies, i) for i in range(ingest_clients)),
+        *(analytics_client(client, deadline, analytics_done) for _ in range(analytics_clients)),
+    )
+    return percentiles(latencies), len(analytics_done)
+
+
+async def main(args):
+    print(f"Seeding {args.seed_events:,} events into {db.DATABASE_PATH} ...")
+    seed(args.seed_events)
+
+    from app import app
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            idle, _ = await phase(client, args.seconds, args.ingest_clients, 0)
+            loaded, analytics_count = await phase(client, args.seconds, args.ingest_clients, args.analytics_clients)
+    finally:
+        await app.router.shutdown()
+
+    print(f"\nIngest latency (ms), {args.ingest_clients} clients x 10-event batches")
+    print(f"{'phase':>22} | {'requests':>8} | {'p50':>7} | {'p95':>7} | {'p99':>7} | {'max':>7}")
+    print("-" * 74)
+    for name, stats in (("idle", idle), (f"+{args.analytics_clients} analytics clients", loaded)):
+        print(f"{name:>22} | {stats['n']:>8} | {stats['p50']:>7.2f} | {stats['p95']:>7.2f} | "
+              f"{stats['p99']:>7.2f} | {stats['max']:>7.2f}")
+    print(f"\nAnalytics requests completed during load phase: {analytics_count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed-events", type=int, default=300_000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--ingest-clients", type=int, default=8)
+    parser.add_argument("--analytics-clients", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Cost of scoring long feed texts with the KeywordMatcher against the previous
+per-lexicon scans (one split() for sentiment, then `keyword in text` over every
+content-type and doom keyword). Texts are drawn from a Zipf-like vocabulary with
+the lexicon words mixed in. Each text size is run with a cold matcher memo (a fresh
+classifier) and a warm one. A second table grows the content-type and doom
+lexicons with extra keywords at a fixed text size. The outputs of both paths are
+checked to match.
+
+Usage:
+    python benchmarks/bench_keyword_matcher.py [--texts N] [--vocabulary N]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ml import HeuristicClassifier
+
+TEXT_WORDS = (50, 250, 1000, 2500)
+EXTRA_KEYWORDS = (0, 100, 1000)
+LEXICON_TEXT_WORDS = 250
+
+
+def legacy_score(clf, text, hint):
+    """The classifier's scoring before KeywordMatcher: separate scans per lexicon."""
+    lowered = text.lower()
+    words = lowered.split()
+    pos = sum(1 for w in words if w in clf.sentiment_lexicon["positive"])
+    neg = sum(1 for w in words if w in clf.sentiment_lexicon["negative"])
+    sentiment = "positive" if pos > neg else "negative" if neg > pos else "neutral"
+    content_type = hint or "unknown"
+    for ctype, keywords in clf.content_type_keywords.items():
+        if any(k in lowered for k in keywords):
+            content_type = ctype
+            break
+    score = 0.5
+    if any(k in lowered for k in clf.doom_keywords["high"]):
+        score += 0.3
+    if any(k in lowered for k in clf.doom_keywords["medium"]):
+        score += 0.1
+    if any(k in lowered for k in clf.doom_keywords["low"]):
+        score -= 0.2
+    if content_type in {"short", "reel"}:
+        score += 0.2
+    elif content_type == "news":
+        score += 0.1
+    elif content_type == "educational":
+        score -= 0.1
+    if sentiment == "positive":
+        score += 0.1
+    elif sentiment == "negative":
+        score -= 0.1
+    return sentiment, content_type, max(0.0, min(1.0, score))
+
+
+def make_vocabulary(n, clf):
+    letters = string.ascii_lowercase
+    words = ["".join(random.choices(letters, k=random.randint(2, 9))) for _ in range(n)]
+    lexicon = [w for group in (clf.sentiment_lexicon, clf.content_type_keywords, clf.doom_keywords)
+               for words_ in group.values() for w in words_]
+    words[:0] = lexicon  # lexicon words near the head of the distribution
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def make_texts(n, length, words, weights):
+    texts = []
+    for _ in range(n):
+        tokens = random.choices(words, weights=weights, k=length)
+        texts.append(" ".join(t.capitalize() if random.random() < 0.1 else t for t in tokens))
+    return texts
+
+
+def per_text_us(fn, texts, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def make_classifier(extra, words):
+    """Classifier whose content-type and doom lexicons each get `extra` / 8 vocabulary words."""
+    clf = HeuristicClassifier(max_text_chars=1 << 30)
+    groups = [*clf.content_type_keywords.values(), *clf.doom_keywords.values()]
+    pool = random.sample(words[len(words) // 2:], extra)  # the rarer half of the vocabulary
+    for i, word in enumerate(pool):
+        groups[i % len(groups)].add(word)
+    clf.compile_lexicons()
+    return clf
+
+
+def measure(clf, texts):
+    """Legacy, cold-memo and warm-memo microseconds per text."""
+    for text in texts:
+        assert clf._score(text, None) == legacy_score(clf, text, None), text[:80]
+    clf.compile_lexicons()  # empty memo
+    cold = per_text_us(lambda t: clf._score(t, None), texts)
+    warm = per_text_us(lambda t: clf._score(t, None), texts, repeat=3)
+    legacy = per_text_us(lambda t: legacy_score(clf, t, None), texts, repeat=3)
+    return legacy, cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    args = parser.parse_args()
+    random.seed(21)
+
+    words, weights = make_vocabulary(args.vocabulary, HeuristicClassifier())
+    header = f"{'legacy us':>9} | {'cold us':>8} | {'warm us':>8} | {'speedup':>7}"
+    print(f"{args.texts} texts per row, {len(words):,}-word vocabulary")
+
+    print(f"\n{'words':>6} | {'chars':>6} | {header}")
+    print("-" * 60)
+    for length in TEXT_WORDS:
+        texts = make_texts(args.texts, length, words, weights)
+        legacy, cold, warm = measure(make_classifier(0, words), texts)
+        chars = sum(map(len, texts)) // len(texts)
+        print(f"{length:>6} | {chars:>6} | {legacy:>9.1f} | {cold:>8.1f} | {warm:>8.1f} | {legacy / warm:>6.1f}x")
+
+    texts = make_texts(args.texts, LEXICON_TEXT_WORDS, words, weights)
+    print(f"\n{LEXICON_TEXT_WORDS}-word texts")
+    print(f"{'keywords':>8} | {header}")
+    print("-" * 53)
+    for extra in EXTRA_KEYWORDS:
+        clf = make_classifier(extra, words)
+        keywords = sum(map(len, (*clf.content_type_keywords.values(), *clf.doom_keywords.values())))
+        legacy, cold, warm = measure(clf, texts)
+        print(f"{keywords:>8} | {legacy:>9.1f} | {cold:>8.1f} | {warm:>8.1f} | {legacy / warm:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-card cost of POST /api/v1/ml/analyze against POST /api/v1/ml/analyze_batch.
+Runs the app in-process on a throwaway database and classifies the same synthetic
+feed cards one request per card and in batches of several sizes. Also reports the
+classifier alone: classify() per card against one classify_batch() call.
+
+Usage:
+    python benchmarks/bench_ml_batch.py [--cards N] [--card-words N]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp(prefix="doomscroll-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+
+import httpx
+from sqlalchemy import create_engine
+
+import db
+from models import Base
+from services.ml import classifier
+
+WORDS = ("the of and to in is you that it for on are with this from watch video like share "
+         "comment new top funny breaking news learn how to sale amazing terrible endless "
+         "scrolling interesting skip my story").split()
+HINTS = (None, "short", "reel", "post")
+BATCH_SIZES = (8, 32, 64)
+
+
+def make_cards(n, words):
+    return [{
+        "visible_text": " ".join(random.choices(WORDS, k=words)),
+        "structured_data": {"content_type": random.choice(HINTS)},
+    } for _ in range(n)]
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def timed_async(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def http_rows(cards):
+    from app import app
+    await app.router.startup()
+    rows = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def single():
+                for card in cards:
+                    (await client.post("/api/v1/ml/analyze", json=card)).raise_for_status()
+            rows.append(("analyze", 1, await timed_async(single)))
+
+            for size in BATCH_SIZES:
+                async def batched():
+                    for offset in range(0, len(cards), size):
+                        response = await client.post("/api/v1/ml/analyze_batch",
+                                                     json={"items": cards[offset:offset + size]})
+                        response.raise_for_status()
+                rows.append(("analyze_batch", size, await timed_async(batched)))
+    finally:
+        await app.router.shutdown()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cards", type=int, default=2048)
+    parser.add_argument("--card-words", type=int, default=40)
+    args = parser.parse_args()
+    random.seed(20)
+
+    engine = create_engine(db.DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    cards = make_cards(args.cards, args.card_words)
+    items = [(card["visible_text"], card["structured_data"]["content_type"]) for card in cards]
+
+    print(f"{args.cards:,} cards of {args.card_words} words")
+    print(f"\n{'classifier':>20} | {'us/card':>8}")
+    print("-" * 31)
+    per_item = timed(lambda: [classifier.classify(visible_text=t, structured_data={"content_type": h})
+                              for t, h in items])
+    batch = timed(lambda: classifier.classify_batch(items))
+    for name, seconds in (("classify per card", per_item), ("classify_batch", batch)):
+        print(f"{name:>20} | {seconds / args.cards * 1e6:>8.1f}")
+
+    print(f"\n{'endpoint':>14} | {'batch':>5} | {'requests':>8} | {'us/card':>8} | {'cards/s':>8}")
+    print("-" * 55)
+    for name, size, seconds in asyncio.run(http_rows(cards)):
+        requests = -(-args.cards // size)
+        print(f"{name:>14} | {size:>5} | {requests:>8} | {seconds / args.cards * 1e6:>8.1f} | "
+              f"{args.cards / seconds:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
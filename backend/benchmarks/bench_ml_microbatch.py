@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+POST /api/v1/ml/analyze throughput and latency with and without micro-batching.
+Runs the app in-process on a throwaway database with the result cache disabled.
+For each number of concurrent clients, every client posts unique cards one at a
+time. The run is repeated with ML_BATCH_MAX_SIZE=1 (every request scored on its
+own) and with the configured batcher.
+
+Usage:
+    python benchmarks/bench_ml_microbatch.py [--seconds S] [--card-words N] [--max-batch N] [--max-wait-ms MS]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp(prefix="doomscroll-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+os.environ["ML_CACHE_SIZE"] = "0"
+
+import httpx
+from sqlalchemy import create_engine
+
+import db
+from models import Base
+from services.batching import MicroBatcher
+
+WORDS = ("the of and to in is you that it for on are with this from watch video like share "
+         "comment new top funny breaking news learn how to sale amazing terrible endless "
+         "scrolling interesting skip my story").split()
+CLIENTS = (1, 8, 32, 128)
+
+
+def card(words):
+    return {"visible_text": f"{random.getrandbits(64):x} " + " ".join(random.choices(WORDS, k=words))}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+
+async def client_loop(client, deadline, words, latencies):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/ml/analyze", json=card(words))
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0)  # the in-process transport never yields on its own
+
+
+async def run(app_module, client, clients, max_batch, args):
+    app_module.ml_batcher = MicroBatcher(
+        app_module.run_classifier_batch, max_batch=max_batch, max_wait_ms=args.max_wait_ms,
+        max_inflight=app_module.ML_WORKERS)
+    deadline = time.monotonic() + args.seconds
+    latencies = []
+    await asyncio.gather(*(client_loop(client, deadline, args.card_words, latencies) for _ in range(clients)))
+    stats = app_module.ml_batcher.stats()
+    return len(latencies) / args.seconds, percentile(latencies, 0.5), percentile(latencies, 0.99), stats["batch_size"]["mean"]
+
+
+async def main(args):
+    engine = create_engine(db.DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    import app as app_module
+    app = app_module.app
+    await app.router.startup()
+    rows = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for clients in CLIENTS:
+                for label, max_batch in (("off", 1), ("on", args.max_batch)):
+                    rows.append((clients, label, *await run(app_module, client, clients, max_batch, args)))
+    finally:
+        await app.router.shutdown()
+
+    print(f"{args.card_words}-word cards, ML_EXECUTOR={app_module.ml_executor.mode}, {app_module.ML_WORKERS} workers, "
+          f"max batch {args.max_batch}, max wait {args.max_wait_ms:g} ms, {os.cpu_count()} CPUs")
+    print(f"{'clients':>7} | {'batching':>8} | {'req/s':>7} | {'p50 ms':>7} | {'p99 ms':>7} | {'mean batch':>10}")
+    print("-" * 61)
+    for clients, label, rate, p50, p99, mean_batch in rows:
+        print(f"{clients:>7} | {label:>8} | {rate:>7.0f} | {p50:>7.2f} | {p99:>7.2f} | {mean_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--card-words", type=int, default=40)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    asyncio.run(main(parser.parse_args()))
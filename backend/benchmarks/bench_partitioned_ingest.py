@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Hot-path write cost with and without monthly shards. Seeds N events spread over
+the last `--months` months into a single-table database and into a partitioned
+one (services/shards.py), then times batches of current-month events written
+the way the ingest writer does (group transaction per batch) and reports the
+size of the B-tree each mode writes into.
+
+Usage:
+    python benchmarks/bench_partitioned_ingest.py [--seed-events N] [--months M] [--batches B]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from db import SQLITE_PRAGMAS, apply_pragmas
+from models import Base
+from services.ingest import EVENT_COLUMNS, LookupCache, write_event_rows
+from services.shards import ShardSet, day_number, month_of_day, schema_name
+
+BATCH_SIZE = 1000
+DOMAINS = [f"www.site{i}.com" for i in range(300)]
+EVENT_TYPES = ("page_view", "content_analysis", "scroll", "focus_alert")
+
+
+def make_rows(n, start, span_seconds, user_ids):
+    rows = []
+    for i in range(n):
+        domain = random.choice(DOMAINS)
+        fields = {
+            "user_id": random.choice(user_ids),
+            "event_id": f"{random.getrandbits(64):016x}",
+            "event_type": random.choice(EVENT_TYPES),
+            "timestamp": (start + timedelta(seconds=span_seconds * i / max(n, 1))).isoformat(),
+            "domain": domain,
+            "url": f"https://{domain}/watch?v={random.randrange(20_000)}",
+            "duration": random.randrange(1, 120),
+            "browser": "Chrome",
+        }
+        rows.append(tuple(fields.get(column) for column in EVENT_COLUMNS))
+    return rows
+
+
+def write(conn, rows, lookups, shards=None):
+    cursor = conn.cursor()
+    if shards is not None:
+        months = sorted({month_of_day(day_number(datetime.fromisoformat(row[3]).date())) for row in rows})
+        shards.retain(conn, months)
+        for month in months:
+            shards.attach(conn, month, create=True)
+    cursor.execute("BEGIN")
+    write_event_rows(cursor, rows, sorted({row[0] for row in rows}), rows[-1][3], lookups, shards)
+    cursor.execute("COMMIT")
+    lookups.commit()
+
+
+def open_db(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    conn = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(conn, SQLITE_PRAGMAS)
+    return conn
+
+
+def btree_bytes(conn, schema="main"):
+    page_size = conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+    return conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0] * page_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed-events", type=int, default=2_000_000)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--batches", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(14)
+
+    user_ids = [f"{random.getrandbits(256):064x}" for _ in range(5000)]
+    now = datetime.now()
+    start = now - timedelta(days=30 * args.months)
+    span = (now - start).total_seconds() - 60
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("single", "partitioned"):
+            random.seed(14)
+            conn = open_db(os.path.join(tmp, f"{mode}.db"))
+            shards = ShardSet(os.path.join(tmp, f"{mode}.shards")) if mode == "partitioned" else None
+            lookups = LookupCache()
+            chunk = 50_000
+            for offset in range(0, args.seed_events, chunk):
+                n = min(chunk, args.seed_events - offset)
+                part_start = start + timedelta(seconds=span * offset / args.seed_events)
+                write(conn, make_rows(n, part_start, span * n / args.seed_events, user_ids), lookups, shards)
+
+            if shards is not None:
+                shards.prepare_writer(conn)
+            timings = []
+            for _ in range(args.batches):
+                rows = make_rows(BATCH_SIZE, datetime.now(), 0, user_ids)
+                started = time.perf_counter()
+                write(conn, rows, lookups, shards)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            current = month_of_day(day_number(now.date()))
+            target = btree_bytes(conn, schema_name(current)) if shards is not None else btree_bytes(conn)
+            results[mode] = {
+                "events_per_sec": BATCH_SIZE * len(timings) / sum(timings),
+                "p50_ms": timings[len(timings) // 2] * 1000,
+                "p99_ms": timings[int(len(timings) * 0.99)] * 1000,
+                "target_mb": target / 1024 / 1024,
+            }
+            conn.close()
+
+    print(f"{args.seed_events:,} seeded events over {args.months} months, "
+          f"{args.batches} batches of {BATCH_SIZE} current-month events")
+    print(f"{'mode':>12} | {'ev/s':>9} | {'p50 ms':>8} | {'p99 ms':>8} | {'written file MB':>15}")
+    print("-" * 64)
+    for mode, r in results.items():
+        print(f"{mode:>12} | {r['events_per_sec']:>9,.0f} | {r['p50_ms']:>8.1f} | {r['p99_ms']:>8.1f} | "
+              f"{r['target_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+What the retention job reclaims and what it costs the ingest writer. Seeds N events
+with snippet text over the last `--days` days, rolls them up, then for each delete
+batch size runs services/retention.py on a copy of that database while a writer
+thread commits small event batches, and reports rows deleted, snippets cleared,
+bytes reclaimed and the writer's commit latency (and busy_timeout failures) next to an idle baseline.
+
+Usage:
+    python benchmarks/bench_retention.py [--events N] [--days D] [--event-days N] [--snippet-days M]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+
+from db import SQLITE_PRAGMAS, apply_pragmas
+from models import Base
+from services.ingest import EVENT_COLUMNS, LookupCache, write_event_rows
+from services.retention import run_retention
+from services.rollup import run_rollup
+
+DOMAINS = [f"www.site{i}.com" for i in range(300)]
+EVENT_TYPES = ("page_view", "content_analysis", "scroll", "focus_alert")
+WORDS = "the of and to in is you that it he was for on are as with his they at be this from".split()
+WRITE_BATCH = 100
+
+
+def make_rows(n, start, span_seconds, user_ids):
+    rows = []
+    for i in range(n):
+        domain = random.choice(DOMAINS)
+        event_type = random.choice(EVENT_TYPES)
+        fields = {
+            "user_id": random.choice(user_ids),
+            "event_id": f"{random.getrandbits(64):016x}",
+            "event_type": event_type,
+            "timestamp": (start + timedelta(seconds=span_seconds * i / max(n, 1))).isoformat(),
+            "domain": domain,
+            "url": f"https://{domain}/watch?v={random.randrange(20_000)}",
+            "duration": random.randrange(1, 120),
+            "browser": "Chrome",
+        }
+        if event_type == "content_analysis":
+            fields["snippet_opt_in"] = 1
+            fields["snippet_text"] = " ".join(random.choices(WORDS, k=80))
+        rows.append(tuple(fields.get(column) for column in EVENT_COLUMNS))
+    return rows
+
+
+def seed(path, n, days):
+    engine = create_engine(f"sqlite:///{path}")
+    # auto_vacuum has to be set before the first table is created
+    event.listen(engine, "connect", lambda conn, record: apply_pragmas(conn))
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, SQLITE_PRAGMAS)
+    lookups = LookupCache()
+    user_ids = [f"{random.getrandbits(256):064x}" for _ in range(200)]
+    start = datetime.now() - timedelta(days=days)
+    span = days * 86400 - 60
+    chunk = 50_000
+    for offset in range(0, n, chunk):
+        size = min(chunk, n - offset)
+        rows = make_rows(size, start + timedelta(seconds=span * offset / n), span * size / n, user_ids)
+        write_event_rows(conn.cursor(), rows, sorted({row[0] for row in rows}), rows[-1][3], lookups)
+        conn.commit()
+        lookups.commit()
+    run_rollup(conn, 50_000)
+    conn.close()
+    return user_ids
+
+
+def writer(path, user_ids, stop, latencies, timeouts):
+    conn = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(conn, SQLITE_PRAGMAS)
+    lookups = LookupCache()
+    while not stop.is_set():
+        rows = make_rows(WRITE_BATCH, datetime.now(), 0, user_ids)
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN")
+            write_event_rows(conn.cursor(), rows, sorted({row[0] for row in rows}), rows[-1][3], lookups)
+            conn.execute("COMMIT")
+            lookups.commit()
+        except sqlite3.OperationalError:
+            # busy_timeout ran out waiting for the retention transaction
+            conn.rollback()
+            lookups.rollback()
+            timeouts.append(1)
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.005)
+    conn.close()
+
+
+def phase(path, user_ids, args, batch_size=None):
+    """Writer latencies while retention runs (or for --idle-seconds without it)."""
+    stop, latencies, timeouts = threading.Event(), [], []
+    thread = threading.Thread(target=writer, args=(path, user_ids, stop, latencies, timeouts))
+    thread.start()
+    result = None
+    try:
+        if batch_size is None:
+            time.sleep(args.idle_seconds)
+        else:
+            conn = sqlite3.connect(path)
+            apply_pragmas(conn, SQLITE_PRAGMAS)
+            result = run_retention(conn, args.event_days, args.snippet_days, batch_size, args.pause_ms)
+            conn.close()
+    finally:
+        stop.set()
+        thread.join()
+    latencies.sort()
+    return result, {
+        "commits": len(latencies) - len(timeouts),
+        "timeouts": len(timeouts),
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "max": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--event-days", type=int, default=90)
+    parser.add_argument("--snippet-days", type=int, default=30)
+    parser.add_argument("--pause-ms", type=int, default=10)
+    parser.add_argument("--idle-seconds", type=float, default=5)
+    args = parser.parse_args()
+    random.seed(15)
+
+    mb = 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, "seeded.db")
+        user_ids = seed(seeded, args.events, args.days)
+        print(f"{args.events:,} events over {args.days} days, {os.path.getsize(seeded) / mb:.1f} MB; "
+              f"keep events {args.event_days} days, snippets {args.snippet_days} days")
+        print(f"{'run':>20} | {'deleted':>9} | {'cleared':>9} | {'reclaimed MB':>12} | {'took s':>7} | "
+              f"{'commits':>7} | {'locked':>6} | {'p50 ms':>7} | {'p99 ms':>7} | {'max ms':>7}")
+        print("-" * 119)
+        for batch_size in (None, 1000, 10_000, args.events):
+            path = os.path.join(tmp, "run.db")
+            shutil.copy(seeded, path)
+            result, writes = phase(path, user_ids, args, batch_size)
+            name = "idle" if batch_size is None else f"batch {batch_size:,}"
+            if result is None:
+                cells = f"{'':>9} | {'':>9} | {'':>12} | {args.idle_seconds:>7.1f}"
+            else:
+                cells = (f"{result['events_deleted']:>9,} | {result['snippets_cleared']:>9,} | "
+                         f"{result['bytes_reclaimed'] / mb:>12.1f} | {result['duration_ms'] / 1000:>7.1f}")
+            print(f"{name:>20} | {cells} | {writes['commits']:>7} | {writes['timeouts']:>6} | {writes['p50']:>7.1f} | "
+                  f"{writes['p99']:>7.1f} | {writes['max']:>7.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Compare the old two-day rescan rollup with the incremental watermark rollup.
+Seeds a throwaway database with N content_analysis events spread over two days,
+primes the rollup, appends K new events, then times one run of each. Also times
+a 30-day per-domain query over raw usage_events_v against the rollup-backed one.
+
+Usage:
+    python benchmarks/bench_rollup.py [--seed-events N] [--new-events K]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from models import Base
+from services.ingest import EVENT_COLUMNS, epoch_ms, write_event_rows
+from services.rollup import SECONDS_PER_ANALYSIS, day_cutoff, facts_cte, run_rollup
+
+SENTIMENTS = ("negative", "neutral", "positive")
+
+
+def legacy_rollup(conn, days=2):
+    """Previous _compute_sentiment_seconds body: fetchall over the window, overwrite upserts."""
+    cursor = conn.cursor()
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    cursor.execute(
+        "SELECT user_id, timestamp, behavior_json FROM usage_events_v "
+        "WHERE event_type = 'content_analysis' AND ts_ms >= ?",
+        (epoch_ms(cutoff),),
+    )
+    aggregates = {}
+    for user_id, ts, behavior in cursor.fetchall():
+        sent = json.loads(behavior).get("sentiment") if behavior else None
+        vals = aggregates.setdefault((user_id, datetime.fromisoformat(ts).date().isoformat()),
+                                     {"doom": 0, "neutral": 0, "positive": 0})
+        column = {"negative": "doom", "neutral": "neutral", "positive": "positive"}.get(sent)
+        if column:
+            vals[column] += SECONDS_PER_ANALYSIS
+    for (user_id, date_str), vals in aggregates.items():
+        cursor.execute(
+            """
+            INSERT INTO daily_stats (user_id, date, doom_seconds, neutral_seconds, positive_seconds)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, date) DO UPDATE SET
+              doom_seconds=excluded.doom_seconds,
+              neutral_seconds=excluded.neutral_seconds,
+              positive_seconds=excluded.positive_seconds
+            """,
+            (user_id, date_str + "T00:00:00", vals["doom"], vals["neutral"], vals["positive"]),
+        )
+    conn.commit()
+
+
+RAW_DOMAIN_QUERY = """
+    SELECT domain, COUNT(*), COUNT(DISTINCT user_id), AVG(duration), MAX(duration), SUM(duration)
+    FROM usage_events_v WHERE ts_ms >= :cutoff_ms GROUP BY domain
+"""
+ROLLUP_DOMAIN_QUERY = facts_cte() + """
+    SELECT domain, SUM(event_count), COUNT(DISTINCT user_id),
+           SUM(duration_sum) * 1.0 / NULLIF(SUM(duration_count), 0), MAX(duration_max), SUM(duration_sum)
+    FROM facts GROUP BY domain
+"""
+
+
+def append_events(conn, n):
+    now = datetime.now()
+    rows = []
+    for _ in range(n):
+        sentiment, doom_score = random.choice(SENTIMENTS), random.random()
+        fields = {
+            "user_id": f"{random.randrange(200):064x}",
+            "event_type": "content_analysis",
+            "timestamp": (now - timedelta(seconds=random.randrange(2 * 86400 - 60))).isoformat(),
+            "domain": "www.youtube.com",
+            "behavior_json": json.dumps({"sentiment": sentiment, "doom_score": doom_score}),
+            "sentiment": sentiment,
+            "doom_score": doom_score,
+        }
+        rows.append(tuple(fields.get(column) for column in EVENT_COLUMNS))
+    write_event_rows(conn.cursor(), rows, sorted({row[0] for row in rows}), now.isoformat())
+    conn.commit()
+
+
+def timed(fn, conn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(conn)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed-events", type=int, default=500_000)
+    parser.add_argument("--new-events", type=int, default=5_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        conn = sqlite3.connect(path)
+
+        append_events(conn, args.seed_events)
+        run_rollup(conn)
+        append_events(conn, args.new_events)
+
+        legacy_ms, legacy_mb = timed(legacy_rollup, conn)
+        incremental_ms, incremental_mb = timed(run_rollup, conn)
+        append_events(conn, args.new_events)
+        params = {"cutoff": day_cutoff(30), "cutoff_ms": epoch_ms(day_cutoff(30))}
+        raw_ms, _ = timed(lambda c: c.execute(RAW_DOMAIN_QUERY, params).fetchall(), conn)
+        rollup_ms, _ = timed(lambda c: c.execute(ROLLUP_DOMAIN_QUERY, params).fetchall(), conn)
+        conn.close()
+
+    print(f"{args.seed_events:,} events in window, {args.new_events:,} new since last run")
+    print(f"{'rollup':>12} | {'ms':>9} | {'peak MB':>8}")
+    print("-" * 36)
+    print(f"{'2-day scan':>12} | {legacy_ms:>9.1f} | {legacy_mb:>8.1f}")
+    print(f"{'incremental':>12} | {incremental_ms:>9.1f} | {incremental_mb:>8.1f}")
+    print(f"\n30-day domain query: raw usage_events_v {raw_ms:.1f} ms, "
+          f"rollup + {args.new_events:,}-event tail {rollup_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
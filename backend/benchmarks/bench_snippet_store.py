@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Storage and scan cost of the content-addressed snippet store against snippet text
+kept inline on usage_events. For each share of distinct snippets, writes N events
+through write_event_rows, copies them into a second database with the text inlined
+(decompressed from snippets), then reports usage_events and snippets sizes, a full
+scan of usage_events and reading back the last day's snippet text.
+
+Usage:
+    python benchmarks/bench_snippet_store.py [--events N] [--snippet-words N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta
+
+# ensure backend package path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from models import Base
+from services.ingest import DAY_MS, EVENT_COLUMNS, LookupCache, load_snippets, write_event_rows
+
+DOMAINS = [f"www.site{i}.com" for i in range(300)]
+EVENT_TYPES = ("page_view", "content_analysis", "scroll", "focus_alert")
+WORDS = ("the of and to in is you that it he was for on are as with his they at be this from "
+         "watch video like share subscribe comment trending new best top funny news game").split()
+CHUNK = 50_000
+
+# usage_events as it was, snippet_text inline, filled from the content-addressed copy
+INLINE_COPY_SQL = """
+    CREATE TABLE inline.usage_events AS
+    SELECT e.id, e.user_id, e.event_id, e.event_type_id, e.ts_ms, e.day, e.domain_id, e.url,
+           e.duration, e.extension_version_id, e.browser_id, e.snippet_opt_in,
+           unzip(s.body) AS snippet_text, e.behavior_json, e.vision_json,
+           e.sentiment, e.content_type, e.doom_score, e.scroll_score, e.model_version
+    FROM usage_events e LEFT JOIN snippets s ON s.hash = e.snippet_hash
+    ORDER BY e.id
+"""
+SCAN_SQL = "SELECT COUNT(*), SUM(duration), COUNT(sentiment) FROM usage_events"
+RECENT_SQL = {
+    "inline": "SELECT snippet_text FROM usage_events WHERE ts_ms >= ? AND snippet_text IS NOT NULL",
+    "hashed": "SELECT snippet_hash FROM usage_events WHERE ts_ms >= ? AND snippet_hash IS NOT NULL",
+}
+
+
+def make_rows(n, distinct, words, days=30):
+    """Yield chunks of EVENT_COLUMNS rows whose snippets come from `distinct` texts."""
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / max(n, 1)
+    user_ids = [f"{random.getrandbits(256):064x}" for _ in range(500)]
+    pool = [" ".join(random.choices(WORDS, k=words)) for _ in range(distinct)] if distinct else None
+    for offset in range(0, n, CHUNK):
+        rows = []
+        for i in range(offset, min(offset + CHUNK, n)):
+            domain = random.choice(DOMAINS)
+            event_type = random.choice(EVENT_TYPES)
+            fields = {
+                "user_id": random.choice(user_ids),
+                "event_id": f"evt-{i}",
+                "event_type": event_type,
+                "timestamp": (start + timedelta(seconds=i * step)).isoformat(),
+                "domain": domain,
+                "duration": random.randrange(1, 120),
+            }
+            if event_type == "content_analysis":
+                fields["snippet_opt_in"] = 1
+                fields["snippet_text"] = random.choice(pool) if pool else " ".join(random.choices(WORDS, k=words))
+            rows.append(tuple(fields.get(column) for column in EVENT_COLUMNS))
+        yield rows
+
+
+def sizes(conn, schema="main"):
+    return dict(conn.execute(f"SELECT name, SUM(pgsize) FROM dbstat('{schema}') GROUP BY name"))
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(tmp, args, distinct):
+    hashed_path, inline_path = os.path.join(tmp, "hashed.db"), os.path.join(tmp, "inline.db")
+    engine = create_engine(f"sqlite:///{hashed_path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(hashed_path)
+    lookups = LookupCache()
+    now = datetime.now().isoformat()
+    for rows in make_rows(args.events, distinct, args.snippet_words):
+        write_event_rows(conn.cursor(), rows, sorted({row[0] for row in rows}), now, lookups)
+        conn.commit()
+        lookups.commit()
+    conn.create_function("unzip", 1, lambda body: zlib.decompress(body).decode("utf-8") if body else None)
+    conn.execute("ATTACH DATABASE ? AS inline", (inline_path,))
+    conn.execute(INLINE_COPY_SQL)
+    conn.execute("CREATE INDEX inline.ix_usage_events_ts_ms ON usage_events (ts_ms)")
+    conn.commit()
+    conn.execute("DETACH DATABASE inline")
+    conn.execute("VACUUM")
+    conn.close()
+
+    since = int(time.time() * 1000) - DAY_MS
+    results = {}
+    for name, path in (("inline", inline_path), ("hashed", hashed_path)):
+        conn = sqlite3.connect(path)
+        objects = sizes(conn)
+        if name == "inline":
+            recent = lambda: conn.execute(RECENT_SQL["inline"], (since,)).fetchall()
+        else:
+            recent = lambda: load_snippets(
+                conn.cursor(), {h for (h,) in conn.execute(RECENT_SQL["hashed"], (since,))})
+        results[name] = {
+            "events": objects.get("usage_events", 0),
+            "snippets": objects.get("snippets", 0) + objects.get("idx_snippets_unreferenced", 0),
+            "scan_ms": timed(lambda: conn.execute(SCAN_SQL).fetchall()),
+            "recent_ms": timed(recent),
+        }
+        conn.close()
+        os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--snippet-words", type=int, default=120)
+    args = parser.parse_args()
+    random.seed(16)
+
+    mb = 1024 * 1024
+    snippets = args.events // len(EVENT_TYPES)
+    print(f"{args.events:,} events, ~{snippets:,} with a {args.snippet_words}-word snippet")
+    print(f"{'distinct':>10} | {'layout':>6} | {'events MB':>9} | {'snippets MB':>11} | {'total MB':>8} | "
+          f"{'scan ms':>8} | {'last day ms':>11}")
+    print("-" * 84)
+    with tempfile.TemporaryDirectory() as tmp:
+        for distinct in (None, snippets // 10, snippets // 100):
+            label = "all" if distinct is None else f"{distinct:,}"
+            for name, r in run(tmp, args, distinct).items():
+                print(f"{label:>10} | {name:>6} | {r['events'] / mb:>9.1f} | {r['snippets'] / mb:>11.1f} | "
+                      f"{(r['events'] + r['snippets']) / mb:>8.1f} | {r['scan_ms']:>8.1f} | {r['recent_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
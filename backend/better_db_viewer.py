@@ -3,14 +3,15 @@
 Better database viewer for Doomscroll Detox
 """
 
-import sqlite3
 from datetime import datetime, timedelta
 import pandas as pd
 from tabulate import tabulate
 
+from db import connect
+
 def view_database_summary():
     """Show a comprehensive summary of the database"""
-    conn = sqlite3.connect('doomscroll_detox.db')
+    conn = connect()
     
     print("🧘‍♀️ DOOMSCROLL DETOX DATABASE SUMMARY")
     print("=" * 50)
@@ -39,7 +40,7 @@ def view_database_summary():
             MAX(duration) as max_duration,
             MIN(timestamp) as first_event,
             MAX(timestamp) as last_event
-        FROM usage_events 
+        FROM usage_events_v 
         GROUP BY event_type
         ORDER BY count DESC
     """, conn)
@@ -54,8 +55,8 @@ def view_database_summary():
             duration,
             timestamp,
             user_id
-        FROM usage_events 
-        ORDER BY timestamp DESC 
+        FROM usage_events_v 
+        ORDER BY ts_ms DESC 
         LIMIT 10
     """, conn)
     print(tabulate(recent_df, headers='keys', tablefmt='grid'))
@@ -64,7 +65,7 @@ def view_database_summary():
 
 def view_user_activity(user_id=None):
     """Show detailed user activity"""
-    conn = sqlite3.connect('doomscroll_detox.db')
+    conn = connect()
     
     if user_id:
         where_clause = f"WHERE user_id = '{user_id}'"
@@ -87,7 +88,7 @@ def view_user_activity(user_id=None):
             MAX(duration) as max_duration,
             MIN(timestamp) as first_event,
             MAX(timestamp) as last_event
-        FROM usage_events 
+        FROM usage_events_v 
         {where_clause}
         GROUP BY user_id, event_type, domain
         ORDER BY event_count DESC
@@ -99,7 +100,7 @@ def view_user_activity(user_id=None):
 
 def view_daily_usage():
     """Show daily usage patterns"""
-    conn = sqlite3.connect('doomscroll_detox.db')
+    conn = connect()
     
     print("\n📅 DAILY USAGE PATTERNS:")
     print("=" * 50)
@@ -112,7 +113,7 @@ def view_daily_usage():
             COUNT(DISTINCT user_id) as active_users,
             AVG(duration) as avg_duration,
             SUM(duration) as total_duration_minutes
-        FROM usage_events 
+        FROM usage_events_v 
         WHERE event_type = 'usage_sync'
         GROUP BY DATE(timestamp)
         ORDER BY date DESC
@@ -124,7 +125,7 @@ def view_daily_usage():
 
 def view_site_usage():
     """Show usage by website"""
-    conn = sqlite3.connect('doomscroll_detox.db')
+    conn = connect()
     
     print("\n🌐 WEBSITE USAGE:")
     print("=" * 50)
@@ -137,7 +138,7 @@ def view_site_usage():
             AVG(duration) as avg_duration_minutes,
             MAX(duration) as max_duration_minutes,
             SUM(duration) as total_duration_minutes
-        FROM usage_events 
+        FROM usage_events_v 
         WHERE event_type = 'usage_sync'
         GROUP BY domain
         ORDER BY total_duration_minutes DESC
@@ -1,24 +1,385 @@
 """
 Database connection and setup
 Simple SQLite database for local development
+
+All SQLite access (API, rollup job, scripts) goes through this module so every
+connection gets the same pragmas and statement cache.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import functools
+import logging
 import os
+import sqlite3
+import threading
+import time
+
+from services.shards import ShardSet
+
+logger = logging.getLogger(__name__)
+
+# Values already in the environment win over config.env
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.env"))
 
 # Database configuration
-DATABASE_URL = "sqlite:///./doomscroll_detox.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./doomscroll_detox.db")
+DATABASE_PATH = DATABASE_URL.replace("sqlite:///", "", 1)
+
+# Applied to every connection, in order (journal_mode first: it is persistent
+# and other pragmas behave differently under WAL)
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-32000")),  # negative = KiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Only applied while a database is still empty: auto_vacuum can't change once tables
+# exist without a full VACUUM (see the incremental_auto_vacuum migration), and
+# setting it on an existing file takes the write lock
+SQLITE_CREATE_PRAGMAS = {
+    "auto_vacuum": os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL"),
+}
+# Prepared statements kept per connection by the sqlite3 module
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# "single": every event in the main database's usage_events
+# "partitioned": new events go to monthly shard files in SHARD_DIR (services/shards.py)
+STORAGE_MODE = os.getenv("STORAGE_MODE", "single")
+SHARD_DIR = os.getenv("SHARD_DIR", DATABASE_PATH + ".shards")
+SHARD_SEAL_READ_ONLY = os.getenv("SHARD_SEAL_READ_ONLY", "true").lower() == "true"
+
+
+def apply_pragmas(conn, pragmas: Optional[Dict[str, Any]] = None, read_only: bool = False) -> None:
+    """Apply the configured pragmas to a DB-API connection (and SQLITE_CREATE_PRAGMAS to a new database)."""
+    cursor = conn.cursor()
+    if not read_only:
+        cursor.execute("PRAGMA page_count")
+        if cursor.fetchone()[0] == 0:
+            for name, value in SQLITE_CREATE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+    for name, value in (pragmas or SQLITE_PRAGMAS).items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+class ConnectionPool:
+    """Per-thread SQLite connections with shared configuration.
+
+    Notes:
+        - connection() returns the calling thread's connection, opening it on first
+          use; callers must not close it.
+        - connect() opens a dedicated connection the caller owns and closes
+          (writer threads, one-off scripts).
+        - Connections of threads that have exited are closed on the next stats()
+          or close_all() call.
+    """
+
+    def __init__(self, path: str, pragmas: Dict[str, Any], statement_cache: int = 256, read_only: bool = False) -> None:
+        self.path = path
+        self.read_only = read_only
+        if read_only:
+            # journal_mode is a write; query_only guards against accidental DML
+            pragmas = {k: v for k, v in pragmas.items() if k != "journal_mode"}
+            pragmas["query_only"] = 1
+        self.pragmas = pragmas
+        self.statement_cache = statement_cache
+        self.generation = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, tuple] = {}  # thread ident -> (thread, connection)
+        self._stats = {"opened": 0, "closed": 0, "checkouts": 0}
+
+    def connect(self, isolation_level: Optional[str] = "", **kwargs) -> sqlite3.Connection:
+        target = self.path
+        if self.read_only:
+            target = f"file:{os.path.abspath(self.path)}?mode=ro"
+            kwargs["uri"] = True
+        conn = sqlite3.connect(
+            target,
+            isolation_level=isolation_level,
+            cached_statements=self.statement_cache,
+            check_same_thread=False,
+            **kwargs,
+        )
+        apply_pragmas(conn, self.pragmas, self.read_only)
+        with self._lock:
+            self._stats["opened"] += 1
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != self.generation:
+            # The file was swapped underneath (snapshot refresh): reopen
+            self.close_thread()
+            conn = None
+        if conn is None:
+            generation = self.generation
+            conn = self.connect()
+            self._local.conn = conn
+            self._local.generation = generation
+            with self._lock:
+                self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+        with self._lock:
+            self._stats["checkouts"] += 1
+        return conn
+
+    def invalidate(self) -> None:
+        """Make every thread reopen its connection on next checkout."""
+        with self._lock:
+            self.generation += 1
+
+    def close_thread(self) -> None:
+        """Close the calling thread's pooled connection, if any."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+            self._stats["closed"] += 1
+        conn.close()
+
+    def _reap(self, all_threads: bool = False) -> None:
+        with self._lock:
+            dead = [ident for ident, (thread, _) in self._connections.items()
+                    if all_threads or not thread.is_alive()]
+            conns = [self._connections.pop(ident)[1] for ident in dead]
+            self._stats["closed"] += len(conns)
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def close_all(self) -> None:
+        self._reap(all_threads=True)
+
+    def stats(self) -> Dict[str, Any]:
+        self._reap()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pooled"] = len(self._connections)
+        stats["statement_cache_size"] = self.statement_cache
+        stats["read_only"] = self.read_only
+        return stats
+
+    def health(self) -> Dict[str, Any]:
+        """Round-trip a trivial query on the caller's connection."""
+        try:
+            conn = self.connection()
+            start = time.perf_counter()
+            conn.execute("SELECT 1").fetchone()
+            latency_ms = (time.perf_counter() - start) * 1000
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            return {
+                "status": "healthy",
+                "path": self.path,
+                "journal_mode": journal_mode,
+                "query_latency_ms": round(latency_ms, 3),
+                "pragmas": self.pragmas,
+            }
+        except sqlite3.Error as e:
+            return {"status": "unhealthy", "path": self.path, "error": str(e)}
+
+
+pool = ConnectionPool(DATABASE_PATH, SQLITE_PRAGMAS, SQLITE_STATEMENT_CACHE)
+
+
+def get_connection() -> sqlite3.Connection:
+    """Pooled connection for the calling thread (do not close)"""
+    return pool.connection()
+
+
+def connect(**kwargs) -> sqlite3.Connection:
+    """Dedicated configured connection (caller closes)"""
+    return pool.connect(**kwargs)
+
+
+shards = ShardSet(SHARD_DIR, seal_read_only=SHARD_SEAL_READ_ONLY) if STORAGE_MODE == "partitioned" else None
+
+
+def attach_event_shards(conn, days: int) -> List[str]:
+    """Attach the shards a `days` window needs to conn; returns their months for facts_cte."""
+    return shards.attach_window(conn, days) if shards is not None else []
+
 
-# Engine configuration for SQLite
+# --- Analytics read path ---
+# "readonly": mode=ro connections on the live file (WAL readers never block the writer)
+# "snapshot": mode=ro connections on a copy refreshed with the online backup API
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "readonly")
+ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", DATABASE_PATH + ".snapshot")
+ANALYTICS_MAX_STALENESS_SECONDS = float(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", "300"))
+
+
+class SnapshotManager:
+    """Keeps a point-in-time copy of the database for analytics reads.
+
+    refresh() copies the live database with the SQLite online backup API into a
+    temporary file, then atomically renames it over the snapshot. Readers holding
+    the old file keep a consistent view until they are invalidated.
+    """
+
+    def __init__(self, source: ConnectionPool, target: ConnectionPool, max_staleness: float) -> None:
+        self.source = source
+        self.target = target
+        self.max_staleness = max_staleness
+        self.as_of: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if os.path.exists(target.path):
+            self.as_of = os.path.getmtime(target.path)
+
+    def refresh(self) -> None:
+        with self._lock:
+            tmp_path = self.target.path + ".tmp"
+            started = time.time()
+            src = self.source.connect()
+            try:
+                dst = sqlite3.connect(tmp_path)
+                try:
+                    src.backup(dst, pages=4096)
+                    # Standalone file: mode=ro readers need no -wal/-shm
+                    dst.execute("PRAGMA journal_mode=DELETE")
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+            os.replace(tmp_path, self.target.path)
+            self.as_of = started
+            self.target.invalidate()
+
+    def staleness(self) -> Optional[float]:
+        return None if self.as_of is None else max(0.0, time.time() - self.as_of)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            age = self.staleness()
+            if age is None or age >= self.max_staleness:
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Analytics snapshot refresh failed")
+                    self._stop.wait(min(self.max_staleness, 30))
+                    continue
+                age = 0.0
+            self._stop.wait(max(self.max_staleness - age, 1))
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="analytics-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the refresh loop and wait for a refresh in progress to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+
+readonly_pool = ConnectionPool(DATABASE_PATH, SQLITE_PRAGMAS, SQLITE_STATEMENT_CACHE, read_only=True)
+snapshot_pool = ConnectionPool(ANALYTICS_SNAPSHOT_PATH, SQLITE_PRAGMAS, SQLITE_STATEMENT_CACHE, read_only=True)
+snapshot = SnapshotManager(pool, snapshot_pool, ANALYTICS_MAX_STALENESS_SECONDS)
+
+
+def get_analytics_connection():
+    """Read-only connection for analytics plus a description of its freshness.
+
+    Falls back to the live read-only path until the first snapshot exists.
+    """
+    if ANALYTICS_SOURCE == "snapshot" and snapshot.as_of is not None:
+        staleness = snapshot.staleness()
+        return snapshot_pool.connection(), {
+            "source": "snapshot",
+            "as_of": datetime.fromtimestamp(snapshot.as_of).isoformat(),
+            "staleness_seconds": round(staleness, 1),
+            "max_staleness_seconds": ANALYTICS_MAX_STALENESS_SECONDS,
+        }
+    return readonly_pool.connection(), {
+        "source": "live",
+        "as_of": datetime.now().isoformat(),
+        "staleness_seconds": 0.0,
+        "max_staleness_seconds": ANALYTICS_MAX_STALENESS_SECONDS if ANALYTICS_SOURCE == "snapshot" else 0.0,
+    }
+
+
+# --- Read executors ---
+# Blocking reads run off the event loop on bounded thread pools. Analytics scans get
+# their own pool so a slow dashboard query can't take the threads that serve
+# settings/stats lookups; writes go through the ingest writer thread instead.
+DB_READ_WORKERS = int(os.getenv("DB_READ_WORKERS", "4"))
+DB_ANALYTICS_WORKERS = int(os.getenv("DB_ANALYTICS_WORKERS", "2"))
+
+
+class ReadExecutor:
+    """Bounded thread pool that runs fn on a worker using its pooled connection."""
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"db-{name}")
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "active": 0}
+
+    def _call(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self._stats["active"] += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._stats["active"] -= 1
+                self._stats["completed"] += 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self._stats["submitted"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, fn, args, kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = stats["submitted"] - stats["completed"] - stats["active"]
+        stats["max_workers"] = self.max_workers
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+read_executors = {
+    "read": ReadExecutor("read", DB_READ_WORKERS),
+    "analytics": ReadExecutor("analytics", DB_ANALYTICS_WORKERS),
+}
+
+
+async def run_read(fn: Callable[..., Any], *args, pool: str = "read", **kwargs) -> Any:
+    """Run a blocking read on the named executor; fn uses get_connection() on the worker"""
+    return await read_executors[pool].run(fn, *args, **kwargs)
+
+
+# Engine configuration for SQLite (schema management and ORM scripts)
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-    echo=True  # Show SQL queries in console
+    echo=os.getenv("SQL_ECHO", "false").lower() == "true"  # Show SQL queries in console
 )
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    apply_pragmas(dbapi_connection)
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
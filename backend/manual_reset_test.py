@@ -3,19 +3,20 @@
 Manual daily reset test - simulates what the extension should do
 """
 
-import sqlite3
 import os
+
+from db import DATABASE_PATH, connect
 from datetime import datetime
 
 def manual_reset_test():
     """Manually test the daily reset functionality"""
-    db_path = "doomscroll_detox.db"
+    db_path = DATABASE_PATH
     
     if not os.path.exists(db_path):
         print("❌ Database file not found.")
         return
     
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     
     print("🧪 Manual Daily Reset Test")
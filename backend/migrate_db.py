@@ -3,18 +3,19 @@
 Database migration script to add new settings columns
 """
 
-import sqlite3
 import os
 
+from db import DATABASE_PATH, connect
+
 def migrate_database():
     """Add new columns to the users table"""
-    db_path = "doomscroll_detox.db"
+    db_path = DATABASE_PATH
     
     if not os.path.exists(db_path):
         print("❌ Database file not found. Please run setup_db.py first.")
         return
     
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     
     try:
@@ -32,12 +33,17 @@ def migrate_database():
             ("monitored_websites", "TEXT DEFAULT '[]'")
         ]
         
-        # Add ML fields to usage_events table
+        # Add ML fields to usage_events table (snippet text lives in the snippets
+        # table now; later usage_events changes are Alembic migrations, `alembic upgrade head`)
         usage_events_columns = [
             ("snippet_opt_in", "INTEGER DEFAULT 0"),
-            ("snippet_text", "TEXT"),
             ("behavior_json", "TEXT"),
-            ("vision_json", "TEXT")
+            ("vision_json", "TEXT"),
+            ("sentiment", "VARCHAR(16)"),
+            ("content_type", "VARCHAR(32)"),
+            ("doom_score", "FLOAT"),
+            ("scroll_score", "FLOAT"),
+            ("model_version", "VARCHAR(64)")
         ]
         
         # Add sentiment split fields to daily_stats table
@@ -4,6 +4,7 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
+from dotenv import load_dotenv
 import os
 import sys
 
@@ -14,6 +15,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import Base
 
+# Same settings as the app (EVENT_TIMEZONE, SHARD_DIR); values already in the environment win
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.env"))
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -0,0 +1,81 @@
+"""set-based snippet refcounts: drop the per-row usage_events triggers
+
+Revision ID: 2d7c4a9e6f31
+Revises: 7e3a9d1f5c20
+Create Date: 2026-10-18 09:12:37.518204
+
+"""
+from typing import Sequence, Union
+import glob
+import os
+import sqlite3
+import stat
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d7c4a9e6f31'
+down_revision: Union[str, Sequence[str], None] = '7e3a9d1f5c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# As created by 5b8f2d6e0c17_content_addressed_snippets; the writer and retention
+# now keep snippets.refcount with one UPDATE per distinct hash per batch
+TRIGGERS = {
+    'trg_usage_events_snippet_insert': """
+        AFTER INSERT ON usage_events WHEN NEW.snippet_hash IS NOT NULL
+        BEGIN
+            UPDATE snippets SET refcount = refcount + 1 WHERE hash = NEW.snippet_hash;
+        END
+    """,
+    'trg_usage_events_snippet_delete': """
+        AFTER DELETE ON usage_events WHEN OLD.snippet_hash IS NOT NULL
+        BEGIN
+            UPDATE snippets SET refcount = refcount - 1 WHERE hash = OLD.snippet_hash;
+        END
+    """,
+    'trg_usage_events_snippet_update': """
+        AFTER UPDATE OF snippet_hash ON usage_events WHEN OLD.snippet_hash IS NOT NEW.snippet_hash
+        BEGIN
+            UPDATE snippets SET refcount = refcount - 1 WHERE hash = OLD.snippet_hash;
+            UPDATE snippets SET refcount = refcount + 1 WHERE hash = NEW.snippet_hash;
+        END
+    """,
+}
+
+
+def _shard_paths():
+    """Monthly shard files (services/shards.py) next to the database, or in SHARD_DIR."""
+    directory = os.getenv("SHARD_DIR") or op.get_bind().engine.url.database + ".shards"
+    return sorted(glob.glob(os.path.join(directory, "usage_events_????-??.db")))
+
+
+def _on_shards(statements):
+    """Run `statements` in every shard file, lifting the read-only mode of sealed ones meanwhile."""
+    for path in _shard_paths():
+        conn = sqlite3.connect(path, isolation_level=None)
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode | stat.S_IWUSR)
+        try:
+            for statement in statements:
+                conn.execute(statement)
+        finally:
+            os.chmod(path, stat.S_IMODE(mode))
+            conn.close()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    statements = [f"DROP TRIGGER IF EXISTS {name}" for name in TRIGGERS]
+    for statement in statements:
+        op.execute(statement)
+    _on_shards(statements)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    statements = [f"CREATE TRIGGER IF NOT EXISTS {name} {body}" for name, body in TRIGGERS.items()]
+    for statement in statements:
+        op.execute(statement)
+    _on_shards(statements)
@@ -0,0 +1,141 @@
+"""usage_events.url inline again instead of an id into urls
+
+Revision ID: 4c9e2b7a1f68
+Revises: 8a4f1c6d2b95
+Create Date: 2026-10-18 12:20:44.903512
+
+"""
+from typing import Sequence, Union
+import glob
+import os
+import sqlite3
+import stat
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c9e2b7a1f68'
+down_revision: Union[str, Sequence[str], None] = '8a4f1c6d2b95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_CHUNK = 50000
+
+VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS usage_events_v AS
+SELECT
+    e.id, e.user_id, e.event_id, t.name AS event_type,
+    strftime('%Y-%m-%dT%H:%M:%f', e.ts_ms / 1000.0, 'unixepoch') AS timestamp, e.ts_ms, e.day,
+    d.name AS domain, {url_column},
+    e.duration, v.name AS extension_version, b.name AS browser,
+    e.snippet_opt_in, nullif(lower(hex(e.snippet_hash)), '') AS snippet_hash, e.behavior_json, e.vision_json,
+    e.sentiment, e.content_type, e.doom_score, e.scroll_score, e.model_version
+FROM usage_events e
+JOIN event_types t ON t.id = e.event_type_id
+JOIN domains d ON d.id = e.domain_id{urls_join}
+LEFT JOIN extension_versions v ON v.id = e.extension_version_id
+LEFT JOIN browsers b ON b.id = e.browser_id
+"""
+
+# Shards reference the urls table of the main database, attached under this name
+INLINE_SQL = "UPDATE usage_events SET url = (SELECT name FROM {schema}.urls WHERE id = url_id) WHERE url_id IS NOT NULL"
+INTERN_SQL = "INSERT INTO {schema}.urls (name) SELECT DISTINCT url FROM usage_events WHERE url IS NOT NULL ON CONFLICT(name) DO NOTHING"
+REFERENCE_SQL = "UPDATE usage_events SET url_id = (SELECT id FROM {schema}.urls WHERE name = url) WHERE url IS NOT NULL"
+
+
+def _in_chunks(statement):
+    """Run `statement` with an extra `AND id > ? AND id <= ?` over the main usage_events, one transaction per range."""
+    bind = op.get_bind()
+    high = bind.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM usage_events").scalar()
+    for low in range(0, high, COPY_CHUNK):
+        bind.exec_driver_sql("BEGIN")
+        bind.exec_driver_sql(f"{statement} AND id > ? AND id <= ?", (low, low + COPY_CHUNK))
+        bind.exec_driver_sql("COMMIT")
+
+
+def _shard_paths():
+    """Monthly shard files (services/shards.py) next to the database, or in SHARD_DIR."""
+    directory = os.getenv("SHARD_DIR") or op.get_bind().engine.url.database + ".shards"
+    return sorted(glob.glob(os.path.join(directory, "usage_events_????-??.db")))
+
+
+def _migrate_shards(has_column, statements):
+    """Run `statements(conn)` on every shard whose usage_events has `has_column`, then VACUUM it.
+
+    The main database is attached as `main_db` for its urls table. Sealed shards may be
+    read-only on disk, so their mode is lifted for the rewrite and put back afterwards.
+    """
+    for path in _shard_paths():
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            if has_column not in [row[1] for row in conn.execute("PRAGMA table_info(usage_events)")]:
+                continue
+            mode = os.stat(path).st_mode
+            os.chmod(path, mode | stat.S_IWUSR)
+            try:
+                conn.execute("ATTACH DATABASE ? AS main_db", (op.get_bind().engine.url.database,))
+                conn.execute("BEGIN")
+                statements(conn)
+                conn.execute("COMMIT")
+                conn.execute("DETACH DATABASE main_db")
+                conn.execute("VACUUM")
+            finally:
+                os.chmod(path, stat.S_IMODE(mode))
+        finally:
+            conn.close()
+
+
+def _upgrade_shard(conn):
+    conn.execute("ALTER TABLE usage_events ADD COLUMN url TEXT")
+    conn.execute(INLINE_SQL.format(schema="main_db"))
+    # No foreign key on the shard column, so it can be dropped in place
+    conn.execute("ALTER TABLE usage_events DROP COLUMN url_id")
+
+
+def _downgrade_shard(conn):
+    conn.execute("ALTER TABLE usage_events ADD COLUMN url_id INTEGER")
+    conn.execute(INTERN_SQL.format(schema="main_db"))
+    conn.execute(REFERENCE_SQL.format(schema="main_db"))
+    conn.execute("ALTER TABLE usage_events DROP COLUMN url")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("DROP VIEW IF EXISTS usage_events_v")
+    op.add_column('usage_events', sa.Column('url', sa.Text(), nullable=True))
+    with op.get_context().autocommit_block():
+        _in_chunks(INLINE_SQL.format(schema="main"))
+        # Shards read the names from urls, so they go before it is dropped
+        _migrate_shards('url_id', _upgrade_shard)
+
+    # SQLite can't DROP COLUMN a foreign key column, so this one rebuilds the table
+    with op.batch_alter_table('usage_events', schema=None) as batch_op:
+        batch_op.drop_column('url_id')
+    op.drop_table('urls')
+    op.execute(VIEW_SQL.format(url_column="e.url", urls_join=""))
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP VIEW IF EXISTS usage_events_v")
+    op.create_table(
+        'urls',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.execute("ALTER TABLE usage_events ADD COLUMN url_id INTEGER REFERENCES urls (id)")
+    with op.get_context().autocommit_block():
+        op.execute(INTERN_SQL.format(schema="main"))
+        _in_chunks(REFERENCE_SQL.format(schema="main"))
+        _migrate_shards('url', _downgrade_shard)
+
+    op.drop_column('usage_events', 'url')
+    op.execute(VIEW_SQL.format(url_column="u.name AS url", urls_join="\nLEFT JOIN urls u ON u.id = e.url_id"))
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
@@ -0,0 +1,226 @@
+"""content-addressed, compressed snippet store
+
+Revision ID: 5b8f2d6e0c17
+Revises: 9c1e5b7d3a42
+Create Date: 2026-10-17 23:58:14.207331
+
+"""
+from collections import Counter
+from typing import Sequence, Union
+import glob
+import hashlib
+import os
+import sqlite3
+import stat
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8f2d6e0c17'
+down_revision: Union[str, Sequence[str], None] = '9c1e5b7d3a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_CHUNK = 50000
+COMPRESSION_LEVEL = 6  # services.ingest.SNIPPET_COMPRESSION_LEVEL
+
+VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS usage_events_v AS
+SELECT
+    e.id, e.user_id, e.event_id, t.name AS event_type,
+    strftime('%Y-%m-%dT%H:%M:%f', e.ts_ms / 1000.0, 'unixepoch') AS timestamp, e.ts_ms, e.day,
+    d.name AS domain, u.name AS url,
+    e.duration, v.name AS extension_version, b.name AS browser,
+    e.snippet_opt_in, {snippet_column}, e.behavior_json, e.vision_json,
+    e.sentiment, e.content_type, e.doom_score, e.scroll_score, e.model_version
+FROM usage_events e
+JOIN event_types t ON t.id = e.event_type_id
+JOIN domains d ON d.id = e.domain_id
+LEFT JOIN urls u ON u.id = e.url_id
+LEFT JOIN extension_versions v ON v.id = e.extension_version_id
+LEFT JOIN browsers b ON b.id = e.browser_id
+"""
+
+SNIPPETS_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS snippets "
+    "(hash BLOB NOT NULL PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, refcount INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_snippets_unreferenced ON snippets (hash) WHERE refcount = 0",
+)
+
+# As in models.SNIPPET_TRIGGERS_SQL
+TRIGGERS = {
+    'trg_usage_events_snippet_insert': """
+        AFTER INSERT ON usage_events WHEN NEW.snippet_hash IS NOT NULL
+        BEGIN
+            UPDATE snippets SET refcount = refcount + 1 WHERE hash = NEW.snippet_hash;
+        END
+    """,
+    'trg_usage_events_snippet_delete': """
+        AFTER DELETE ON usage_events WHEN OLD.snippet_hash IS NOT NULL
+        BEGIN
+            UPDATE snippets SET refcount = refcount - 1 WHERE hash = OLD.snippet_hash;
+        END
+    """,
+    'trg_usage_events_snippet_update': """
+        AFTER UPDATE OF snippet_hash ON usage_events WHEN OLD.snippet_hash IS NOT NEW.snippet_hash
+        BEGIN
+            UPDATE snippets SET refcount = refcount - 1 WHERE hash = OLD.snippet_hash;
+            UPDATE snippets SET refcount = refcount + 1 WHERE hash = NEW.snippet_hash;
+        END
+    """,
+}
+
+
+def _in_chunks(select_sql, apply):
+    """Run `apply(executemany, rows)` over select_sql's rows in id ranges, each range its own transaction."""
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        high = bind.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM usage_events").scalar()
+        low = 0
+        while low < high:
+            bind.exec_driver_sql("BEGIN")
+            rows = bind.exec_driver_sql(select_sql, (low, low + COPY_CHUNK)).fetchall()
+            if rows:
+                apply(bind.exec_driver_sql, rows)
+            bind.exec_driver_sql("COMMIT")
+            low += COPY_CHUNK
+
+
+def _store_snippets(executemany, rows):
+    snippets, hashes, refcounts = {}, [], Counter()
+    for event_id, text in rows:
+        data = text.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        snippets.setdefault(digest, (digest, zlib.compress(data, COMPRESSION_LEVEL), len(data)))
+        hashes.append((digest, event_id))
+        refcounts[digest] += 1
+    executemany(
+        "INSERT INTO snippets (hash, body, size, refcount) VALUES (?, ?, ?, 0) ON CONFLICT(hash) DO NOTHING",
+        list(snippets.values()),
+    )
+    executemany("UPDATE usage_events SET snippet_hash = ? WHERE id = ?", hashes)
+    # The triggers come after the backfill, so the counts are added here
+    executemany(
+        "UPDATE snippets SET refcount = refcount + ? WHERE hash = ?",
+        [(count, digest) for digest, count in refcounts.items()],
+    )
+
+
+def _restore_texts(executemany, rows):
+    executemany(
+        "UPDATE usage_events SET snippet_text = ? WHERE id = ?",
+        [(zlib.decompress(body).decode('utf-8'), event_id) for event_id, body in rows],
+    )
+
+
+def _shard_paths():
+    """Monthly shard files (services/shards.py) next to the database, or in SHARD_DIR."""
+    directory = os.getenv("SHARD_DIR") or op.get_bind().engine.url.database + ".shards"
+    return sorted(glob.glob(os.path.join(directory, "usage_events_????-??.db")))
+
+
+def _migrate_shard(path, has_column, statements):
+    """Run `statements(conn)` on a shard whose usage_events has `has_column`, then VACUUM it.
+
+    A month is small enough for one transaction. Sealed shards may be read-only on
+    disk, so their mode is lifted for the rewrite and put back afterwards.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if has_column not in [row[1] for row in conn.execute("PRAGMA table_info(usage_events)")]:
+            return
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode | stat.S_IWUSR)
+        try:
+            conn.execute("BEGIN")
+            statements(conn)
+            conn.execute("COMMIT")
+            conn.execute("VACUUM")
+        finally:
+            os.chmod(path, stat.S_IMODE(mode))
+    finally:
+        conn.close()
+
+
+def _upgrade_shard(conn):
+    for statement in SNIPPETS_TABLE_SQL:
+        conn.execute(statement)
+    conn.execute("ALTER TABLE usage_events ADD COLUMN snippet_hash BLOB")
+    rows = conn.execute("SELECT id, snippet_text FROM usage_events WHERE snippet_text IS NOT NULL").fetchall()
+    if rows:
+        _store_snippets(conn.executemany, rows)
+    for name, body in TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    conn.execute("ALTER TABLE usage_events DROP COLUMN snippet_text")
+
+
+def _downgrade_shard(conn):
+    for name in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("ALTER TABLE usage_events ADD COLUMN snippet_text TEXT")
+    rows = conn.execute(
+        "SELECT e.id, s.body FROM usage_events e JOIN snippets s ON s.hash = e.snippet_hash"
+    ).fetchall()
+    if rows:
+        _restore_texts(conn.executemany, rows)
+    # No foreign key on the shard column, so it can be dropped in place
+    conn.execute("ALTER TABLE usage_events DROP COLUMN snippet_hash")
+    conn.execute("DROP TABLE snippets")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'snippets',
+        sa.Column('hash', sa.LargeBinary(length=16), nullable=False),
+        sa.Column('body', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('hash'),
+    )
+    op.create_index('idx_snippets_unreferenced', 'snippets', ['hash'], unique=False,
+                    sqlite_where=sa.text('refcount = 0'))
+    op.execute("ALTER TABLE usage_events ADD COLUMN snippet_hash BLOB REFERENCES snippets (hash)")
+
+    _in_chunks(
+        "SELECT id, snippet_text FROM usage_events WHERE id > ? AND id <= ? AND snippet_text IS NOT NULL",
+        _store_snippets,
+    )
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    # The view references snippet_text, so it has to go before the column
+    op.execute("DROP VIEW IF EXISTS usage_events_v")
+    op.drop_column('usage_events', 'snippet_text')
+    op.execute(VIEW_SQL.format(snippet_column="nullif(lower(hex(e.snippet_hash)), '') AS snippet_hash"))
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
+    for path in _shard_paths():
+        _migrate_shard(path, 'snippet_text', _upgrade_shard)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.add_column('usage_events', sa.Column('snippet_text', sa.Text(), nullable=True))
+    _in_chunks(
+        """SELECT e.id, s.body FROM usage_events e JOIN snippets s ON s.hash = e.snippet_hash
+           WHERE e.id > ? AND e.id <= ?""",
+        _restore_texts,
+    )
+
+    op.execute("DROP VIEW IF EXISTS usage_events_v")
+    # SQLite can't DROP COLUMN a foreign key column, so this one rebuilds the table
+    with op.batch_alter_table('usage_events', schema=None) as batch_op:
+        batch_op.drop_column('snippet_hash')
+    op.drop_index('idx_snippets_unreferenced', table_name='snippets')
+    op.drop_table('snippets')
+    op.execute(VIEW_SQL.format(snippet_column="e.snippet_text"))
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
+    for path in _shard_paths():
+        _migrate_shard(path, 'snippet_hash', _downgrade_shard)
@@ -0,0 +1,29 @@
+"""users.settings_version for conditional settings sync
+
+Revision ID: 7e3a9d1f5c20
+Revises: 5b8f2d6e0c17
+Create Date: 2026-10-18 01:20:44.913552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e3a9d1f5c20'
+down_revision: Union[str, Sequence[str], None] = '5b8f2d6e0c17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows start at 1; 0 is the ETag of a user with no row yet
+    op.add_column('users', sa.Column('settings_version', sa.Integer(), nullable=False, server_default=sa.text('1')))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'settings_version')
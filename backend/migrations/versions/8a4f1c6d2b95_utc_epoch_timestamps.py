@@ -0,0 +1,116 @@
+"""usage_events.ts_ms as real UTC epoch ms
+
+Revision ID: 8a4f1c6d2b95
+Revises: 2d7c4a9e6f31
+Create Date: 2026-10-18 10:41:09.277615
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo
+import glob
+import os
+import sqlite3
+import stat
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4f1c6d2b95'
+down_revision: Union[str, Sequence[str], None] = '2d7c4a9e6f31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_CHUNK = 50000
+# DST and other offset changes fall on quarter hours
+STEP_MS = 15 * 60 * 1000
+NAIVE_EPOCH = datetime(1970, 1, 1)
+# rollup_state rows holding a ts_ms (services.retention.SNIPPET_MARKER and its per-shard names)
+MARKERS_WHERE = "name LIKE 'retention:snippet_text%'"
+
+
+def _zone():
+    """services.shards.event_tz(): the zone the naive server timestamps were written in."""
+    return ZoneInfo(os.environ["EVENT_TIMEZONE"]) if os.getenv("EVENT_TIMEZONE") else None
+
+
+def _offset_ms(ms, to_utc):
+    """UTC offset in ms at `ms`: a naive wall-clock value (to_utc) or a real instant."""
+    if to_utc:
+        wall = NAIVE_EPOCH + timedelta(milliseconds=ms)
+        zone = _zone()
+        aware = wall.replace(tzinfo=zone) if zone is not None else wall.astimezone()
+    else:
+        aware = datetime.fromtimestamp(ms / 1000, timezone.utc).astimezone(_zone())
+    return aware.utcoffset() // timedelta(milliseconds=1)
+
+
+def _shift_sql(column, low, high, to_utc):
+    """`column` moved between naive wall-clock ms and UTC epoch ms, for values in [low, high].
+
+    The offset is looked up every STEP_MS and runs of equal offsets become one CASE
+    branch, so a table spanning years needs a couple of branches per year.
+    """
+    runs = []
+    for ms in range(low - low % STEP_MS, high + STEP_MS, STEP_MS):
+        offset = _offset_ms(ms, to_utc)
+        if runs and runs[-1][1] == offset:
+            continue
+        runs.append((ms, offset))
+    sign = "-" if to_utc else "+"
+    if len(runs) == 1:
+        return f"{column} {sign} {runs[0][1]}"
+    branches = " ".join(f"WHEN {column} < {start} THEN {offset}"
+                        for (_, offset), (start, _) in zip(runs, runs[1:]))
+    return f"{column} {sign} CASE {branches} ELSE {runs[-1][1]} END"
+
+
+def _convert(execute, to_utc, markers=False):
+    """Rewrite ts_ms of one database's usage_events id range by id range (and the snippet markers)."""
+    low, high, last_id = execute("SELECT MIN(ts_ms), MAX(ts_ms), COALESCE(MAX(id), 0) FROM usage_events").fetchone()
+    if low is not None:
+        update_sql = f"UPDATE usage_events SET ts_ms = {_shift_sql('ts_ms', low, high, to_utc)} WHERE id > ? AND id <= ?"
+        for start in range(0, last_id, COPY_CHUNK):
+            execute("BEGIN")
+            execute(update_sql, (start, start + COPY_CHUNK))
+            execute("COMMIT")
+    if not markers:
+        return
+    low, high = execute(f"SELECT MIN(last_event_id), MAX(last_event_id) FROM rollup_state WHERE {MARKERS_WHERE}").fetchone()
+    if low is not None:
+        execute(f"UPDATE rollup_state SET last_event_id = {_shift_sql('last_event_id', low, high, to_utc)} "
+                f"WHERE {MARKERS_WHERE}")
+
+
+def _shard_paths():
+    """Monthly shard files (services/shards.py) next to the database, or in SHARD_DIR."""
+    directory = os.getenv("SHARD_DIR") or op.get_bind().engine.url.database + ".shards"
+    return sorted(glob.glob(os.path.join(directory, "usage_events_????-??.db")))
+
+
+def _migrate(to_utc):
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        _convert(bind.exec_driver_sql, to_utc, markers=True)
+    # Shard months are counted on usage_events.day, which stays as it is
+    for path in _shard_paths():
+        conn = sqlite3.connect(path, isolation_level=None)
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode | stat.S_IWUSR)
+        try:
+            _convert(conn.execute, to_utc)
+        finally:
+            os.chmod(path, stat.S_IMODE(mode))
+            conn.close()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ts_ms held naive server time read as UTC; day already is the local calendar day
+    _migrate(to_utc=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _migrate(to_utc=False)
@@ -0,0 +1,36 @@
+"""incremental auto_vacuum for retention
+
+Revision ID: 9c1e5b7d3a42
+Revises: a6d2f91c4e73
+Create Date: 2026-10-17 23:12:07.540918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e5b7d3a42'
+down_revision: Union[str, Sequence[str], None] = 'a6d2f91c4e73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _set_auto_vacuum(mode):
+    # Switching to or from NONE on a database with tables only takes effect after a
+    # full VACUUM, which can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(f"PRAGMA auto_vacuum={mode}")
+        op.execute("VACUUM")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lets the retention job return pages freed by its deletes with PRAGMA incremental_vacuum
+    _set_auto_vacuum('INCREMENTAL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _set_auto_vacuum('NONE')
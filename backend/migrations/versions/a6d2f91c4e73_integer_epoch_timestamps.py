@@ -0,0 +1,150 @@
+"""integer epoch-ms timestamps on usage_events
+
+Revision ID: a6d2f91c4e73
+Revises: f3a9c6e1d204
+Create Date: 2026-10-17 21:05:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2f91c4e73'
+down_revision: Union[str, Sequence[str], None] = 'f3a9c6e1d204'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_CHUNK = 50000
+
+# Columns carried over unchanged, in table order around the timestamp
+LEADING_COLUMNS = ('id', 'user_id', 'event_id', 'event_type_id')
+TRAILING_COLUMNS = ('domain_id', 'url_id', 'duration', 'extension_version_id', 'browser_id',
+                    'snippet_opt_in', 'snippet_text', 'behavior_json', 'vision_json',
+                    'sentiment', 'content_type', 'doom_score', 'scroll_score', 'model_version')
+
+# Naive ISO strings are read as UTC, matching services.ingest.epoch_ms
+ISO_TO_MS = "CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)"
+MS_TO_ISO = "strftime('%Y-%m-%dT%H:%M:%f', ts_ms / 1000.0, 'unixepoch')"
+
+VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS usage_events_v AS
+SELECT
+    e.id, e.user_id, e.event_id, t.name AS event_type, {timestamp_columns},
+    d.name AS domain, u.name AS url,
+    e.duration, v.name AS extension_version, b.name AS browser,
+    e.snippet_opt_in, e.snippet_text, e.behavior_json, e.vision_json,
+    e.sentiment, e.content_type, e.doom_score, e.scroll_score, e.model_version
+FROM usage_events e
+JOIN event_types t ON t.id = e.event_type_id
+JOIN domains d ON d.id = e.domain_id
+LEFT JOIN urls u ON u.id = e.url_id
+LEFT JOIN extension_versions v ON v.id = e.extension_version_id
+LEFT JOIN browsers b ON b.id = e.browser_id
+"""
+
+
+def _create_table(name, timestamp_columns):
+    op.create_table(
+        name,
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('event_id', sa.String(length=64), nullable=True),
+        sa.Column('event_type_id', sa.Integer(), nullable=False),
+        *timestamp_columns,
+        sa.Column('domain_id', sa.Integer(), nullable=False),
+        sa.Column('url_id', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('extension_version_id', sa.Integer(), nullable=True),
+        sa.Column('browser_id', sa.Integer(), nullable=True),
+        sa.Column('snippet_opt_in', sa.Integer(), nullable=True),
+        sa.Column('snippet_text', sa.Text(), nullable=True),
+        sa.Column('behavior_json', sa.Text(), nullable=True),
+        sa.Column('vision_json', sa.Text(), nullable=True),
+        sa.Column('sentiment', sa.String(length=16), nullable=True),
+        sa.Column('content_type', sa.String(length=32), nullable=True),
+        sa.Column('doom_score', sa.Float(), nullable=True),
+        sa.Column('scroll_score', sa.Float(), nullable=True),
+        sa.Column('model_version', sa.String(length=64), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['event_type_id'], ['event_types.id']),
+        sa.ForeignKeyConstraint(['domain_id'], ['domains.id']),
+        sa.ForeignKeyConstraint(['url_id'], ['urls.id']),
+        sa.ForeignKeyConstraint(['extension_version_id'], ['extension_versions.id']),
+        sa.ForeignKeyConstraint(['browser_id'], ['browsers.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def _copy_in_chunks(target, timestamp_columns, timestamp_select):
+    """Copy usage_events into `target` in id ranges, converting the timestamp column(s)."""
+    columns = ', '.join(LEADING_COLUMNS + timestamp_columns + TRAILING_COLUMNS)
+    insert_sql = f"""
+        INSERT INTO {target} ({columns})
+        SELECT {', '.join(LEADING_COLUMNS)}, {timestamp_select}, {', '.join(TRAILING_COLUMNS)}
+        FROM usage_events
+        WHERE id > ? AND id <= ?
+    """
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        high = bind.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM usage_events").scalar()
+        low = 0
+        while low < high:
+            bind.exec_driver_sql("BEGIN")
+            bind.exec_driver_sql(insert_sql, (low, low + COPY_CHUNK))
+            bind.exec_driver_sql("COMMIT")
+            low += COPY_CHUNK
+
+
+def _create_indexes(time_column, user_time_index):
+    op.create_index('ix_usage_events_user_id', 'usage_events', ['user_id'], unique=False)
+    op.create_index(f'ix_usage_events_{time_column}', 'usage_events', [time_column], unique=False)
+    op.create_index(user_time_index, 'usage_events', ['user_id', time_column], unique=False)
+    op.create_index('idx_usage_domain', 'usage_events', ['domain_id'], unique=False)
+    op.create_index('idx_usage_event_type', 'usage_events', ['event_type_id'], unique=False)
+    op.create_index('uq_usage_user_event_id', 'usage_events', ['user_id', 'event_id'], unique=True)
+    op.create_index(
+        'idx_usage_user_ts_sentiment', 'usage_events',
+        ['user_id', time_column, 'sentiment', 'doom_score'],
+        unique=False, sqlite_where=sa.text('sentiment IS NOT NULL'),
+    )
+
+
+def _swap(timestamp_columns, copy_columns, copy_select, time_column, user_time_index, view_columns):
+    # The view references usage_events, so it has to go before the rename
+    op.execute("DROP VIEW IF EXISTS usage_events_v")
+    _create_table('usage_events_rebuilt', timestamp_columns)
+    _copy_in_chunks('usage_events_rebuilt', copy_columns, copy_select)
+    op.drop_table('usage_events')
+    op.rename_table('usage_events_rebuilt', 'usage_events')
+    _create_indexes(time_column, user_time_index)
+    op.execute(VIEW_SQL.format(timestamp_columns=view_columns))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ids and day boundaries are unchanged, so the rollup watermark and tables stay valid
+    _swap(
+        [sa.Column('ts_ms', sa.Integer(), nullable=False), sa.Column('day', sa.Integer(), nullable=False)],
+        ('ts_ms', 'day'),
+        f"{ISO_TO_MS}, {ISO_TO_MS} / 86400000",
+        'ts_ms',
+        'idx_usage_user_ts_ms',
+        f"{MS_TO_ISO.replace('ts_ms', 'e.ts_ms')} AS timestamp, e.ts_ms, e.day",
+    )
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _swap(
+        [sa.Column('timestamp', sa.DateTime(), nullable=False)],
+        ('timestamp',),
+        MS_TO_ISO,
+        'timestamp',
+        'idx_usage_user_timestamp',
+        "e.timestamp",
+    )
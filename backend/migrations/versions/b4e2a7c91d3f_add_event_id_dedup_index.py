@@ -0,0 +1,32 @@
+"""add event_id dedup index
+
+Revision ID: b4e2a7c91d3f
+Revises: fd9179c217e4
+Create Date: 2026-10-17 09:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e2a7c91d3f'
+down_revision: Union[str, Sequence[str], None] = 'fd9179c217e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Client-generated event id; NULL for legacy rows and clients that don't send one
+    op.add_column('usage_events', sa.Column('event_id', sa.String(length=64), nullable=True))
+    # Backs INSERT ... ON CONFLICT(user_id, event_id) DO NOTHING
+    op.create_index('uq_usage_user_event_id', 'usage_events', ['user_id', 'event_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_usage_user_event_id', table_name='usage_events')
+    op.drop_column('usage_events', 'event_id')
@@ -0,0 +1,35 @@
+"""add rollup_state
+
+Revision ID: c7d31e5a8f20
+Revises: b4e2a7c91d3f
+Create Date: 2026-10-17 11:04:52.718340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d31e5a8f20'
+down_revision: Union[str, Sequence[str], None] = 'b4e2a7c91d3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No row yet means the next rollup run rebuilds sentiment seconds from id 0
+    op.create_table(
+        'rollup_state',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('last_event_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rollup_state')
@@ -0,0 +1,48 @@
+"""add domain_daily_stats and daily_stats.event_count
+
+Revision ID: d52f8b0e6a19
+Revises: c7d31e5a8f20
+Create Date: 2026-10-17 14:26:08.913574
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52f8b0e6a19'
+down_revision: Union[str, Sequence[str], None] = 'c7d31e5a8f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('daily_stats', sa.Column('event_count', sa.Integer(), nullable=True, default=0))
+    op.create_table(
+        'domain_daily_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('domain', sa.String(length=255), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.Column('duration_sum', sa.Integer(), nullable=False),
+        sa.Column('duration_count', sa.Integer(), nullable=False),
+        sa.Column('duration_max', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'date', 'domain', 'event_type', name='uq_domain_daily_key'),
+    )
+    op.create_index('idx_domain_daily_date', 'domain_daily_stats', ['date'], unique=False)
+    # The existing watermark only covers sentiment seconds; drop it so the next run rebuilds everything
+    op.execute("DELETE FROM rollup_state WHERE name = 'daily_stats'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_domain_daily_date', table_name='domain_daily_stats')
+    op.drop_table('domain_daily_stats')
+    op.drop_column('daily_stats', 'event_count')
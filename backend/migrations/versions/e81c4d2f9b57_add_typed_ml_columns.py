@@ -0,0 +1,90 @@
+"""add typed ML columns to usage_events
+
+Revision ID: e81c4d2f9b57
+Revises: d52f8b0e6a19
+Create Date: 2026-10-17 16:48:37.205961
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81c4d2f9b57'
+down_revision: Union[str, Sequence[str], None] = 'd52f8b0e6a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK = 10000
+
+
+def _ml_values(behavior_json):
+    # Same extraction as services.ingest.ml_values, frozen here for the migration
+    try:
+        data = json.loads(behavior_json)
+    except ValueError:
+        return None, None, None, None, None
+    if not isinstance(data, dict):
+        return None, None, None, None, None
+
+    def text(key):
+        return str(data[key]) if data.get(key) is not None else None
+
+    def number(key):
+        try:
+            return float(data[key]) if data.get(key) is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    return text('sentiment'), text('content_type'), number('doom_score'), number('scroll_score'), text('model_version')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('usage_events', sa.Column('sentiment', sa.String(length=16), nullable=True))
+    op.add_column('usage_events', sa.Column('content_type', sa.String(length=32), nullable=True))
+    op.add_column('usage_events', sa.Column('doom_score', sa.Float(), nullable=True))
+    op.add_column('usage_events', sa.Column('scroll_score', sa.Float(), nullable=True))
+    op.add_column('usage_events', sa.Column('model_version', sa.String(length=64), nullable=True))
+
+    # Backfill from behavior_json in id order; each chunk commits on its own so the
+    # write lock is held briefly and an interrupted run can be restarted
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            rows = bind.exec_driver_sql(
+                "SELECT id, behavior_json FROM usage_events "
+                "WHERE id > ? AND behavior_json IS NOT NULL AND sentiment IS NULL "
+                "ORDER BY id LIMIT ?",
+                (last_id, BACKFILL_CHUNK),
+            ).fetchall()
+            if not rows:
+                break
+            bind.exec_driver_sql("BEGIN")
+            bind.exec_driver_sql(
+                "UPDATE usage_events SET sentiment = ?, content_type = ?, doom_score = ?, "
+                "scroll_score = ?, model_version = ? WHERE id = ?",
+                [(*_ml_values(behavior_json), event_id) for event_id, behavior_json in rows],
+            )
+            bind.exec_driver_sql("COMMIT")
+            last_id = rows[-1][0]
+
+    op.create_index(
+        'idx_usage_user_ts_sentiment', 'usage_events',
+        ['user_id', 'timestamp', 'sentiment', 'doom_score'],
+        unique=False, sqlite_where=sa.text('sentiment IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_usage_user_ts_sentiment', table_name='usage_events')
+    op.drop_column('usage_events', 'model_version')
+    op.drop_column('usage_events', 'scroll_score')
+    op.drop_column('usage_events', 'doom_score')
+    op.drop_column('usage_events', 'content_type')
+    op.drop_column('usage_events', 'sentiment')
@@ -0,0 +1,224 @@
+"""dictionary-encode usage_events text columns
+
+Revision ID: f3a9c6e1d204
+Revises: e81c4d2f9b57
+Create Date: 2026-10-17 19:32:14.550827
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c6e1d204'
+down_revision: Union[str, Sequence[str], None] = 'e81c4d2f9b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_CHUNK = 50000
+
+# (lookup table, usage_events text column, name type)
+LOOKUPS = (
+    ('event_types', 'event_type', sa.String(length=50)),
+    ('domains', 'domain', sa.String(length=255)),
+    ('urls', 'url', sa.Text()),
+    ('extension_versions', 'extension_version', sa.String(length=20)),
+    ('browsers', 'browser', sa.String(length=50)),
+)
+
+ML_COLUMNS = ('snippet_opt_in', 'snippet_text', 'behavior_json', 'vision_json',
+              'sentiment', 'content_type', 'doom_score', 'scroll_score', 'model_version')
+
+USAGE_EVENTS_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS usage_events_v AS
+SELECT
+    e.id, e.user_id, e.event_id, t.name AS event_type, e.timestamp, d.name AS domain, u.name AS url,
+    e.duration, v.name AS extension_version, b.name AS browser,
+    e.snippet_opt_in, e.snippet_text, e.behavior_json, e.vision_json,
+    e.sentiment, e.content_type, e.doom_score, e.scroll_score, e.model_version
+FROM usage_events e
+JOIN event_types t ON t.id = e.event_type_id
+JOIN domains d ON d.id = e.domain_id
+LEFT JOIN urls u ON u.id = e.url_id
+LEFT JOIN extension_versions v ON v.id = e.extension_version_id
+LEFT JOIN browsers b ON b.id = e.browser_id
+"""
+
+
+def _ml_columns():
+    return [
+        sa.Column('snippet_opt_in', sa.Integer(), nullable=True),
+        sa.Column('snippet_text', sa.Text(), nullable=True),
+        sa.Column('behavior_json', sa.Text(), nullable=True),
+        sa.Column('vision_json', sa.Text(), nullable=True),
+        sa.Column('sentiment', sa.String(length=16), nullable=True),
+        sa.Column('content_type', sa.String(length=32), nullable=True),
+        sa.Column('doom_score', sa.Float(), nullable=True),
+        sa.Column('scroll_score', sa.Float(), nullable=True),
+        sa.Column('model_version', sa.String(length=64), nullable=True),
+    ]
+
+
+def _copy_in_chunks(insert_sql):
+    """Run INSERT ... SELECT ... WHERE e.id > ? AND e.id <= ? over usage_events in id ranges."""
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        high = bind.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM usage_events").scalar()
+        low = 0
+        while low < high:
+            bind.exec_driver_sql("BEGIN")
+            bind.exec_driver_sql(insert_sql, (low, low + COPY_CHUNK))
+            bind.exec_driver_sql("COMMIT")
+            low += COPY_CHUNK
+
+
+def _create_indexes(domain_column, event_type_column):
+    op.create_index('ix_usage_events_user_id', 'usage_events', ['user_id'], unique=False)
+    op.create_index('ix_usage_events_timestamp', 'usage_events', ['timestamp'], unique=False)
+    op.create_index('idx_usage_user_timestamp', 'usage_events', ['user_id', 'timestamp'], unique=False)
+    op.create_index('idx_usage_domain', 'usage_events', [domain_column], unique=False)
+    op.create_index('idx_usage_event_type', 'usage_events', [event_type_column], unique=False)
+    op.create_index('uq_usage_user_event_id', 'usage_events', ['user_id', 'event_id'], unique=True)
+    op.create_index(
+        'idx_usage_user_ts_sentiment', 'usage_events',
+        ['user_id', 'timestamp', 'sentiment', 'doom_score'],
+        unique=False, sqlite_where=sa.text('sentiment IS NOT NULL'),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column, name_type in LOOKUPS:
+        op.create_table(
+            table,
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('name', name_type, nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name'),
+        )
+        op.execute(f"INSERT INTO {table} (name) SELECT DISTINCT {column} FROM usage_events WHERE {column} IS NOT NULL")
+
+    # SQLite can't swap column types in place: copy into a new table (ids preserved,
+    # so the rollup watermark stays valid), then drop and rename
+    op.create_table(
+        'usage_events_encoded',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('event_id', sa.String(length=64), nullable=True),
+        sa.Column('event_type_id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('domain_id', sa.Integer(), nullable=False),
+        sa.Column('url_id', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('extension_version_id', sa.Integer(), nullable=True),
+        sa.Column('browser_id', sa.Integer(), nullable=True),
+        *_ml_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['event_type_id'], ['event_types.id']),
+        sa.ForeignKeyConstraint(['domain_id'], ['domains.id']),
+        sa.ForeignKeyConstraint(['url_id'], ['urls.id']),
+        sa.ForeignKeyConstraint(['extension_version_id'], ['extension_versions.id']),
+        sa.ForeignKeyConstraint(['browser_id'], ['browsers.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    _copy_in_chunks(f"""
+        INSERT INTO usage_events_encoded
+        (id, user_id, event_id, event_type_id, timestamp, domain_id, url_id, duration,
+         extension_version_id, browser_id, {', '.join(ML_COLUMNS)})
+        SELECT e.id, e.user_id, e.event_id, t.id, e.timestamp, d.id, u.id, e.duration, v.id, b.id,
+               {', '.join('e.' + c for c in ML_COLUMNS)}
+        FROM usage_events e
+        JOIN event_types t ON t.name = e.event_type
+        JOIN domains d ON d.name = e.domain
+        LEFT JOIN urls u ON u.name = e.url
+        LEFT JOIN extension_versions v ON v.name = e.extension_version
+        LEFT JOIN browsers b ON b.name = e.browser
+        WHERE e.id > ? AND e.id <= ?
+    """)
+    op.drop_table('usage_events')
+    op.rename_table('usage_events_encoded', 'usage_events')
+    _create_indexes('domain_id', 'event_type_id')
+    op.execute(USAGE_EVENTS_VIEW_SQL)
+
+    # Derived data: recreate keyed on ids and let the next rollup run rebuild it
+    op.drop_table('domain_daily_stats')
+    op.create_table(
+        'domain_daily_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('domain_id', sa.Integer(), nullable=False),
+        sa.Column('event_type_id', sa.Integer(), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.Column('duration_sum', sa.Integer(), nullable=False),
+        sa.Column('duration_count', sa.Integer(), nullable=False),
+        sa.Column('duration_max', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['domain_id'], ['domains.id']),
+        sa.ForeignKeyConstraint(['event_type_id'], ['event_types.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'date', 'domain_id', 'event_type_id', name='uq_domain_daily_key'),
+    )
+    op.create_index('idx_domain_daily_date', 'domain_daily_stats', ['date'], unique=False)
+    op.execute("DELETE FROM rollup_state WHERE name = 'daily_stats'")
+    # Return the pages freed by the old table to the filesystem
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table(
+        'usage_events_decoded',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('event_id', sa.String(length=64), nullable=True),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('domain', sa.String(length=255), nullable=False),
+        sa.Column('url', sa.Text(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('extension_version', sa.String(length=20), nullable=True),
+        sa.Column('browser', sa.String(length=50), nullable=True),
+        *_ml_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    _copy_in_chunks(f"""
+        INSERT INTO usage_events_decoded
+        (id, user_id, event_id, event_type, timestamp, domain, url, duration,
+         extension_version, browser, {', '.join(ML_COLUMNS)})
+        SELECT id, user_id, event_id, event_type, timestamp, domain, url, duration,
+               extension_version, browser, {', '.join(ML_COLUMNS)}
+        FROM usage_events_v e
+        WHERE e.id > ? AND e.id <= ?
+    """)
+    op.execute("DROP VIEW IF EXISTS usage_events_v")
+    op.drop_table('usage_events')
+    op.rename_table('usage_events_decoded', 'usage_events')
+    _create_indexes('domain', 'event_type')
+    op.create_index('ix_usage_events_domain', 'usage_events', ['domain'], unique=False)
+
+    op.drop_table('domain_daily_stats')
+    op.create_table(
+        'domain_daily_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('domain', sa.String(length=255), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.Column('duration_sum', sa.Integer(), nullable=False),
+        sa.Column('duration_count', sa.Integer(), nullable=False),
+        sa.Column('duration_max', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'date', 'domain', 'event_type', name='uq_domain_daily_key'),
+    )
+    op.create_index('idx_domain_daily_date', 'domain_daily_stats', ['date'], unique=False)
+    op.execute("DELETE FROM rollup_state WHERE name = 'daily_stats'")
+
+    for table, _, _ in reversed(LOOKUPS):
+        op.drop_table(table)
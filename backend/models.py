@@ -3,7 +3,7 @@ Database models for Doomscroll Detox
 Simple SQLAlchemy models for tracking user usage
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, JSON, Index, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, JSON, LargeBinary, Index, ForeignKey, UniqueConstraint, text, event, DDL
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -28,43 +28,114 @@ class User(Base):
     enabled = Column(Boolean, default=True)
     monitored_websites = Column(Text, default="[]")  # JSON string of domain names
     analytics_enabled = Column(Boolean, default=True)
+    settings_version = Column(Integer, nullable=False, default=1, server_default=text('1'))  # bumped by each settings save, ETag of GET settings
     
     # Indexes
     __table_args__ = (
         Index('idx_user_last_active', 'last_active'),
     )
 
+class LookupMixin:
+    """Interned string; usage_events stores the integer id instead of repeating the text"""
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+class EventType(LookupMixin, Base):
+    __tablename__ = "event_types"
+    name = Column(String(50), nullable=False, unique=True)
+
+class Domain(LookupMixin, Base):
+    __tablename__ = "domains"
+    name = Column(String(255), nullable=False, unique=True)
+
+class ExtensionVersion(LookupMixin, Base):
+    __tablename__ = "extension_versions"
+    name = Column(String(20), nullable=False, unique=True)
+
+class Browser(LookupMixin, Base):
+    __tablename__ = "browsers"
+    name = Column(String(50), nullable=False, unique=True)
+
+class Snippet(Base):
+    """Snippet text stored once per distinct content, keyed by its hash"""
+    __tablename__ = "snippets"
+    
+    hash = Column(LargeBinary(16), primary_key=True)  # blake2b-128 of the UTF-8 text
+    body = Column(LargeBinary, nullable=False)  # zlib-compressed text
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    refcount = Column(Integer, nullable=False, default=0)  # usage_events rows pointing here, kept by the writer and retention
+    
+    # Indexes
+    __table_args__ = (
+        # Only unreferenced snippets, for the retention sweep
+        Index('idx_snippets_unreferenced', 'hash', sqlite_where=text('refcount = 0')),
+    )
+
 class UsageEvent(Base):
-    """Usage events from the extension"""
+    """Usage events from the extension (read with text columns through usage_events_v)"""
     __tablename__ = "usage_events"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(64), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    event_id = Column(String(64), nullable=True)  # Client-generated id for retry dedup
     
     # Event data
-    event_type = Column(String(50), nullable=False)  # page_view, scroll, focus_alert, etc.
-    timestamp = Column(DateTime, nullable=False, index=True, default=func.now())
-    domain = Column(String(255), nullable=False, index=True)
-    url = Column(Text, nullable=True)
+    event_type_id = Column(Integer, ForeignKey('event_types.id'), nullable=False)  # page_view, scroll, focus_alert, etc.
+    ts_ms = Column(Integer, nullable=False, index=True)  # epoch milliseconds (UTC)
+    day = Column(Integer, nullable=False)  # calendar day of ts_ms in EVENT_TIMEZONE, days since 1970-01-01
+    domain_id = Column(Integer, ForeignKey('domains.id'), nullable=False)
+    url = Column(Text, nullable=True)  # inline, nearly every URL is distinct
     duration = Column(Integer, nullable=True)  # seconds
     
     # Metadata
-    extension_version = Column(String(20), nullable=True)
-    browser = Column(String(50), nullable=True)
+    extension_version_id = Column(Integer, ForeignKey('extension_versions.id'), nullable=True)
+    browser_id = Column(Integer, ForeignKey('browsers.id'), nullable=True)
     
     # ML fields
     snippet_opt_in = Column(Integer, default=0)
-    snippet_text = Column(Text, nullable=True)
+    snippet_hash = Column(LargeBinary(16), ForeignKey('snippets.hash'), nullable=True)  # text in snippets
     behavior_json = Column(Text, nullable=True)
     vision_json = Column(Text, nullable=True)
     
+    # Classifier output, typed copies of behavior_json keys (filled at ingest)
+    sentiment = Column(String(16), nullable=True)  # positive, neutral, negative
+    content_type = Column(String(32), nullable=True)
+    doom_score = Column(Float, nullable=True)
+    scroll_score = Column(Float, nullable=True)
+    model_version = Column(String(64), nullable=True)
+    
     # Indexes
     __table_args__ = (
-        Index('idx_usage_user_timestamp', 'user_id', 'timestamp'),
-        Index('idx_usage_domain', 'domain'),
-        Index('idx_usage_event_type', 'event_type'),
+        Index('idx_usage_user_ts_ms', 'user_id', 'ts_ms'),
+        Index('idx_usage_domain', 'domain_id'),
+        Index('idx_usage_event_type', 'event_type_id'),
+        Index('uq_usage_user_event_id', 'user_id', 'event_id', unique=True),
+        # Covers per-user/day sentiment and doom_score aggregates over classified rows only
+        Index('idx_usage_user_ts_sentiment', 'user_id', 'ts_ms', 'sentiment', 'doom_score',
+              sqlite_where=text('sentiment IS NOT NULL')),
     )
 
+# usage_events with the lookup ids resolved back to text and ts_ms as a UTC ISO timestamp,
+# for ad-hoc SQL and scripts
+USAGE_EVENTS_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS usage_events_v AS
+SELECT
+    e.id, e.user_id, e.event_id, t.name AS event_type,
+    strftime('%Y-%m-%dT%H:%M:%f', e.ts_ms / 1000.0, 'unixepoch') AS timestamp, e.ts_ms, e.day,
+    d.name AS domain, e.url,
+    e.duration, v.name AS extension_version, b.name AS browser,
+    e.snippet_opt_in, nullif(lower(hex(e.snippet_hash)), '') AS snippet_hash, e.behavior_json, e.vision_json,
+    e.sentiment, e.content_type, e.doom_score, e.scroll_score, e.model_version
+FROM usage_events e
+JOIN event_types t ON t.id = e.event_type_id
+JOIN domains d ON d.id = e.domain_id
+LEFT JOIN extension_versions v ON v.id = e.extension_version_id
+LEFT JOIN browsers b ON b.id = e.browser_id
+"""
+
+# DDL statements go through %-formatting, so the strftime patterns are escaped
+event.listen(UsageEvent.__table__, "after_create", DDL(USAGE_EVENTS_VIEW_SQL.replace("%", "%%")))
+event.listen(UsageEvent.__table__, "before_drop", DDL("DROP VIEW IF EXISTS usage_events_v"))
+
 class DailyStats(Base):
     """Daily aggregated statistics"""
     __tablename__ = "daily_stats"
@@ -74,6 +145,7 @@ class DailyStats(Base):
     date = Column(DateTime, nullable=False)  # Date only
     
     # Statistics
+    event_count = Column(Integer, default=0)
     total_time = Column(Integer, default=0)  # seconds
     page_views = Column(Integer, default=0)
     focus_alerts = Column(Integer, default=0)
@@ -90,6 +162,35 @@ class DailyStats(Base):
         UniqueConstraint('user_id', 'date', name='uq_daily_stats_user_date'),
     )
 
+class DomainDailyStats(Base):
+    """Per-domain, per-event-type daily aggregates (maintained by the rollup job)"""
+    __tablename__ = "domain_daily_stats"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(64), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    date = Column(DateTime, nullable=False)  # Date only
+    domain_id = Column(Integer, ForeignKey('domains.id'), nullable=False)
+    event_type_id = Column(Integer, ForeignKey('event_types.id'), nullable=False)
+    
+    event_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Integer, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)  # events with a duration, for averages
+    duration_max = Column(Integer, nullable=True)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_domain_daily_date', 'date'),
+        UniqueConstraint('user_id', 'date', 'domain_id', 'event_type_id', name='uq_domain_daily_key'),
+    )
+
+class RollupState(Base):
+    """High-watermark for incremental rollups over usage_events (and retention progress, see services/retention.py)"""
+    __tablename__ = "rollup_state"
+    
+    name = Column(String(64), primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=0)  # usage_events.id already folded in
+    updated_at = Column(DateTime, default=func.now())
+
 # Utility functions
 def hash_user_id(user_identifier: str) -> str:
     """Create a hashed user ID for privacy"""
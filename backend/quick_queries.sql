@@ -8,8 +8,8 @@ SELECT
     duration,
     strftime('%Y-%m-%d %H:%M', timestamp) as time,
     substr(user_id, 1, 8) as user_short
-FROM usage_events 
-ORDER BY timestamp DESC 
+FROM usage_events_v 
+ORDER BY ts_ms DESC 
 LIMIT 20;
 
 -- 2. User Summary
@@ -31,7 +31,7 @@ SELECT
     ROUND(AVG(duration), 1) as avg_duration,
     MAX(duration) as max_duration,
     SUM(duration) as total_duration_minutes
-FROM usage_events 
+FROM usage_events_v 
 WHERE event_type = 'usage_sync'
 GROUP BY domain
 ORDER BY total_duration_minutes DESC;
@@ -43,7 +43,7 @@ SELECT
     COUNT(DISTINCT user_id) as active_users,
     ROUND(AVG(duration), 1) as avg_duration,
     SUM(duration) as total_minutes
-FROM usage_events 
+FROM usage_events_v 
 WHERE event_type = 'usage_sync'
 GROUP BY DATE(timestamp)
 ORDER BY date DESC
@@ -55,6 +55,6 @@ SELECT
     COUNT(*) as count,
     COUNT(DISTINCT user_id) as unique_users,
     ROUND(AVG(duration), 1) as avg_duration
-FROM usage_events 
+FROM usage_events_v 
 GROUP BY event_type
 ORDER BY count DESC;
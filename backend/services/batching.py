@@ -0,0 +1,148 @@
+"""
+Async micro-batching for per-request work that is cheaper in bulk.
+
+MicroBatcher collects items submitted by concurrent requests and hands them to
+`run_batch` together, then resolves each caller with its own result. When
+nothing is in flight an item is dispatched at once, so an idle server adds no
+latency. While batches are running, new items wait up to `max_wait_ms` (or until
+`max_batch` of them are queued) for a free slot and go out together. This is
+the same trade the ingest writer makes with its group commits.
+
+Everything runs on the event loop, so no locking is needed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Sequence, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Histogram:
+    """Counts of observed values per bucket; bucket i holds values <= bounds[i], the last one the rest."""
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BOUNDS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+class MicroBatcher(Generic[T, R]):
+    """Coalesces concurrent submit() calls into run_batch(items) calls of up to max_batch items.
+
+    At most `max_inflight` batches run at once (e.g. the classifier's workers).
+    run_batch must return one result per item, in order. If it raises, every
+    caller in that batch gets the exception; if it is cancelled, they are cancelled.
+    """
+
+    def __init__(self, run_batch: Callable[[List[T]], Awaitable[List[R]]], max_batch: int = 32,
+                 max_wait_ms: float = 2.0, max_inflight: int = 1) -> None:
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.max_inflight = max(1, max_inflight)
+        self._pending: List[Tuple[T, asyncio.Future, float]] = []
+        self._inflight = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {"submitted": 0, "batches": 0, "failed_batches": 0}
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BOUNDS)
+
+    async def submit(self, item: T) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        self._stats["submitted"] += 1
+        self._dispatch_ready()
+        return await future
+
+    def _dispatch_ready(self) -> None:
+        while self._pending and self._inflight < self.max_inflight:
+            # Idle: go now. Busy: let more items join until the batch is full or the oldest waited max_wait_ms
+            waited_ms = (time.perf_counter() - self._pending[0][2]) * 1000
+            if self._inflight and len(self._pending) < self.max_batch and waited_ms < self.max_wait_ms:
+                self._arm_timer((self.max_wait_ms - waited_ms) / 1000)
+                return
+            self._dispatch()
+
+    def _arm_timer(self, delay: float) -> None:
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch_ready()
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        # Callers that went away (client disconnected) are dropped before the work is done
+        batch = [entry for entry in batch if not entry[1].cancelled()]
+        if not batch:
+            return
+        now = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((now - enqueued) * 1000)
+        self.batch_sizes.observe(len(batch))
+        self._stats["batches"] += 1
+        self._inflight += 1
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future, float]]) -> None:
+        try:
+            results = await self.run_batch([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items")
+        except asyncio.CancelledError:
+            # Cancelled (shutdown): cancel the callers too instead of leaving them waiting forever
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            self._stats["failed_batches"] += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._inflight -= 1
+            self._dispatch_ready()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({
+            "pending": len(self._pending),
+            "inflight": self._inflight,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+            "max_inflight": self.max_inflight,
+            "batch_size": self.batch_sizes.stats(),
+            "queue_wait_ms": self.queue_wait_ms.stats(),
+        })
+        return stats
@@ -0,0 +1,93 @@
+"""
+Small in-process caches for hot read endpoints.
+
+TTLCache is a bounded LRU whose entries also expire after `ttl_seconds`. It is
+shared between the event loop and the read pool threads, so every operation
+takes a lock; values are meant to be immutable (e.g. serialized responses).
+
+Readers that load a value from the database take a stamp() first and hand it
+to put(). An invalidate() in between (a write committed while the read was in
+flight) makes put() drop the value, so a stale read can't repopulate the cache.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 600.0) -> None:
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidations = 0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0, "stale_puts": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def stamp(self) -> int:
+        """Token for put(): taken before reading the value from its source."""
+        with self._lock:
+            return self._invalidations
+
+    def put(self, key: Hashable, value: Any, stamp: Optional[int] = None) -> bool:
+        """Store value unless something was invalidated since `stamp`; returns whether it was stored."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if stamp is not None and stamp != self._invalidations:
+                self._stats["stale_puts"] += 1
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._invalidations += 1
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidated"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0,
+        })
+        return stats
@@ -0,0 +1,933 @@
+"""
+Event ingestion service: set-based writes for event batches.
+Each batch is written with one executemany per table inside a single transaction.
+
+Writes from request handlers go through IngestQueue: a bounded in-process queue
+drained by one writer thread that group-commits many requests per transaction.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from models import hash_user_id
+from services.shards import ShardSet, day_number, event_day, event_tz, month_of_day, previous_month, schema_name
+
+
+# Row layout produced by build_event_rows / build_columnar_rows. Text values of the
+# LOOKUP_COLUMNS are swapped for integer ids, the ISO timestamp for ts_ms and day, and
+# snippet_text for its snippets.hash by encode_rows just before the insert.
+EVENT_COLUMNS = (
+    "user_id", "event_id", "event_type", "timestamp", "domain", "url", "duration",
+    "extension_version", "browser", "snippet_opt_in", "snippet_text", "behavior_json", "vision_json",
+    "sentiment", "content_type", "doom_score", "scroll_score", "model_version",
+)
+
+# Typed copies of the classifier output kept in behavior_json, in EVENT_COLUMNS order
+ML_COLUMNS = ("sentiment", "content_type", "doom_score", "scroll_score", "model_version")
+_NO_ML = (None,) * len(ML_COLUMNS)
+
+# Dictionary-encoded columns and their lookup tables. url stays inline: nearly every
+# value is new, so a lookup row would only add an index insert per event
+LOOKUP_COLUMNS = {
+    "event_type": "event_types",
+    "domain": "domains",
+    "extension_version": "extension_versions",
+    "browser": "browsers",
+}
+_LOOKUP_POSITIONS = [(EVENT_COLUMNS.index(column), table) for column, table in LOOKUP_COLUMNS.items()]
+_TIMESTAMP_POSITION = EVENT_COLUMNS.index("timestamp")
+_DAY_POSITION = _TIMESTAMP_POSITION + 1  # in encoded rows
+_SNIPPET_POSITION = EVENT_COLUMNS.index("snippet_text")
+_SNIPPET_HASH_POSITION = _SNIPPET_POSITION + 1  # in encoded rows (after ts_ms, day)
+SNIPPET_COMPRESSION_LEVEL = 6
+
+DAY_MS = 86_400_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Retries carrying an already-stored (user_id, event_id) are dropped by the unique
+# index; events without an event_id never conflict (NULLs are distinct). In
+# partitioned mode the index is per shard; _insert_shard_rows checks the previous month.
+EVENT_INSERT_SQL = """
+    INSERT INTO usage_events
+    (user_id, event_id, event_type_id, ts_ms, day, domain_id, url, duration, extension_version_id, browser_id,
+     snippet_opt_in, snippet_hash, behavior_json, vision_json,
+     sentiment, content_type, doom_score, scroll_score, model_version)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, event_id) DO NOTHING
+"""
+# Same insert into an attached monthly shard (STORAGE_MODE=partitioned)
+SHARD_EVENT_INSERT_SQL = EVENT_INSERT_SQL.replace("INTO usage_events", "INTO {schema}.usage_events")
+# Clients retry right away, so only events this many days into a month are also
+# looked up in the previous month's shard
+CROSS_MONTH_DEDUP_DAYS = 1
+
+# Runs before the event insert; write_event_rows then adds the references the batch
+# made, so a snippet only seen on duplicate events stays at refcount 0 until retention
+# removes it
+SNIPPET_INSERT_SQL = """
+    INSERT INTO {schema}.snippets (hash, body, size, refcount) VALUES (?, ?, ?, 0)
+    ON CONFLICT(hash) DO NOTHING
+"""
+# One statement per distinct hash in a batch (retention subtracts the same way)
+SNIPPET_REFERENCE_SQL = "UPDATE {schema}.snippets SET refcount = refcount + ? WHERE hash = ?"
+
+# Creates users on their first event; an existing row (and its settings) is left alone
+USER_INSERT_SQL = """
+    INSERT OR IGNORE INTO users
+    (id, created_at, last_active, daily_limit, break_reminder, focus_mode_enabled, analytics_enabled)
+    VALUES (?, ?, ?, 30, 15, 0, 1)
+"""
+# Only moves last_active forward, so a late flush never overwrites newer activity
+LAST_ACTIVE_UPDATE_SQL = """
+    UPDATE users SET last_active = ?
+    WHERE id = ? AND (last_active IS NULL OR last_active < ?)
+"""
+
+
+def _dumps(value: Optional[Dict[str, Any]]) -> Optional[str]:
+    return json.dumps(value) if value else None
+
+
+def _text(value: Any) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def utc_now() -> str:
+    """Current time as an aware UTC ISO timestamp, the `now` events are stamped with."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def wall_clock(ts: str) -> str:
+    """Naive server-local ISO text for `ts`, the format of users.created_at/last_active."""
+    value = datetime.fromisoformat(ts)
+    return value.astimezone().replace(tzinfo=None).isoformat() if value.tzinfo else ts
+
+
+def epoch_ms(ts: str) -> int:
+    """Milliseconds since 1970-01-01T00:00Z for an ISO timestamp.
+
+    Naive values are wall-clock time in event_tz() (as day keys like day_cutoff()
+    are); an hour repeated by a DST change resolves to its first occurrence, so
+    event times are stamped aware (utc_now) and never go backwards.
+    """
+    value = datetime.fromisoformat(ts)
+    if value.tzinfo is None:
+        zone = event_tz()
+        value = value.replace(tzinfo=zone) if zone is not None else value.astimezone()
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+
+def snippet_hash(text: str) -> bytes:
+    """Content address of a snippet: blake2b-128 of its UTF-8 bytes."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def load_snippets(cursor, hashes: Iterable[bytes], schema: str = "main") -> Dict[bytes, str]:
+    """Decompressed text for the given snippet hashes (missing ones are left out)."""
+    wanted = [h for h in set(hashes) if h is not None]
+    found: Dict[bytes, str] = {}
+    for start in range(0, len(wanted), 500):
+        part = wanted[start:start + 500]
+        cursor.execute(
+            f"SELECT hash, body FROM {schema}.snippets WHERE hash IN ({', '.join('?' * len(part))})", part
+        )
+        for key, body in cursor.fetchall():
+            found[bytes(key)] = zlib.decompress(body).decode("utf-8")
+    return found
+
+
+def ml_values(behavior: Any) -> tuple:
+    """Pull the ML_COLUMNS values out of a behavior_json dict (missing or malformed -> NULL)."""
+    if not isinstance(behavior, dict):
+        return _NO_ML
+    return (
+        _text(behavior.get("sentiment")),
+        _text(behavior.get("content_type")),
+        _number(behavior.get("doom_score")),
+        _number(behavior.get("scroll_score")),
+        _text(behavior.get("model_version")),
+    )
+
+
+def build_event_rows(events: Iterable[Any], now: Optional[str] = None) -> Tuple[List[tuple], List[str]]:
+    """Turn EventData-like objects into insert rows.
+
+    Each distinct raw user id is hashed once per batch.
+
+    Returns:
+        (EVENT_COLUMNS rows, distinct hashed user ids in first-seen order)
+    """
+    now = now or utc_now()
+    hashed: Dict[str, str] = {}
+    rows: List[tuple] = []
+    for event in events:
+        hashed_user_id = hashed.get(event.user_id)
+        if hashed_user_id is None:
+            hashed_user_id = hashed[event.user_id] = hash_user_id(event.user_id)
+        rows.append((
+            hashed_user_id,
+            event.event_id,
+            event.event_type,
+            now,
+            event.domain,
+            event.url,
+            event.duration,
+            event.extension_version,
+            event.browser,
+            int(event.snippet_opt_in or 0),
+            event.snippet_text,
+            _dumps(event.behavior_json),
+            _dumps(event.vision_json),
+            *ml_values(event.behavior_json),
+        ))
+    return rows, list(hashed.values())
+
+
+def build_columnar_rows(batch: Any, now: Optional[str] = None) -> Tuple[List[tuple], List[str]]:
+    """Turn a ColumnarEventBatch-like object into insert rows.
+
+    Shared fields are resolved once; absent optional columns become constant NULLs.
+    """
+    now = now or utc_now()
+    size = len(batch.event_type)
+    if not size:
+        return [], []
+    hashed_user_id = hash_user_id(batch.user_id)
+
+    def column(values, default=None):
+        return values if values is not None else [default] * size
+
+    snippet_opt_in = [int(v or 0) for v in column(batch.snippet_opt_in, 0)]
+    behavior_json = [_dumps(v) for v in column(batch.behavior_json)]
+    vision_json = [_dumps(v) for v in column(batch.vision_json)]
+    if batch.behavior_json is not None:
+        ml_columns = list(zip(*(ml_values(v) for v in batch.behavior_json)))
+    else:
+        ml_columns = [[None] * size] * len(ML_COLUMNS)
+    rows = list(zip(
+        [hashed_user_id] * size,
+        column(batch.event_id),
+        batch.event_type,
+        [now] * size,
+        batch.domain,
+        column(batch.url),
+        column(batch.duration),
+        [batch.extension_version] * size,
+        [batch.browser] * size,
+        snippet_opt_in,
+        column(batch.snippet_text),
+        behavior_json,
+        vision_json,
+        *ml_columns,
+    ))
+    return rows, [hashed_user_id]
+
+
+class LookupCache:
+    """In-process name -> id cache for the lookup tables.
+
+    Ids created or read inside an open transaction are staged and only become
+    visible to later transactions after commit(); rollback() and rollback_to()
+    discard them, so the cache never hands out an id whose row was rolled back.
+    Not thread-safe: one cache per writer thread.
+    """
+
+    def __init__(self, max_entries: int = 100000) -> None:
+        self.max_entries = max_entries
+        self._ids: Dict[str, Dict[str, int]] = {table: {} for table in LOOKUP_COLUMNS.values()}
+        self._staged: Dict[str, Dict[str, int]] = {table: {} for table in LOOKUP_COLUMNS.values()}
+        self._staged_log: List[Tuple[str, str]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, cursor, table: str, names: Iterable[Optional[str]]) -> Dict[str, int]:
+        """Return ids for the given names, inserting any that don't exist yet."""
+        ids, staged = self._ids[table], self._staged[table]
+        result: Dict[str, int] = {}
+        missing: List[str] = []
+        for name in set(names):
+            if name is None:
+                continue
+            found = ids.get(name)
+            if found is None:
+                found = staged.get(name)
+            if found is None:
+                missing.append(name)
+            else:
+                result[name] = found
+        self.hits += len(result)
+        self.misses += len(missing)
+        if missing:
+            cursor.executemany(
+                f"INSERT INTO {table} (name) VALUES (?) ON CONFLICT(name) DO NOTHING",
+                [(name,) for name in missing],
+            )
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                cursor.execute(
+                    f"SELECT name, id FROM {table} WHERE name IN ({', '.join('?' * len(part))})", part
+                )
+                for name, id_ in cursor.fetchall():
+                    result[name] = staged[name] = id_
+                    self._staged_log.append((table, name))
+        return result
+
+    def mark(self) -> int:
+        return len(self._staged_log)
+
+    def rollback_to(self, mark: int) -> None:
+        """Forget ids staged since mark() (the matching SAVEPOINT was rolled back)."""
+        while len(self._staged_log) > mark:
+            table, name = self._staged_log.pop()
+            self._staged[table].pop(name, None)
+
+    def commit(self) -> None:
+        for table, staged in self._staged.items():
+            ids = self._ids[table]
+            if len(ids) + len(staged) > self.max_entries:
+                ids.clear()
+            ids.update(staged)
+            staged.clear()
+        self._staged_log.clear()
+
+    def rollback(self) -> None:
+        self.rollback_to(0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": {table: len(ids) for table, ids in self._ids.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ActivityTracker:
+    """Latest activity time per user, written to users.last_active in batches.
+
+    touch() stages user ids with the batch timestamp; like LookupCache, staged
+    entries only count once their transaction commits. Committed entries are
+    coalesced to one max timestamp per user until take() hands them to a flush.
+    Not thread-safe: owned by the writer thread.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, str] = {}
+        self._staged: List[Tuple[str, str]] = []
+        self.touches = 0
+        self.flushed = 0
+
+    def touch(self, user_ids: Iterable[str], ts: str) -> None:
+        self._staged.extend((user_id, ts) for user_id in user_ids)
+
+    def mark(self) -> int:
+        return len(self._staged)
+
+    def rollback_to(self, mark: int) -> None:
+        del self._staged[mark:]
+
+    def commit(self) -> None:
+        self.touches += len(self._staged)
+        self._merge(self._staged)
+        self._staged.clear()
+
+    def rollback(self) -> None:
+        self._staged.clear()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def take(self) -> List[Tuple[str, str]]:
+        """Remove and return the coalesced (user_id, last_active) pairs."""
+        entries, self._pending = list(self._pending.items()), {}
+        return entries
+
+    def restore(self, entries: Iterable[Tuple[str, str]]) -> None:
+        """Put back entries whose flush failed (newer touches win)."""
+        self._merge(entries)
+
+    def _merge(self, entries: Iterable[Tuple[str, str]]) -> None:
+        pending = self._pending
+        for user_id, ts in entries:
+            if ts > pending.get(user_id, ""):
+                pending[user_id] = ts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending_users": self.pending, "touches": self.touches, "flushed": self.flushed}
+
+
+def update_last_active(cursor, entries: Iterable[Tuple[str, str]]) -> None:
+    """Batch users.last_active = ts for (user_id, ts) pairs, never moving it backwards."""
+    cursor.executemany(LAST_ACTIVE_UPDATE_SQL, [(ts, user_id, ts) for user_id, ts in entries])
+
+
+def encode_rows(cursor, rows: List[tuple], lookups: Optional[LookupCache] = None) -> List[tuple]:
+    """Turn EVENT_COLUMNS-shaped rows into EVENT_INSERT_SQL rows.
+
+    LOOKUP_COLUMNS text values become ids, the ISO timestamp becomes (ts_ms, day) and
+    snippet_text its hash (the text itself is stored by write_event_rows).
+    Without a long-lived `lookups` cache every distinct value is looked up in the database.
+    """
+    if lookups is None:
+        lookups = LookupCache()
+    columns = list(zip(*rows))
+    for position, table in _LOOKUP_POSITIONS:
+        ids = lookups.resolve(cursor, table, columns[position])
+        columns[position] = [ids.get(value) for value in columns[position]]
+    # A batch usually shares one timestamp, so parse each distinct value once
+    millis = {ts: epoch_ms(ts) for ts in set(columns[_TIMESTAMP_POSITION])}
+    days = {ms: event_day(ms) for ms in set(millis.values())}
+    ts_ms = [millis[ts] for ts in columns[_TIMESTAMP_POSITION]]
+    hashes = {text: snippet_hash(text) for text in set(columns[_SNIPPET_POSITION]) if text is not None}
+    columns[_SNIPPET_POSITION] = [hashes.get(text) for text in columns[_SNIPPET_POSITION]]
+    columns[_TIMESTAMP_POSITION:_TIMESTAMP_POSITION + 1] = [ts_ms, [days[ms] for ms in ts_ms]]
+    return list(zip(*columns))
+
+
+def _store_snippets(cursor, schema: str, rows: List[tuple], texts: Dict[bytes, str]) -> None:
+    """Insert the compressed text of every snippet referenced by the encoded rows."""
+    keys = {row[_SNIPPET_HASH_POSITION] for row in rows} - {None}
+    if not keys:
+        return
+    values = []
+    for key in keys:
+        data = texts[key].encode("utf-8")
+        values.append((key, zlib.compress(data, SNIPPET_COMPRESSION_LEVEL), len(data)))
+    cursor.executemany(SNIPPET_INSERT_SQL.format(schema=schema), values)
+
+
+def _stored_keys(cursor, schema: str, rows: List[tuple]) -> set:
+    """(user_id, event_id) keys of `rows` already in schema's usage_events, one query per user."""
+    wanted: Dict[str, set] = {}
+    for row in rows:
+        if row[1] is not None:
+            wanted.setdefault(row[0], set()).add(row[1])
+    stored = set()
+    for user_id, event_ids in wanted.items():
+        event_ids = list(event_ids)
+        for start in range(0, len(event_ids), 500):
+            part = event_ids[start:start + 500]
+            cursor.execute(
+                f"SELECT event_id FROM {schema}.usage_events "
+                f"WHERE user_id = ? AND event_id IN ({', '.join('?' * len(part))})",
+                (user_id, *part),
+            )
+            stored.update((user_id, event_id) for event_id, in cursor.fetchall())
+    return stored
+
+
+def _insert_rows(cursor, schema: str, rows: List[tuple], texts: Dict[bytes, str]) -> int:
+    """Store the snippets, events and snippet references of one schema's rows."""
+    insert_sql = EVENT_INSERT_SQL if schema == "main" else SHARD_EVENT_INSERT_SQL.format(schema=schema)
+    _store_snippets(cursor, schema, rows, texts)
+    hashed = any(row[_SNIPPET_HASH_POSITION] is not None for row in rows)
+    if hashed:
+        # Single writer: every row the insert stores gets an id above this one
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {schema}.usage_events")
+        last_id = cursor.fetchone()[0]
+    # rowcount of executemany sums the rows actually inserted, so duplicates are
+    # counted without a read-before-write
+    accepted = cursor.executemany(insert_sql, rows).rowcount
+    if hashed and accepted:
+        # References come from the rows actually stored, on the rowid range just written
+        cursor.execute(
+            f"SELECT snippet_hash, COUNT(*) FROM {schema}.usage_events "
+            f"WHERE id > ? AND snippet_hash IS NOT NULL GROUP BY snippet_hash",
+            (last_id,),
+        )
+        cursor.executemany(SNIPPET_REFERENCE_SQL.format(schema=schema),
+                           [(count, key) for key, count in cursor.fetchall()])
+    return accepted
+
+
+def _rows_by_month(rows: List[tuple]) -> Dict[str, List[tuple]]:
+    """Group encoded rows by the month of their shard."""
+    months: Dict[int, str] = {}
+    groups: Dict[str, List[tuple]] = {}
+    for row in rows:
+        day = row[_DAY_POSITION]
+        month = months.get(day)
+        if month is None:
+            month = months[day] = month_of_day(day)
+        groups.setdefault(month, []).append(row)
+    return groups
+
+
+def _insert_shard_rows(cursor, rows: List[tuple], texts: Dict[bytes, str], shards: ShardSet) -> int:
+    """Insert rows into their months' shards, oldest month first.
+
+    The unique index only covers one file, so rows from the first
+    CROSS_MONTH_DEDUP_DAYS of a month whose (user_id, event_id) is already in the
+    previous month's shard (a retry that crossed the month boundary) are dropped
+    here when that shard is attached, as it is on the writer.
+    """
+    attached = shards.attached(cursor.connection)
+    accepted = 0
+    for month, part in sorted(_rows_by_month(rows).items()):
+        previous = schema_name(previous_month(month))
+        if previous in attached:
+            carryover_end = day_number(date.fromisoformat(f"{month}-01")) + CROSS_MONTH_DEDUP_DAYS
+            early = [row for row in part if row[_DAY_POSITION] < carryover_end]
+            stored = _stored_keys(cursor, previous, early) if early else None
+            if stored:
+                part = [row for row in part if row[1] is None or (row[0], row[1]) not in stored]
+        accepted += _insert_rows(cursor, schema_name(month), part, texts)
+    return accepted
+
+
+def write_event_rows(
+    cursor,
+    rows: List[tuple],
+    user_ids: List[str],
+    now: str,
+    lookups: Optional[LookupCache] = None,
+    shards: Optional[ShardSet] = None,
+    activity: Optional[ActivityTracker] = None,
+) -> int:
+    """Encode and executemany the prepared rows, then touch each distinct user once.
+
+    With `shards`, rows go to their month's shard, which must already be attached
+    (ShardSet.prepare_writer). New users are created here; last_active of existing
+    ones is left to `activity` to flush later, or updated in place without one.
+
+    Returns:
+        Number of events accepted; the rest were duplicates of stored event_ids.
+    """
+    if not rows:
+        return 0
+    encoded = encode_rows(cursor, rows, lookups)
+    texts = {row[_SNIPPET_HASH_POSITION]: raw[_SNIPPET_POSITION]
+             for raw, row in zip(rows, encoded) if raw[_SNIPPET_POSITION] is not None}
+    if shards is None:
+        accepted = _insert_rows(cursor, "main", encoded, texts)
+    else:
+        # Each shard has its own snippets table, so a month's file is self-contained
+        accepted = _insert_shard_rows(cursor, encoded, texts, shards)
+    now = wall_clock(now)
+    cursor.executemany(USER_INSERT_SQL, [(user_id, now, now) for user_id in user_ids])
+    if activity is None:
+        update_last_active(cursor, [(user_id, now) for user_id in user_ids])
+    else:
+        activity.touch(user_ids, now)
+    return accepted
+
+
+def insert_events(
+    cursor,
+    events: Iterable[Any],
+    now: Optional[str] = None,
+    lookups: Optional[LookupCache] = None,
+    shards: Optional[ShardSet] = None,
+    activity: Optional[ActivityTracker] = None,
+) -> int:
+    """Write a batch of events and touch each distinct user once.
+
+    The caller owns the transaction (commit/rollback). Pass the writer's `lookups`
+    cache to avoid re-reading lookup ids on every batch, its `shards` in
+    partitioned mode and its `activity` tracker to coalesce last_active updates.
+    """
+    now = now or utc_now()
+    rows, user_ids = build_event_rows(events, now)
+    return write_event_rows(cursor, rows, user_ids, now, lookups, shards, activity)
+
+
+def insert_columnar_events(
+    cursor,
+    batch: Any,
+    now: Optional[str] = None,
+    lookups: Optional[LookupCache] = None,
+    shards: Optional[ShardSet] = None,
+    activity: Optional[ActivityTracker] = None,
+) -> int:
+    """Columnar counterpart of insert_events."""
+    now = now or utc_now()
+    rows, user_ids = build_columnar_rows(batch, now)
+    return write_event_rows(cursor, rows, user_ids, now, lookups, shards, activity)
+
+
+# --- NDJSON streaming ---
+
+class GzipTrailingData(ValueError):
+    """Raised when a gzip body continues with bytes that are not another gzip member."""
+
+    def __init__(self) -> None:
+        super().__init__("Trailing data after the last gzip member")
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterable[bytes],
+    gzipped: bool = False,
+    max_line_bytes: int = 1 << 20,
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Split a (possibly gzip-encoded) byte stream into NDJSON lines.
+
+    Yields (line_number, line) with 1-based line numbers. Blank lines are skipped.
+    A line longer than `max_line_bytes` is yielded as None and its remainder
+    discarded, so memory stays bounded by the chunk size plus one line.
+
+    A gzip body may hold several concatenated members (as streaming clients send
+    it); they are decoded in turn as one byte stream. Bytes after a member that do
+    not start another one raise GzipTrailingData; corrupt or truncated members
+    raise zlib.error.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    first_member = True
+    member_output = False
+    buffer = b""
+    line_no = 0
+    overflow = False
+
+    def split(data: bytes):
+        nonlocal buffer, line_no, overflow
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if overflow:
+                overflow = False
+                yield line_no, None
+            elif line.strip():
+                yield line_no, line if len(line) <= max_line_bytes else None
+        if len(buffer) > max_line_bytes:
+            buffer = b""
+            overflow = True
+
+    async for chunk in chunks:
+        if decompressor is None:
+            for item in split(chunk):
+                yield item
+            continue
+        data = chunk
+        while data:
+            if decompressor.eof:
+                # Previous member complete: whatever follows must be the next member
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                first_member = member_output = False
+            try:
+                # Bound each decompression step so a small gzip body can't expand all at once
+                output = decompressor.decompress(data, max_line_bytes)
+            except zlib.error:
+                if not first_member and not member_output:
+                    raise GzipTrailingData() from None
+                raise
+            member_output = member_output or bool(output)
+            for item in split(output):
+                yield item
+            data = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+    if decompressor is not None:
+        for item in split(decompressor.flush()):
+            yield item
+        if not decompressor.eof:
+            if not first_member and not member_output:
+                raise GzipTrailingData()
+            raise zlib.error("Truncated gzip stream")
+    if overflow:
+        yield line_no + 1, None
+    elif buffer.strip():
+        yield line_no + 1, buffer if len(buffer) <= max_line_bytes else None
+
+
+# --- Write-behind queue with group commit ---
+
+class IngestQueueFull(Exception):
+    """Raised when the queue is at capacity; callers should retry later."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Ingestion queue is full")
+        self.retry_after = retry_after
+
+
+class IngestQueueClosed(Exception):
+    """Raised when the writer is not running (not started or shutting down)."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Ingestion queue is not accepting writes")
+        self.retry_after = retry_after
+
+
+_STOP = object()
+
+
+class IngestQueue:
+    """Bounded write queue drained by a single writer thread.
+
+    A job is a callable taking a cursor. The writer pulls up to `max_batch` jobs,
+    waiting at most `max_linger_ms` after the first one, runs each inside its own
+    SAVEPOINT of one transaction and commits once. A failing job is rolled back to
+    its savepoint without affecting the others. Futures resolve after COMMIT.
+
+    `lookups` is the writer's LookupCache; jobs pass it to insert_events so lookup
+    ids survive across transactions. The writer keeps it in step with each
+    savepoint, commit and rollback.
+
+    `shards` (partitioned mode) is attached to the writer connection before each
+    transaction, so jobs passing it to insert_events write into monthly shards.
+
+    `activity` is the writer's ActivityTracker, kept in step the same way. Every
+    `activity_flush_seconds` (and on stop) the writer applies the coalesced
+    last_active values in one transaction of its own.
+
+    Notes:
+        - `connect` is called on the writer thread and must return a connection
+          in autocommit mode (isolation_level=None); transactions are explicit.
+        - stop() stops accepting jobs and drains everything already queued.
+        - If `connect` raises, the writer stops accepting jobs and fails every
+          queued future with that error; start() tries again.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_batch: int = 256,
+        max_linger_ms: float = 5.0,
+        max_size: int = 10000,
+        retry_after: int = 1,
+        shards: Optional[ShardSet] = None,
+        activity_flush_seconds: float = 5.0,
+    ) -> None:
+        self._connect = connect
+        self.shards = shards
+        self.activity_flush_seconds = max(0.0, activity_flush_seconds)
+        self.max_batch = max(1, max_batch)
+        self.max_linger = max(0.0, max_linger_ms) / 1000.0
+        self.max_size = max_size
+        self.retry_after = retry_after
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_size)
+        self.lookups = LookupCache()
+        self.activity = ActivityTracker()
+        self._activity_due = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._accepting = False
+        # Set by stop(): the writer exits once the queue runs dry, even if the
+        # sentinel found the queue full
+        self._stopping = threading.Event()
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "jobs_committed": 0,
+            "jobs_failed": 0,
+            "transactions": 0,
+            "largest_group": 0,
+            "activity_flushes": 0,
+        }
+
+    # Lifecycle
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._accepting = True
+            self._stopping.clear()
+            self._error = None
+            self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting writes and block until queued jobs are committed."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._accepting = False
+            thread = self._thread
+        self._stopping.set()
+        if thread.is_alive():
+            # Lands behind every accepted job; a full queue drains without it
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                pass
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    # Producer side
+    def submit(self, job: Callable[[Any], Any]) -> Future:
+        future: Future = Future()
+        # Check and enqueue under the lock so nothing lands behind the stop sentinel
+        with self._lock:
+            if not self._accepting:
+                raise IngestQueueClosed(self.retry_after)
+            try:
+                self._queue.put_nowait((job, future))
+            except queue.Full:
+                self._stats["rejected"] += 1
+                raise IngestQueueFull(self.retry_after)
+            self._stats["submitted"] += 1
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "queued": self._queue.qsize(),
+            "max_size": self.max_size,
+            "max_batch": self.max_batch,
+            "max_linger_ms": self.max_linger * 1000.0,
+            "running": self.running,
+            "error": self._error,
+            "lookups": self.lookups.stats(),
+            "activity": self.activity.stats(),
+            "avg_group_size": round(stats["jobs_committed"] / stats["transactions"], 2) if stats["transactions"] else 0,
+        })
+        return stats
+
+    # Writer side
+    def _run(self) -> None:
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self._abort(e)
+            return
+        self._activity_due = time.monotonic() + self.activity_flush_seconds
+        try:
+            stopping = False
+            while not stopping:
+                item = self._next_item()
+                if item is None:
+                    self._flush_activity(conn)
+                    continue
+                if item is _STOP:
+                    break
+                group = [item]
+                deadline = time.monotonic() + self.max_linger
+                while len(group) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    group.append(item)
+                self._commit_group(conn, group)
+                if self.activity.pending and time.monotonic() >= self._activity_due:
+                    self._flush_activity(conn)
+            self._flush_activity(conn)
+        finally:
+            conn.close()
+
+    def _abort(self, error: Exception) -> None:
+        """Writer could not start: refuse new jobs and fail the queued ones with `error`."""
+        with self._lock:
+            self._accepting = False
+            self._error = f"{type(error).__name__}: {error}"
+        failed = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                continue
+            _, future = item
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+                failed += 1
+        with self._lock:
+            self._stats["jobs_failed"] += failed
+
+    def _next_item(self) -> Any:
+        """Next queued item; None once an activity flush is due and nothing arrived."""
+        if self._stopping.is_set():
+            try:
+                return self._queue.get_nowait()
+            except queue.Empty:
+                return _STOP
+        if not self.activity.pending:
+            return self._queue.get()
+        try:
+            return self._queue.get(timeout=max(0.0, self._activity_due - time.monotonic()))
+        except queue.Empty:
+            return None
+
+    def _flush_activity(self, conn) -> None:
+        self._activity_due = time.monotonic() + self.activity_flush_seconds
+        entries = self.activity.take()
+        if not entries:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            update_last_active(cursor, entries)
+            cursor.execute("COMMIT")
+        except Exception:
+            # Keep them for the next flush
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self.activity.restore(entries)
+            return
+        self.activity.flushed += len(entries)
+        with self._lock:
+            self._stats["activity_flushes"] += 1
+
+    def _commit_group(self, conn, group: List[Tuple[Callable[[Any], Any], Future]]) -> None:
+        results: List[Tuple[Future, bool, Any]] = []
+        cursor = conn.cursor()
+        try:
+            if self.shards is not None:
+                # ATTACH is not allowed inside the transaction
+                self.shards.prepare_writer(conn)
+            cursor.execute("BEGIN")
+            for job, future in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT ingest_job")
+                mark, activity_mark = self.lookups.mark(), self.activity.mark()
+                try:
+                    results.append((future, True, job(cursor)))
+                    cursor.execute("RELEASE ingest_job")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO ingest_job")
+                    cursor.execute("RELEASE ingest_job")
+                    self.lookups.rollback_to(mark)
+                    self.activity.rollback_to(activity_mark)
+                    results.append((future, False, e))
+            cursor.execute("COMMIT")
+            self.lookups.commit()
+            self.activity.commit()
+        except Exception as e:
+            # Commit (or BEGIN) failed: nothing in this group is durable
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self.lookups.rollback()
+            self.activity.rollback()
+            results = [(future, False, e) for _, future in group if not future.done()]
+
+        committed = sum(1 for _, ok, _ in results if ok)
+        with self._lock:
+            self._stats["transactions"] += 1
+            self._stats["jobs_committed"] += committed
+            self._stats["jobs_failed"] += len(results) - committed
+            self._stats["largest_group"] = max(self._stats["largest_group"], len(group))
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
@@ -1,11 +1,134 @@
 """
-Backend ML service: heuristic classifier for content analysis.
-This will later be replaced with a Hugging Face model. For now, hf_ok=False.
+Backend ML service: classifiers for content analysis.
+
+The lexicon heuristic is always loaded. ML_BACKEND selects the classifier that
+serves traffic, loaded from ML_MODEL_PATH in the background through the
+registry; a Hugging Face backend can be added with register_backend().
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
+import operator
+import os
+import multiprocessing
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Protocol, Sequence, Tuple
+
+from services.cache import TTLCache
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Alternation of `words` factored into a prefix trie, e.g. me|meme|my -> m(?:e(?:me)?|y).
+
+    Each position then costs one branch per distinct next character instead of
+    one per word, and the greedy optional groups make the longest word win.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" not in node:
+            return body
+        return body + "?" if len(branches) == 1 and len(branches[0]) == 1 else "(?:" + body + ")?"
+
+    return build(trie)
+
+
+class _TokenMemo(dict):
+    """token -> lexicon bitmask; a missing token is matched and stored on lookup."""
+
+    def __init__(self, match) -> None:
+        super().__init__()
+        self._match = match
+
+    def __missing__(self, token: str) -> int:
+        return self._match(token)
+
+
+class KeywordMatcher:
+    """Every classifier lexicon compiled into one matcher that runs once per text.
+
+    `keywords` match as substrings, exactly like `keyword in text`. `tokens` match
+    whole whitespace-separated tokens and are counted, like a set lookup over
+    text.split(). A keyword without whitespace can only occur inside a single
+    token. Each distinct token is therefore matched once against one compiled
+    alternation of all those keywords, and its bitmask of lexicon hits is
+    memoized (up to `max_memo` tokens). Keywords with whitespace ("how to") are
+    checked on the whole text. Once the memo is warm, a scan costs one split() and
+    a dict lookup per token, however large the lexicons grow.
+    """
+
+    def __init__(self, keywords: Dict[Hashable, Iterable[str]], tokens: Dict[Hashable, Iterable[str]],
+                 max_memo: int = 50000) -> None:
+        self.bits = {label: 1 << i for i, label in enumerate([*keywords, *tokens])}
+        self.max_memo = max_memo
+        word_masks: Dict[str, int] = {}
+        self._phrases: List[Tuple[str, int]] = []
+        for label, words in keywords.items():
+            for word in words:
+                if word and not any(ch.isspace() for ch in word):
+                    word_masks[word] = word_masks.get(word, 0) | self.bits[label]
+                else:
+                    self._phrases.append((word, self.bits[label]))
+        self._token_masks: Dict[str, int] = {}
+        self._token_lexicons = [(label, self.bits[label]) for label in tokens]
+        for label, words in tokens.items():
+            for word in words:
+                self._token_masks[word] = self._token_masks.get(word, 0) | self.bits[label]
+        # At each position the regex reports the longest keyword starting there,
+        # which implies every keyword that is a prefix of it
+        self._implied = {
+            word: functools.reduce(operator.or_, (mask for other, mask in word_masks.items() if word.startswith(other)), 0)
+            for word in word_masks
+        }
+        self._pattern = re.compile(f"(?=({_trie_regex(word_masks)}))") if word_masks else None
+        self._memo = _TokenMemo(self._match_token)
+
+    def _match_token(self, token: str) -> int:
+        mask = self._token_masks.get(token, 0)
+        if self._pattern is not None:
+            for word in self._pattern.findall(token):
+                mask |= self._implied[word]
+        if len(self._memo) >= self.max_memo:
+            self._memo.clear()
+        self._memo[token] = mask
+        return mask
+
+    def scan(self, lowered: str) -> Tuple[int, Dict[Hashable, int]]:
+        """(bitmask of the lexicons hit, token lexicon label -> count) for already lowercased text."""
+        # One pass over the tokens, inside dict lookups and Counter: only the few
+        # distinct masks reach Python. A token lexicon's count is the number of
+        # tokens whose mask carries its bit
+        masks = collections.Counter(map(self._memo.__getitem__, lowered.split()))
+        mask = 0
+        for hit in masks:
+            mask |= hit
+        for phrase, bit in self._phrases:
+            if not mask & bit and phrase in lowered:
+                mask |= bit
+        counts = {label: sum(n for hit, n in masks.items() if hit & bit)
+                  for label, bit in self._token_lexicons if mask & bit}
+        return mask, counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"memo_tokens": len(self._memo), "max_memo": self.max_memo}
 
 
 class HeuristicClassifier:
@@ -14,10 +137,12 @@ class HeuristicClassifier:
     Notes:
         - Returns scroll_score mirroring doom_score for now
         - Sets hf_ok to False (placeholder for HF integration)
+        - Only the first `max_text_chars` characters of a text are scored
     """
 
-    def __init__(self) -> None:
+    def __init__(self, max_text_chars: int = 10000) -> None:
         self.model_version: str = "heuristic-1.0"
+        self.max_text_chars = max_text_chars
         self.sentiment_lexicon = {
             "positive": {"amazing", "awesome", "great", "love", "best", "excellent", "wonderful", "fantastic", "incredible", "perfect"},
             "negative": {"terrible", "awful", "hate", "worst", "horrible", "disgusting", "stupid", "annoying", "boring", "disappointing"},
@@ -34,40 +159,86 @@ class HeuristicClassifier:
             "medium": {"interesting", "engaging", "compelling", "fascinating"},
             "low": {"boring", "skip", "not interested", "irrelevant"},
         }
+        self.compile_lexicons()
+
+    @classmethod
+    def from_artifact(cls, path: str, max_text_chars: int = 10000) -> "HeuristicClassifier":
+        """Classifier with the lexicons and model_version of a JSON artifact.
+
+        The artifact holds "model_version" and, optionally, "sentiment_lexicon",
+        "content_type_keywords" and "doom_keywords" in the shape of the attributes
+        below. Missing lexicons keep the built-in ones, and the key order of
+        content_type_keywords is their priority.
+        """
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        clf = cls(max_text_chars=max_text_chars)
+        clf.model_version = str(artifact["model_version"])
+        for name in ("sentiment_lexicon", "content_type_keywords", "doom_keywords"):
+            if name in artifact:
+                setattr(clf, name, {label: set(words) for label, words in artifact[name].items()})
+        clf.compile_lexicons()
+        return clf
+
+    def compile_lexicons(self) -> None:
+        """(Re)build the matcher from the lexicons above; call after editing them."""
+        self.matcher = KeywordMatcher(
+            keywords={
+                **{("content_type", ctype): words for ctype, words in self.content_type_keywords.items()},
+                **{("doom", tier): words for tier, words in self.doom_keywords.items()},
+            },
+            tokens={("sentiment", polarity): words for polarity, words in self.sentiment_lexicon.items()},
+        )
+        # Content types in priority order: the first one hit wins
+        self._content_type_bits = [(ctype, self.matcher.bits[("content_type", ctype)]) for ctype in self.content_type_keywords]
+        self._doom_bits = {tier: self.matcher.bits[("doom", tier)] for tier in self.doom_keywords}
 
     def analyze_sentiment(self, text: Optional[str]) -> str:
         if not text:
             return "neutral"
-        words = text.lower().split()
-        pos = sum(1 for w in words if w in self.sentiment_lexicon["positive"])
-        neg = sum(1 for w in words if w in self.sentiment_lexicon["negative"])
+        return self._sentiment(self._scan(text)[1])
+
+    def classify_content_type(self, text: Optional[str], hint: Optional[str]) -> str:
+        if not text:
+            return hint or "unknown"
+        return self._content_type(self._scan(text)[0], hint)
+
+    def calculate_doom_score(self, text: Optional[str], content_type: str, sentiment: str) -> float:
+        if not text:
+            return 0.5
+        return self._doom_score(self._scan(text)[0], content_type, sentiment)
+
+    def normalize_text(self, text: str) -> str:
+        """The part of a text that affects its scores: results depend on nothing else."""
+        return text[: self.max_text_chars].lower()
+
+    # Scoring on one KeywordMatcher scan, shared by the single and batch paths
+    def _scan(self, text: str) -> Tuple[int, Dict[Hashable, int]]:
+        return self.matcher.scan(self.normalize_text(text))
+
+    @staticmethod
+    def _sentiment(counts: Dict[Hashable, int]) -> str:
+        pos = counts.get(("sentiment", "positive"), 0)
+        neg = counts.get(("sentiment", "negative"), 0)
         if pos > neg:
             return "positive"
         if neg > pos:
             return "negative"
         return "neutral"
 
-    def classify_content_type(self, text: Optional[str], hint: Optional[str]) -> str:
-        if not text and hint:
-            return hint
-        if not text:
-            return hint or "unknown"
-        lowered = text.lower()
-        for ctype, keywords in self.content_type_keywords.items():
-            if any(k in lowered for k in keywords):
+    def _content_type(self, mask: int, hint: Optional[str]) -> str:
+        for ctype, bit in self._content_type_bits:
+            if mask & bit:
                 return ctype
         return hint or "unknown"
 
-    def calculate_doom_score(self, text: Optional[str], content_type: str, sentiment: str) -> float:
-        if not text:
-            return 0.5
-        lowered = text.lower()
+    def _doom_score(self, mask: int, content_type: str, sentiment: str) -> float:
         score = 0.5
-        if any(k in lowered for k in self.doom_keywords["high"]):
+        if mask & self._doom_bits["high"]:
             score += 0.3
-        if any(k in lowered for k in self.doom_keywords["medium"]):
+        if mask & self._doom_bits["medium"]:
             score += 0.1
-        if any(k in lowered for k in self.doom_keywords["low"]):
+        if mask & self._doom_bits["low"]:
             score -= 0.2
 
         if content_type in {"short", "reel"}:
@@ -84,25 +255,461 @@ class HeuristicClassifier:
 
         return max(0.0, min(1.0, score))
 
+    def _score(self, text: Optional[str], hint: Optional[str]) -> Tuple[str, str, float]:
+        """(sentiment, content_type, doom_score) from a single scan of the text."""
+        if not text:
+            content_type = hint or "unknown"
+            # calculate_doom_score() ignores the rest of the inputs for empty text
+            return "neutral", content_type, 0.5
+        mask, counts = self._scan(text)
+        sentiment = self._sentiment(counts)
+        content_type = self._content_type(mask, hint)
+        return sentiment, content_type, self._doom_score(mask, content_type, sentiment)
+
     def classify(self, *, visible_text: Optional[str], structured_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         structured_data = structured_data or {}
-        hint = structured_data.get("content_type")
-        sentiment = self.analyze_sentiment(visible_text)
-        content_type = self.classify_content_type(visible_text, hint)
-        doom_score = self.calculate_doom_score(visible_text, content_type, sentiment)
-        doom_score = round(doom_score, 2)
-        return {
-            "sentiment": sentiment,
-            "content_type": content_type,
-            "doom_score": doom_score,
-            "scroll_score": doom_score,
-            "hf_ok": False,
-            "model_version": self.model_version,
-            "timestamp": __import__("time").time(),
-        }
+        return self.classify_batch([(visible_text, structured_data.get("content_type"))])[0]
+
+    def classify_batch(self, items: Sequence[Tuple[Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+        """Classify (visible_text, content_type hint) pairs; results come back in input order.
+
+        Each text is scanned once for all three scores, and the batch shares a
+        single timestamp.
+        """
+        timestamp = time.time()
+        results = []
+        for text, hint in items:
+            sentiment, content_type, doom_score = self._score(text, hint)
+            doom_score = round(doom_score, 2)
+            results.append({
+                "sentiment": sentiment,
+                "content_type": content_type,
+                "doom_score": doom_score,
+                "scroll_score": doom_score,
+                "hf_ok": False,
+                "model_version": self.model_version,
+                "timestamp": timestamp,
+            })
+        return results
+
+
+class Classifier(Protocol):
+    """What the cache, executor and registry need from a classifier backend."""
+
+    model_version: str
+
+    def normalize_text(self, text: str) -> str: ...
+
+    def classify_batch(self, items: Sequence[Tuple[Optional[str], Any]]) -> List[Dict[str, Any]]: ...
+
+
+# Backend name -> loader(model_path, max_text_chars). The heuristic needs no artifact
+BACKENDS: Dict[str, Callable[[Optional[str], int], Classifier]] = {
+    "heuristic": lambda model_path, max_text_chars: HeuristicClassifier(max_text_chars=max_text_chars),
+    "lexicon": lambda model_path, max_text_chars: HeuristicClassifier.from_artifact(model_path, max_text_chars),
+}
+BACKENDS_NEEDING_ARTIFACT = {"lexicon"}
+WARMUP_ITEMS = [
+    ("Breaking news: the update everyone is talking about", "news"),
+    ("This tutorial is amazing, learn how to cook in 5 minutes", None),
+    ("Endless scrolling again, what a waste time", "short"),
+    ("", None),
+]
+
+
+def register_backend(name: str, loader: Callable[[Optional[str], int], Classifier], needs_artifact: bool = True) -> None:
+    BACKENDS[name] = loader
+    if needs_artifact:
+        BACKENDS_NEEDING_ARTIFACT.add(name)
+
+
+def load_backend(backend: str, model_path: Optional[str], max_text_chars: int) -> Classifier:
+    """Load a backend and run warm-up inference on it; raises if it can't serve traffic."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ML backend {backend!r}; known: {', '.join(sorted(BACKENDS))}")
+    if backend in BACKENDS_NEEDING_ARTIFACT and not model_path:
+        raise ValueError(f"ML backend {backend!r} needs ML_MODEL_PATH")
+    clf = BACKENDS[backend](model_path, max_text_chars)
+    results = clf.classify_batch(WARMUP_ITEMS)
+    if len(results) != len(WARMUP_ITEMS) or any("model_version" not in result for result in results):
+        raise ValueError(f"ML backend {backend!r} failed warm-up")
+    return clf
+
+
+# reload() default for model_path: keep the configured one if the backend stays the same
+_UNSET: Any = object()
+
+
+class ClassifierRegistry:
+    """The classifier serving traffic, loaded in the background and swapped atomically.
+
+    Acts as a Classifier itself. Each call reads the active backend once, so a
+    swap never splits a batch between models and in-flight calls finish on the
+    model they started with. Until the configured backend has loaded and passed
+    warm-up, and whenever a load fails, the heuristic `fallback` serves. Loading
+    runs on a daemon thread, started by start() or by the first classification.
+    """
+
+    def __init__(self, fallback: HeuristicClassifier, backend: str = "heuristic", model_path: Optional[str] = None) -> None:
+        self.fallback = fallback
+        self.backend = backend
+        self.model_path = model_path
+        self._active: Classifier = fallback
+        self._active_spec: Tuple[str, Optional[str]] = ("heuristic", None)
+        self._lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[], None]] = []
+        state = "ready" if (backend, model_path) == self._active_spec else "idle"
+        self._status: Dict[str, Any] = {"state": state, "error": None, "loaded_at": None, "load_ms": None, "swaps": 0}
+
+    # Classifier interface, delegated to the active backend
+    @property
+    def active(self) -> Classifier:
+        if self._loader is None and self._active_spec != (self.backend, self.model_path):
+            self.start()
+        return self._active
+
+    @property
+    def model_version(self) -> str:
+        return self.active.model_version
+
+    def normalize_text(self, text: str) -> str:
+        return self.active.normalize_text(text)
+
+    def classify_batch(self, items: Sequence[Tuple[Optional[str], Any]]) -> List[Dict[str, Any]]:
+        return self.active.classify_batch(items)
+
+    def spec(self) -> Tuple[str, Optional[str]]:
+        """(backend, model_path) of the active classifier, for building it elsewhere (worker processes)."""
+        return self._active_spec
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call `callback` (on the loader thread) after every swap."""
+        self._listeners.append(callback)
+
+    # Loading
+    def start(self) -> bool:
+        """Begin loading the configured backend unless it is already active."""
+        if self._active_spec == (self.backend, self.model_path):
+            return False
+        return self.reload()
+
+    def reload(self, backend: Optional[str] = None, model_path: Optional[str] = _UNSET) -> bool:
+        """Load `backend` from `model_path` (default: the configured ones) in the background.
+
+        A new backend without a `model_path` loads without an artifact, and an
+        explicit None clears the path. A failed load keeps the configured and
+        active spec as they were. Returns False if a load is already running.
+        """
+        with self._lock:
+            if self._loader is not None and self._loader.is_alive():
+                return False
+            # The configured spec changes only once the new backend has loaded and warmed up
+            if model_path is _UNSET:
+                model_path = self.model_path if backend in (None, self.backend) else None
+            spec = (backend if backend is not None else self.backend, model_path)
+            self._status.update(state="loading", error=None)
+            self._loader = threading.Thread(target=self._load, args=spec, name="ml-loader", daemon=True)
+            self._loader.start()
+        return True
+
+    def _load(self, backend: str, model_path: Optional[str]) -> None:
+        started = time.perf_counter()
+        try:
+            if backend == "heuristic":
+                clf: Classifier = self.fallback  # reads no artifact, so the loaded one serves
+            else:
+                clf = load_backend(backend, model_path, self.fallback.max_text_chars)
+        except Exception as e:
+            with self._lock:
+                self._status.update(state="failed", error=f"{type(e).__name__}: {e}")
+            return
+        with self._lock:
+            swapped = clf is not self._active
+            self._active, self._active_spec = clf, (backend, model_path)
+            self.backend, self.model_path = backend, model_path
+            self._status.update(state="ready", loaded_at=datetime.now().isoformat(),
+                                load_ms=round((time.perf_counter() - started) * 1000, 1))
+            if swapped:
+                self._status["swaps"] += 1
+        if swapped:
+            for callback in self._listeners:
+                callback()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        loader = self._loader
+        if loader is not None:
+            loader.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._status)
+            active, (backend, model_path) = self._active, self._active_spec
+        stats.update({
+            "configured": {"backend": self.backend, "model_path": self.model_path},
+            "active": {"backend": backend, "model_path": model_path, "model_version": active.model_version},
+            "fallback": self.fallback.model_version,
+            "backends": sorted(BACKENDS),
+        })
+        return stats
+
+
+def stamped(results: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of `results` sharing one fresh timestamp."""
+    timestamp = time.time()
+    return [dict(result, timestamp=timestamp) for result in results]
+
+
+class ResultCache:
+    """Classifier results keyed by a hash of (text, content_type hint, model_version).
+
+    Feeds repeat the same cards for many users, so most texts have been classified
+    before. The text is keyed the way the classifier reads it (normalize_text(),
+    e.g. truncated and lowercased), and the digest keeps long texts out of the cache. Entries are
+    stored without their timestamp, which is set on every lookup. The cache is
+    cleared when the classifier reports a new model_version.
+    """
+
+    def __init__(self, clf: Classifier, max_entries: int = 50000, ttl_seconds: float = 3600.0) -> None:
+        self.classifier = clf
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._model_version = clf.model_version
+        self._version_changes = 0
+
+    def key(self, text: Optional[str], hint: Any, model_version: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.classifier.normalize_text(text or "").encode("utf-8", "surrogatepass"))
+        digest.update(b"\0" + repr(hint).encode() + b"\0" + model_version.encode())
+        return digest.digest()
+
+    def lookup(self, items: Sequence[Tuple[Optional[str], Any]]) -> Tuple[List[bytes], List[Optional[Dict[str, Any]]]]:
+        """Keys for `items` and their cached results (None where missing)."""
+        model_version = self.classifier.model_version
+        if model_version != self._model_version:
+            self.cache.clear()
+            self._model_version = model_version
+            self._version_changes += 1
+        keys = [self.key(text, hint, model_version) for text, hint in items]
+        return keys, [self.cache.get(key) for key in keys]
+
+    def store(self, key: bytes, result: Dict[str, Any]) -> None:
+        # A result from another model version (swapped mid-flight, fallback) isn't cached
+        if result["model_version"] == self._model_version:
+            self.cache.put(key, {k: v for k, v in result.items() if k != "timestamp"})
+
+    def classify_batch(self, items: Sequence[Tuple[Optional[str], Any]]) -> List[Dict[str, Any]]:
+        """classify_batch() on the classifier for the items not cached; results in input order."""
+        keys, results = self.lookup(items)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, self.classifier.classify_batch([items[i] for i in missing])):
+                results[i] = result
+                self.store(keys[i], result)
+        return stamped(results)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        stats.update({"model_version": self._model_version, "version_changes": self._version_changes})
+        return stats
+
+
+# The heuristic is always loaded: it serves until ML_BACKEND is ready and as the fallback
+classifier = HeuristicClassifier(max_text_chars=int(os.getenv("ML_MAX_TEXT_CHARS", "10000")))
+registry = ClassifierRegistry(classifier, backend=os.getenv("ML_BACKEND", "heuristic"),
+                              model_path=os.getenv("ML_MODEL_PATH") or None)
+result_cache = ResultCache(
+    registry,
+    max_entries=int(os.getenv("ML_CACHE_SIZE", "50000")),
+    ttl_seconds=float(os.getenv("ML_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+# Process pool workers: each loads and warms up its own copy of the active backend
+_worker_classifier: Optional[Classifier] = None
+
+
+def _init_worker(backend: str, model_path: Optional[str], max_text_chars: int) -> None:
+    global _worker_classifier
+    _worker_classifier = load_backend(backend, model_path, max_text_chars)
+
+
+def _classify_in_worker(items: List[Tuple[Optional[str], Any]]) -> List[Dict[str, Any]]:
+    return _worker_classifier.classify_batch(items)
+
+
+class InferenceUnavailable(Exception):
+    """Raised when the executor is saturated and the batch is too large to score inline."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Classifier is saturated; retry later")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Runs classification inline on the event loop, on a thread pool or on a process pool.
+
+    Cached results are served from `cache` on the event loop and only the misses
+    are submitted. At most `max_pending` batches are in the pool, queued or
+    running. A batch beyond that limit, one still unfinished after
+    `timeout_seconds`, or one whose process pool broke is scored inline by the
+    heuristic `fallback`, so callers degrade instead of queueing or failing.
+    That inline work runs on the event loop, so only requests of up to
+    `fallback_max_items` texts get it; larger ones raise InferenceUnavailable.
+    The cap is per originating request: a batch coalesced from several small
+    requests (services.batching.MicroBatcher) still degrades as a whole.
+    Process workers load the active backend in an initializer, so nothing but the
+    texts and results crosses the process boundary. When the registry swaps
+    models the process pool is retired: queued and running batches finish on the
+    old workers, and new batches start new workers with the new backend.
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, cache: ResultCache, mode: str = "thread", workers: int = 2, max_pending: int = 64,
+                 timeout_seconds: float = 2.0, fallback: Optional[HeuristicClassifier] = None,
+                 start_method: str = "spawn", fallback_max_items: int = 8, retry_after: int = 1) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"ML executor mode must be one of {', '.join(self.MODES)}, got {mode!r}")
+        self.cache = cache
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout_seconds = timeout_seconds if timeout_seconds > 0 else None
+        self.registry = cache.classifier if isinstance(cache.classifier, ClassifierRegistry) else None
+        self.fallback = fallback or (self.registry.fallback if self.registry else cache.classifier)
+        self.start_method = start_method
+        self.fallback_max_items = max(0, fallback_max_items)
+        self.retry_after = retry_after
+        self._pool: Optional[concurrent.futures.Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"submitted": 0, "completed": 0, "timeouts": 0, "rejected": 0, "broken": 0,
+                       "fallbacks": 0, "unavailable": 0, "retired_pools": 0}
+        if self.registry is not None:
+            self.registry.add_listener(self._on_model_swap)
+
+    def spec(self) -> Tuple[str, Optional[str]]:
+        return self.registry.spec() if self.registry is not None else ("heuristic", None)
+
+    def _on_model_swap(self) -> None:
+        if self.mode != "process":
+            return  # threads and inline calls read the registry's active model per batch
+        with self._lock:
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                self._stats["retired_pools"] += 1
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _make_pool(self) -> concurrent.futures.Executor:
+        if self.mode == "process":
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(*self.spec(), self.fallback.max_text_chars),
+            )
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ml")
+
+    def _submit(self, items: List[Tuple[Optional[str], Any]]) -> Tuple[Optional[concurrent.futures.Future], Any]:
+        """Submit a batch; returns (future, pool), future None when max_pending batches are already in."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                return None, None
+            if self._pool is None:
+                self._pool = self._make_pool()
+            self._pending += 1
+            self._stats["submitted"] += 1
+            pool = self._pool
+        fn = _classify_in_worker if self.mode == "process" else self.cache.classifier.classify_batch
+        try:
+            future = pool.submit(fn, items)
+        except concurrent.futures.BrokenExecutor:
+            self._release(None)
+            self._restart(pool)
+            return None, pool
+        future.add_done_callback(self._release)
+        return future, pool
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._stats["completed"] += 1
+
+    def _restart(self, pool) -> None:
+        """Replace a broken pool (a worker process died) unless another caller already did."""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self._stats["broken"] += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _degrade(self, items: List[Tuple[Optional[str], Any]], request_items: int) -> List[Dict[str, Any]]:
+        """Score `items` with the heuristic on the calling (event loop) thread, if their requests are small."""
+        with self._lock:
+            if request_items > self.fallback_max_items:
+                self._stats["unavailable"] += 1
+                raise InferenceUnavailable(self.retry_after)
+            self._stats["fallbacks"] += 1
+        return self.fallback.classify_batch(items)
+
+    async def _run(self, items: List[Tuple[Optional[str], Any]], request_items: int) -> List[Dict[str, Any]]:
+        if self.mode == "inline":
+            return self.cache.classifier.classify_batch(items)
+        future, pool = self._submit(items)
+        if future is None:
+            return self._degrade(items, request_items)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            return self._degrade(items, request_items)
+        except concurrent.futures.BrokenExecutor:
+            self._restart(pool)
+            return self._degrade(items, request_items)
+
+    async def classify(self, payloads: Sequence[Dict[str, Any]],
+                       request_items: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Async classify_contents(): results are in the order of `payloads`.
+
+        `request_items` is the size of the largest request `payloads` were
+        coalesced from, which the fallback cap applies to (default: one request).
+        """
+        items = [_item(payload) for payload in payloads]
+        keys, results = self.cache.lookup(items)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            scored = await self._run([items[i] for i in missing], request_items or len(items))
+            for i, result in zip(missing, scored):
+                results[i] = result
+                self.cache.store(keys[i], result)
+        return stamped(results)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+        stats.update({
+            "mode": self.mode,
+            "workers": self.workers if self.mode != "inline" else 0,
+            "max_pending": self.max_pending,
+            "timeout_seconds": self.timeout_seconds,
+            "fallback_max_items": self.fallback_max_items,
+        })
+        return stats
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
 
 
-classifier = HeuristicClassifier()
+def _item(payload: Dict[str, Any]) -> Tuple[Optional[str], Any]:
+    return payload.get("visible_text"), (payload.get("structured_data") or {}).get("content_type")
 
 
 def classify_content(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -112,9 +719,9 @@ def classify_content(payload: Dict[str, Any]) -> Dict[str, Any]:
         - visible_text: str | None
         - structured_data: dict | None
     """
-    return classifier.classify(
-        visible_text=payload.get("visible_text"),
-        structured_data=payload.get("structured_data") or {},
-    )
+    return result_cache.classify_batch([_item(payload)])[0]
 
 
+def classify_contents(payloads: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Batch form of classify_content(); results are in the order of `payloads`."""
+    return result_cache.classify_batch([_item(payload) for payload in payloads])
@@ -0,0 +1,374 @@
+"""
+Retention for raw usage_events rows and snippet text.
+
+Rollups (daily_stats, domain_daily_stats) are kept forever. The raw rows they are
+built from are deleted once they are `event_days` old, and their snippet references
+are cleared after `snippet_days`. Both passes walk usage_events in id-range batches,
+committing and pausing between batches so the ingest writer never waits on more than
+one short transaction. Each batch first takes its rows' references off
+snippets.refcount, one UPDATE per distinct hash; snippets left without references are
+then deleted, and PRAGMA incremental_vacuum hands the
+freed pages back to the filesystem.
+
+Only rolled-up rows go, a whole day at a time: the event cutoff is clamped to the
+oldest day that still has rows above the rollup watermark, so a rollup rebuild
+(rollup._reset) can tell rolled-up history from replayable days. The row with the
+highest id is always kept, otherwise SQLite could hand out ids at or below a
+watermark again.
+
+In partitioned mode raw events go a month at a time: a sealed shard is deleted
+once its whole month is past the cutoff. Snippets in shards are cleared like in the
+main table, with sealed shards briefly made writable for it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.ingest import epoch_ms
+from services.rollup import ROLLUP_NAME, day_cutoff, get_watermark, set_watermark, shard_rollup_name
+from services.shards import ShardSet, day_start_ms, event_day, month_of_day
+
+# rollup_state names recording how far snippet references have been cleared. Unlike the rollup
+# watermarks the value is a ts_ms: every row older than it has been cleared
+SNIPPET_MARKER = "retention:snippet_text"
+
+INCREMENTAL = 2  # PRAGMA auto_vacuum value
+VACUUM_STEP_PAGES = 1024
+
+# Row filters of the two passes; _walk binds (low, upper, *params)
+EXPIRED_EVENTS_WHERE = "id > ? AND id <= ? AND ts_ms < ?"
+EXPIRED_SNIPPETS_WHERE = "id > ? AND id <= ? AND ts_ms >= ? AND ts_ms < ? AND snippet_hash IS NOT NULL"
+DELETE_EVENTS_SQL = "DELETE FROM {source}.usage_events WHERE {where}"
+CLEAR_SNIPPETS_SQL = "UPDATE {source}.usage_events SET snippet_hash = NULL WHERE {where}"
+REFERENCES_SQL = """
+    SELECT COUNT(*), snippet_hash FROM {source}.usage_events
+    WHERE {where} AND snippet_hash IS NOT NULL GROUP BY snippet_hash
+"""
+RELEASE_SNIPPETS_SQL = "UPDATE {source}.snippets SET refcount = refcount - ? WHERE hash = ?"
+DELETE_UNREFERENCED_SNIPPETS_SQL = """
+    DELETE FROM {source}.snippets
+    WHERE hash IN (SELECT hash FROM {source}.snippets WHERE refcount = 0 LIMIT ?)
+"""
+
+
+def snippet_marker_name(month: Optional[str] = None) -> str:
+    return f"{SNIPPET_MARKER}:{month}" if month else SNIPPET_MARKER
+
+
+def _size(cursor, schema: str = "main") -> int:
+    cursor.execute(f"PRAGMA {schema}.page_size")
+    page_size = cursor.fetchone()[0]
+    cursor.execute(f"PRAGMA {schema}.page_count")
+    return cursor.fetchone()[0] * page_size
+
+
+def _last_id_before(cursor, source: str, cutoff_ms: int) -> Optional[int]:
+    """id of the newest row older than the cutoff (one seek on the ts_ms index)."""
+    cursor.execute(
+        f"SELECT id FROM {source}.usage_events WHERE ts_ms < ? ORDER BY ts_ms DESC LIMIT 1",
+        (cutoff_ms,),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _release_snippets(cursor, source: str, where: str, params: tuple) -> None:
+    """Take the snippet references of the rows matching `where` off snippets.refcount."""
+    cursor.execute(REFERENCES_SQL.format(source=source, where=where), params)
+    references = cursor.fetchall()
+    if references:
+        cursor.executemany(RELEASE_SNIPPETS_SQL.format(source=source), references)
+
+
+def _walk(conn, source: str, statement: str, where: str, low: int, high: int, params: tuple,
+          batch_size: int, pause_ms: int) -> int:
+    """Run `statement` filtered by `where` over (low, high] in batches of at most batch_size ids.
+
+    The rows' snippet references are released in the same transaction. Returns rows changed.
+    """
+    statement = statement.format(source=source, where=where)
+    cursor = conn.cursor()
+    changed = 0
+    while low < high:
+        # Batches start at the next live id, so ranges emptied by earlier runs are skipped
+        cursor.execute(f"SELECT MIN(id) FROM {source}.usage_events WHERE id > ?", (low,))
+        first = cursor.fetchone()[0]
+        if first is None or first > high:
+            break
+        upper = min(first + batch_size - 1, high)
+        _release_snippets(cursor, source, where, (low, upper, *params))
+        cursor.execute(statement, (low, upper, *params))
+        changed += cursor.rowcount
+        conn.commit()
+        low = upper
+        if pause_ms and low < high:
+            time.sleep(pause_ms / 1000)
+    return changed
+
+
+def _expire_events(conn, cutoff_ms: int, batch_size: int, pause_ms: int) -> int:
+    """Delete rolled-up main.usage_events rows from days before the cutoff."""
+    cursor = conn.cursor()
+    watermark = get_watermark(cursor, ROLLUP_NAME)
+    if watermark is None:
+        return 0  # nothing rolled up yet
+    cursor.execute("SELECT MIN(day) FROM usage_events WHERE id > ?", (watermark,))
+    unrolled = cursor.fetchone()[0]
+    if unrolled is not None:
+        cutoff_ms = min(cutoff_ms, day_start_ms(unrolled))
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM usage_events")
+    newest = cursor.fetchone()[0]
+    high = _last_id_before(cursor, "main", cutoff_ms)
+    if high is None:
+        return 0
+    deleted = _walk(conn, "main", DELETE_EVENTS_SQL, EXPIRED_EVENTS_WHERE, 0, min(high, newest - 1),
+                    (cutoff_ms,), batch_size, pause_ms)
+    # Rows committed a little out of timestamp order can sit above `high`; after the
+    # bulk delete they are all that is left below the cutoff on the ts_ms index
+    stragglers = "ts_ms < ? AND id < ?"
+    _release_snippets(cursor, "main", stragglers, (cutoff_ms, newest))
+    cursor.execute(DELETE_EVENTS_SQL.format(source="main", where=stragglers), (cutoff_ms, newest))
+    deleted += cursor.rowcount
+    conn.commit()
+    return deleted
+
+
+def _snippet_span(conn, source: str, name: str, cutoff_ms: int) -> Optional[Tuple[int, int, int]]:
+    """(since_ms, first id, last id) of the rows that expired since the last run, or None.
+
+    The id span comes from the ts_ms index, so rows committed out of timestamp
+    order are covered too. An empty window just advances the marker.
+    """
+    cursor = conn.cursor()
+    since = get_watermark(cursor, name) or 0
+    if since >= cutoff_ms:
+        return None
+    cursor.execute(
+        f"SELECT MIN(id), MAX(id) FROM {source}.usage_events WHERE ts_ms >= ? AND ts_ms < ?",
+        (since, cutoff_ms),
+    )
+    first, last = cursor.fetchone()
+    if first is None:
+        set_watermark(cursor, cutoff_ms, name)
+        conn.commit()
+        return None
+    return since, first, last
+
+
+def _clear_snippets(conn, source: str, name: str, span: Tuple[int, int, int], cutoff_ms: int,
+                    batch_size: int, pause_ms: int) -> int:
+    since, first, last = span
+    cleared = _walk(conn, source, CLEAR_SNIPPETS_SQL, EXPIRED_SNIPPETS_WHERE, first - 1, last,
+                    (since, cutoff_ms), batch_size, pause_ms)
+    set_watermark(conn.cursor(), cutoff_ms, name)
+    conn.commit()
+    return cleared
+
+
+def _delete_unreferenced(conn, source: str, batch_size: int, pause_ms: int) -> int:
+    """Delete snippets no event points at any more, batch_size per transaction."""
+    cursor = conn.cursor()
+    deleted = 0
+    while True:
+        cursor.execute(DELETE_UNREFERENCED_SNIPPETS_SQL.format(source=source), (batch_size,))
+        deleted += cursor.rowcount
+        conn.commit()
+        if cursor.rowcount < batch_size:
+            return deleted
+        if pause_ms:
+            time.sleep(pause_ms / 1000)
+
+
+def _incremental_vacuum(conn, schema: str = "main", pause_ms: int = 0) -> None:
+    """Truncate the free pages VACUUM_STEP_PAGES at a time, each step its own short write."""
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA {schema}.auto_vacuum")
+    if cursor.fetchone()[0] != INCREMENTAL:
+        return  # pages stay on the freelist for reuse (file predates the auto_vacuum migration)
+    remaining = None
+    while True:
+        cursor.execute(f"PRAGMA {schema}.freelist_count")
+        free = cursor.fetchone()[0]
+        if not free or free == remaining:
+            return
+        remaining = free
+        # The sqlite3 module steps a PRAGMA only once (one page); executescript runs it to completion
+        conn.executescript(f"PRAGMA {schema}.incremental_vacuum({VACUUM_STEP_PAGES});")
+        if pause_ms:
+            time.sleep(pause_ms / 1000)
+
+
+def _expire_shards(conn, shards: ShardSet, event_cutoff_ms: Optional[int], snippet_cutoff_ms: Optional[int],
+                   batch_size: int, pause_ms: int) -> Dict[str, Any]:
+    """Drop shards whose month is past the event cutoff and clear old snippets in the rest."""
+    cursor = conn.cursor()
+    result = {"dropped": [], "snippets_cleared": 0, "snippets_deleted": 0, "bytes_reclaimed": 0}
+    first_kept = month_of_day(event_day(event_cutoff_ms)) if event_cutoff_ms is not None else None
+    last_expired = month_of_day(event_day(snippet_cutoff_ms)) if snippet_cutoff_ms is not None else None
+    for month in shards.months():
+        sealed = shards.is_sealed(month)
+        if (first_kept is not None and month < first_kept and sealed
+                and get_watermark(cursor, shard_rollup_name(month)) is not None):
+            result["bytes_reclaimed"] += shards.drop(month)
+            cursor.execute(
+                "DELETE FROM rollup_state WHERE name IN (?, ?)",
+                (shard_rollup_name(month), snippet_marker_name(month)),
+            )
+            conn.commit()
+            result["dropped"].append(month)
+            continue
+        if last_expired is None or month > last_expired:
+            continue
+
+        name = snippet_marker_name(month)
+        conn.commit()  # ATTACH can't run inside a transaction
+        schema = shards.attach(conn, month)
+        try:
+            span = _snippet_span(conn, schema, name, snippet_cutoff_ms)
+        finally:
+            shards.retain(conn, ())
+        if span is None:
+            continue
+        # A sealed shard is read-only on disk (and attached that way), so lift that and reattach
+        with shards.writable(month) if sealed else nullcontext():
+            schema = shards.attach(conn, month)
+            try:
+                before = _size(cursor, schema)
+                result["snippets_cleared"] += _clear_snippets(
+                    conn, schema, name, span, snippet_cutoff_ms, batch_size, pause_ms)
+                result["snippets_deleted"] += _delete_unreferenced(conn, schema, batch_size, pause_ms)
+                _incremental_vacuum(conn, schema, pause_ms)
+                result["bytes_reclaimed"] += max(before - _size(cursor, schema), 0)
+            finally:
+                conn.commit()
+                shards.retain(conn, ())
+    return result
+
+
+def run_retention(
+    conn,
+    event_days: int,
+    snippet_days: int,
+    batch_size: int = 1000,
+    pause_ms: int = 10,
+    shards: Optional[ShardSet] = None,
+) -> Dict[str, Any]:
+    """Apply the retention policy once; a value of 0 days keeps that data forever.
+
+    Returns the rows deleted, snippet references cleared, unreferenced snippets
+    deleted and bytes given back to the filesystem. Pages freed while auto_vacuum is NONE stay in the file for reuse
+    and show up as free_bytes instead.
+    """
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    event_cutoff_ms = epoch_ms(day_cutoff(event_days)) if event_days else None
+    snippet_cutoff_ms = epoch_ms(day_cutoff(snippet_days)) if snippet_days else None
+    before = _size(cursor)
+
+    result = {"events_deleted": 0, "snippets_cleared": 0}
+    if event_cutoff_ms is not None:
+        result["events_deleted"] = _expire_events(conn, event_cutoff_ms, batch_size, pause_ms)
+    if snippet_cutoff_ms is not None:
+        span = _snippet_span(conn, "main", SNIPPET_MARKER, snippet_cutoff_ms)
+        if span is not None:
+            result["snippets_cleared"] = _clear_snippets(
+                conn, "main", SNIPPET_MARKER, span, snippet_cutoff_ms, batch_size, pause_ms)
+    result["snippets_deleted"] = _delete_unreferenced(conn, "main", batch_size, pause_ms)
+    _incremental_vacuum(conn, pause_ms=pause_ms)
+    result["bytes_reclaimed"] = max(before - _size(cursor), 0)
+    cursor.execute("PRAGMA freelist_count")
+    free_pages = cursor.fetchone()[0]
+    cursor.execute("PRAGMA page_size")
+    result["free_bytes"] = free_pages * cursor.fetchone()[0]
+
+    if shards is not None:
+        result["shards"] = _expire_shards(conn, shards, event_cutoff_ms, snippet_cutoff_ms, batch_size, pause_ms)
+        result["snippets_cleared"] += result["shards"]["snippets_cleared"]
+        result["snippets_deleted"] += result["shards"]["snippets_deleted"]
+        result["bytes_reclaimed"] += result["shards"]["bytes_reclaimed"]
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+class RetentionJob:
+    """Runs run_retention on a background thread every `interval_seconds`."""
+
+    def __init__(
+        self,
+        get_connection: Callable[[], Any],
+        event_days: int = 90,
+        snippet_days: int = 30,
+        interval_seconds: int = 3600,
+        batch_size: int = 1000,
+        pause_ms: int = 10,
+        shards: Optional[ShardSet] = None,
+    ) -> None:
+        self._get_connection = get_connection
+        self.event_days = event_days
+        self.snippet_days = snippet_days
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.pause_ms = pause_ms
+        self.shards = shards
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self.totals = {"events_deleted": 0, "snippets_cleared": 0, "snippets_deleted": 0, "bytes_reclaimed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.event_days or self.snippet_days)
+
+    def run_once(self) -> Dict[str, Any]:
+        conn = self._get_connection()
+        try:
+            result = run_retention(
+                conn, self.event_days, self.snippet_days, self.batch_size, self.pause_ms, self.shards)
+        except Exception:
+            conn.rollback()
+            raise
+        for key in self.totals:
+            self.totals[key] += result[key]
+        self.last_run = {**result, "finished_at": datetime.now().isoformat()}
+        return self.last_run
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._thread is not None or not self.enabled:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the loop and wait for a delete batch in progress to commit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "event_days": self.event_days,
+            "snippet_days": self.snippet_days,
+            "interval_seconds": self.interval_seconds,
+            "batch_size": self.batch_size,
+            "running": self._thread is not None,
+            "totals": dict(self.totals),
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,346 @@
+"""
+Periodic rollup of usage_events into daily_stats and domain_daily_stats.
+
+Runs are incremental: a high-watermark on usage_events.id is persisted in
+rollup_state, and each run only reads rows appended since the previous run.
+Each id-range chunk is aggregated with INSERT ... SELECT ... GROUP BY and applied
+as additive upserts, so run cost scales with new events and nothing is
+materialized in Python.
+
+Readers combine the rolled-up rows with the raw events above the watermark
+(see facts_cte), so results are current without re-aggregating history.
+
+In partitioned mode (services/shards.py) every monthly shard is folded the same
+way with its own watermark, "daily_stats:<YYYY-MM>", next to the one for the
+main usage_events table.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from services.shards import ShardSet, event_day, event_today, schema_name
+
+SECONDS_PER_ANALYSIS = 30
+ROLLUP_NAME = "daily_stats"
+
+DAILY_COLUMNS = (
+    "event_count", "total_time", "page_views", "focus_alerts", "break_reminders",
+    "doom_seconds", "neutral_seconds", "positive_seconds",
+)
+
+# Both upserts aggregate one id range (?, ?] of usage_events inside SQLite, grouping on
+# the integer day and formatting the daily_stats.date key once per group
+ROLLUP_DAILY_SQL = """
+    INSERT INTO daily_stats (user_id, date, {columns})
+    SELECT
+        e.user_id,
+        strftime('%Y-%m-%dT00:00:00', e.day * 86400, 'unixepoch'),
+        COUNT(*),
+        COALESCE(SUM(e.duration), 0),
+        COUNT(CASE WHEN t.name = 'page_view' THEN 1 END),
+        COUNT(CASE WHEN t.name = 'focus_alert' THEN 1 END),
+        COUNT(CASE WHEN t.name = 'break_reminder' THEN 1 END),
+        COUNT(CASE WHEN t.name = 'content_analysis' AND e.sentiment = 'negative' THEN 1 END) * {seconds},
+        COUNT(CASE WHEN t.name = 'content_analysis' AND e.sentiment = 'neutral' THEN 1 END) * {seconds},
+        COUNT(CASE WHEN t.name = 'content_analysis' AND e.sentiment = 'positive' THEN 1 END) * {seconds}
+    FROM {{source}}.usage_events e
+    JOIN event_types t ON t.id = e.event_type_id
+    WHERE e.id > ? AND e.id <= ?
+    GROUP BY e.user_id, e.day
+    ON CONFLICT(user_id, date) DO UPDATE SET
+      {updates}
+""".format(
+    columns=", ".join(DAILY_COLUMNS),
+    seconds=SECONDS_PER_ANALYSIS,
+    updates=",\n      ".join(f"{c} = COALESCE({c}, 0) + excluded.{c}" for c in DAILY_COLUMNS),
+)
+
+ROLLUP_DOMAIN_DAILY_SQL = """
+    INSERT INTO domain_daily_stats
+      (user_id, date, domain_id, event_type_id, event_count, duration_sum, duration_count, duration_max)
+    SELECT
+        user_id,
+        strftime('%Y-%m-%dT00:00:00', day * 86400, 'unixepoch'),
+        domain_id,
+        event_type_id,
+        COUNT(*),
+        COALESCE(SUM(duration), 0),
+        COUNT(duration),
+        MAX(duration)
+    FROM {source}.usage_events
+    WHERE id > ? AND id <= ?
+    GROUP BY user_id, day, domain_id, event_type_id
+    ON CONFLICT(user_id, date, domain_id, event_type_id) DO UPDATE SET
+      event_count = event_count + excluded.event_count,
+      duration_sum = duration_sum + excluded.duration_sum,
+      duration_count = duration_count + excluded.duration_count,
+      duration_max = MAX(COALESCE(duration_max, excluded.duration_max), COALESCE(excluded.duration_max, duration_max))
+"""
+
+# Rolled-up rows up to the watermark plus raw rows above it, in one shape. Reading the
+# watermark inside the statement keeps both halves on the same snapshot, so a rollup
+# run committing mid-query can't double count or drop the tail. The unary + keeps the
+# planner on the rowid range instead of the user/ts_ms indexes. Names are joined
+# in last, once per aggregated row.
+DOMAIN_FACTS_CTE = """
+    WITH fact_ids AS (
+        SELECT user_id, date, domain_id, event_type_id, event_count, duration_sum, duration_count, duration_max
+        FROM domain_daily_stats
+        WHERE date >= :cutoff {user_filter}
+        {tails}
+    ),
+    facts AS (
+        SELECT f.user_id, f.date, d.name AS domain, t.name AS event_type,
+               f.event_count, f.duration_sum, f.duration_count, f.duration_max
+        FROM fact_ids f
+        JOIN domains d ON d.id = f.domain_id
+        JOIN event_types t ON t.id = f.event_type_id
+    )
+"""
+
+# One per event table: main.usage_events and each attached shard
+FACTS_TAIL_SQL = """
+        UNION ALL
+        SELECT user_id, strftime('%Y-%m-%dT00:00:00', day * 86400, 'unixepoch'), domain_id, event_type_id,
+               1, COALESCE(duration, 0), duration IS NOT NULL, duration
+        FROM {source}.usage_events
+        WHERE id > (SELECT COALESCE(MAX(last_event_id), 0) FROM rollup_state WHERE name = '{name}')
+          AND +day >= CAST(strftime('%s', :cutoff) AS INTEGER) / 86400 {user_filter}"""
+
+
+def shard_rollup_name(month: str) -> str:
+    return f"{ROLLUP_NAME}:{month}"
+
+
+def _sources(months: Iterable[str] = ()) -> Iterable[Tuple[str, str]]:
+    """(schema, watermark name) for main.usage_events and the given shard months."""
+    yield "main", ROLLUP_NAME
+    for month in months:
+        yield schema_name(month), shard_rollup_name(month)
+
+
+def facts_cte(user_filter: bool = False, months: Iterable[str] = ()) -> str:
+    """WITH clause exposing `facts`; bind :cutoff (and :user_id when filtered).
+
+    `months` are the shards attached for the window (ShardSet.attach_window).
+    """
+    tail_user_filter = "AND +user_id = :user_id" if user_filter else ""
+    return DOMAIN_FACTS_CTE.format(
+        user_filter="AND user_id = :user_id" if user_filter else "",
+        tails="".join(
+            FACTS_TAIL_SQL.format(source=source, name=name, user_filter=tail_user_filter)
+            for source, name in _sources(months)
+        ),
+    )
+
+
+def day_cutoff(days: int) -> str:
+    """Midnight `days` days ago in event_tz(), in the daily_stats.date format."""
+    return _day_key((event_today() - timedelta(days=days)).isoformat())
+
+
+def get_watermark(cursor, name: str = ROLLUP_NAME) -> Optional[int]:
+    cursor.execute("SELECT last_event_id FROM rollup_state WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(cursor, last_event_id: int, name: str = ROLLUP_NAME) -> None:
+    cursor.execute(
+        """
+        INSERT INTO rollup_state (name, last_event_id, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_event_id = excluded.last_event_id, updated_at = excluded.updated_at
+        """,
+        (name, last_event_id, datetime.now().isoformat()),
+    )
+
+
+def _day_key(ts: Optional[str]) -> str:
+    # daily_stats.date holds the full datetime at midnight
+    day = datetime.fromisoformat(ts).date() if ts else event_today()
+    return day.isoformat() + "T00:00:00"
+
+
+def _first_event_day(conn, shards: Optional[ShardSet] = None) -> Optional[int]:
+    """Oldest day that still has raw events (main table, then the oldest non-empty shard)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(ts_ms) FROM usage_events")
+    firsts = [cursor.fetchone()[0]]
+    for month in shards.months() if shards is not None else ():
+        conn.commit()
+        schema = shards.attach(conn, month)
+        try:
+            cursor.execute(f"SELECT MIN(ts_ms) FROM {schema}.usage_events")
+            first = cursor.fetchone()[0]
+        finally:
+            shards.retain(conn, ())
+        if first is not None:
+            firsts.append(first)
+            break
+    known = [first for first in firsts if first is not None]
+    return event_day(min(known)) if known else None
+
+
+def _reset(cursor, first_day: Optional[int] = None) -> None:
+    """Clear the rollups from `first_day` on, so replaying the raw events rebuilds them.
+
+    Older days are left alone: retention (services/retention.py) has deleted their
+    raw rows, so the rollups are all that is left of them.
+    """
+    since = "" if first_day is None else _day_key((date(1970, 1, 1) + timedelta(days=first_day)).isoformat())
+    cursor.execute(
+        "UPDATE daily_stats SET " + ", ".join(f"{c} = 0" for c in DAILY_COLUMNS) + " WHERE date >= ?",
+        (since,),
+    )
+    cursor.execute("DELETE FROM domain_daily_stats WHERE date >= ?", (since,))
+    # Shard watermarks count towards the same tables
+    cursor.execute("DELETE FROM rollup_state WHERE name LIKE ?", (shard_rollup_name("%"),))
+
+
+def _fold(conn, source: str, name: str, chunk_size: int) -> Tuple[int, int]:
+    """Fold one event table's rows above its watermark; returns (processed, watermark)."""
+    cursor = conn.cursor()
+    daily_sql = ROLLUP_DAILY_SQL.format(source=source)
+    domain_sql = ROLLUP_DOMAIN_DAILY_SQL.format(source=source)
+    watermark = get_watermark(cursor, name) or 0
+
+    # Stop at the rows committed when the run starts instead of chasing the writer
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {source}.usage_events")
+    high = cursor.fetchone()[0]
+
+    processed = 0
+    while watermark < high:
+        # Chunks are id ranges starting at the next live id, so deleted ranges are skipped
+        cursor.execute(f"SELECT MIN(id) FROM {source}.usage_events WHERE id > ?", (watermark,))
+        first = cursor.fetchone()[0] or high
+        next_watermark = min(first + chunk_size - 1, high)
+        cursor.execute(daily_sql, (watermark, next_watermark))
+        cursor.execute(domain_sql, (watermark, next_watermark))
+        cursor.execute(f"SELECT COUNT(*) FROM {source}.usage_events WHERE id > ? AND id <= ?",
+                       (watermark, next_watermark))
+        processed += cursor.fetchone()[0]
+        set_watermark(cursor, next_watermark, name)
+        conn.commit()
+        watermark = next_watermark
+    return processed, watermark
+
+
+def _fold_shards(conn, shards: ShardSet, chunk_size: int) -> Dict[str, Any]:
+    """Fold every shard with unrolled rows, one attached at a time, and seal finished months."""
+    cursor = conn.cursor()
+    processed, watermarks, sealed = 0, {}, []
+    for month in shards.months():
+        name = shard_rollup_name(month)
+        if shards.is_sealed(month) and get_watermark(cursor, name) is not None:
+            continue
+        conn.commit()  # ATTACH can't run inside a transaction
+        schema = shards.attach(conn, month)
+        try:
+            count, watermarks[month] = _fold(conn, schema, name, chunk_size)
+        finally:
+            conn.commit()
+            shards.retain(conn, ())
+        processed += count
+        if shards.sealable(month):
+            try:
+                shards.seal(month)
+                sealed.append(month)
+            except sqlite3.OperationalError:
+                pass  # still open elsewhere in WAL mode; retried on the next run
+    return {"processed_events": processed, "watermarks": watermarks, "sealed": sealed}
+
+
+def run_rollup(conn, chunk_size: int = 5000, shards: Optional[ShardSet] = None) -> Dict[str, Any]:
+    """Fold usage_events rows newer than the watermark into daily_stats and domain_daily_stats.
+
+    The first run (no watermark yet) clears both tables' counters for the days that
+    still have raw events and replays those events once. Each chunk's upserts and the watermark advance commit together, so
+    an interrupted run resumes without double counting. With `shards`, each monthly
+    shard is folded too and finished months are sealed.
+    """
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    rebuilt = get_watermark(cursor) is None
+    if rebuilt:
+        _reset(cursor, _first_event_day(conn, shards))
+        set_watermark(cursor, 0)
+        conn.commit()
+
+    processed, watermark = _fold(conn, "main", ROLLUP_NAME, chunk_size)
+    result = {
+        "processed_events": processed,
+        "watermark": watermark,
+        "rebuilt": rebuilt,
+    }
+    if shards is not None:
+        result["shards"] = _fold_shards(conn, shards, chunk_size)
+        result["processed_events"] += result["shards"]["processed_events"]
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+class RollupJob:
+    """Runs run_rollup on a background thread every `interval_seconds`."""
+
+    def __init__(
+        self,
+        get_connection: Callable[[], Any],
+        interval_seconds: int = 1800,
+        chunk_size: int = 5000,
+        shards: Optional[ShardSet] = None,
+    ) -> None:
+        self._get_connection = get_connection
+        self.interval_seconds = interval_seconds
+        self.chunk_size = chunk_size
+        self.shards = shards
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        conn = self._get_connection()
+        try:
+            result = run_rollup(conn, self.chunk_size, self.shards)
+        except Exception:
+            conn.rollback()
+            raise
+        self.last_run = {**result, "finished_at": datetime.now().isoformat()}
+        return self.last_run
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the loop and wait for a fold in progress to commit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "chunk_size": self.chunk_size,
+            "running": self._thread is not None,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
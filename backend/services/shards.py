@@ -0,0 +1,291 @@
+"""
+Monthly usage_events shard files for STORAGE_MODE=partitioned.
+
+Each calendar month of events lives in its own SQLite file in the shard
+directory, with the same usage_events layout as the main database minus the
+foreign keys (SQLite can't enforce them across files). Connections ATTACH the
+shards they need: the writer the current and previous month, readers only the
+months a query's window overlaps. Rollups keep one watermark per shard.
+
+Once a month is over and fully rolled up its shard is sealed: analyzed,
+vacuumed, switched to a rollback journal, stamped with user_version=1 and
+optionally made read-only on disk. A sealed shard has no rows above its rollup
+watermark, so readers never need to attach it.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import stat
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from zoneinfo import ZoneInfo
+
+from models import UsageEvent
+
+SEALED_USER_VERSION = 1
+SCHEMA_PREFIX = "ev_"
+_FILE_RE = re.compile(r"^usage_events_(\d{4}-\d{2})\.db$")
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+# usage_events and snippets as in models, without the cross-file foreign keys. Each
+# shard keeps the snippets its events reference, so dropping a month drops them too
+SHARD_SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.usage_events (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id VARCHAR(64) NOT NULL,
+        event_id VARCHAR(64),
+        event_type_id INTEGER NOT NULL,
+        ts_ms INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        domain_id INTEGER NOT NULL,
+        url TEXT,
+        duration INTEGER,
+        extension_version_id INTEGER,
+        browser_id INTEGER,
+        snippet_opt_in INTEGER,
+        snippet_hash BLOB,
+        behavior_json TEXT,
+        vision_json TEXT,
+        sentiment VARCHAR(16),
+        content_type VARCHAR(32),
+        doom_score FLOAT,
+        scroll_score FLOAT,
+        model_version VARCHAR(64)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.ix_usage_events_user_id ON usage_events (user_id)",
+    "CREATE INDEX IF NOT EXISTS {schema}.ix_usage_events_ts_ms ON usage_events (ts_ms)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_usage_user_ts_ms ON usage_events (user_id, ts_ms)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_usage_domain ON usage_events (domain_id)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_usage_event_type ON usage_events (event_type_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS {schema}.uq_usage_user_event_id ON usage_events (user_id, event_id)",
+    """
+    CREATE INDEX IF NOT EXISTS {schema}.idx_usage_user_ts_sentiment
+    ON usage_events (user_id, ts_ms, sentiment, doom_score) WHERE sentiment IS NOT NULL
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.snippets (
+        hash BLOB NOT NULL PRIMARY KEY,
+        body BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_snippets_unreferenced ON snippets (hash) WHERE refcount = 0",
+)
+EVENT_TABLE_COLUMNS = ", ".join(column.name for column in UsageEvent.__table__.columns)
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> Optional[ZoneInfo]:
+    return ZoneInfo(name) if name else None  # None: datetime's local time
+
+
+def event_tz() -> Optional[ZoneInfo]:
+    """The zone calendar days (usage_events.day, daily_stats.date keys, shard months) are counted in.
+
+    EVENT_TIMEZONE is an IANA name such as Europe/Berlin; unset means the server's
+    local zone. Read on use rather than at import, so config.env (loaded by db)
+    applies whatever the import order.
+    """
+    return _zone(os.getenv("EVENT_TIMEZONE", ""))
+
+
+def day_number(value: date) -> int:
+    """Days since 1970-01-01, the usage_events.day encoding."""
+    return (value - _EPOCH_DATE).days
+
+
+def event_today() -> date:
+    """Today's date in event_tz()."""
+    return datetime.now(event_tz()).date()
+
+
+def event_day(ts_ms: int) -> int:
+    """usage_events.day of an epoch-ms instant: its calendar day in event_tz()."""
+    return day_number(datetime.fromtimestamp(ts_ms / 1000, event_tz()).date())
+
+
+def day_start_ms(day: int) -> int:
+    """Epoch ms of the midnight that starts `day` in event_tz()."""
+    midnight = datetime.combine(_EPOCH_DATE + timedelta(days=day), datetime.min.time(), event_tz())
+    return round(midnight.timestamp() * 1000)
+
+
+def month_of_day(day: int) -> str:
+    return (_EPOCH_DATE + timedelta(days=day)).strftime("%Y-%m")
+
+
+def schema_name(month: str) -> str:
+    return SCHEMA_PREFIX + month.replace("-", "_")
+
+
+def previous_month(month: str) -> str:
+    year, mon = map(int, month.split("-"))
+    return f"{year - 1}-12" if mon == 1 else f"{year}-{mon - 1:02d}"
+
+
+class ShardSet:
+    """The monthly shard files in one directory and how connections attach them.
+
+    Attachments are per connection; attach() and retain() run outside of a
+    transaction (SQLite can't ATTACH or DETACH inside one).
+    """
+
+    def __init__(self, directory: str, seal_read_only: bool = True, journal_mode: str = "WAL") -> None:
+        self.directory = directory
+        self.seal_read_only = seal_read_only
+        self.journal_mode = journal_mode
+        self._sealed: set = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, month: str) -> str:
+        return os.path.join(self.directory, f"usage_events_{month}.db")
+
+    def months(self) -> List[str]:
+        """Months that have a shard file, oldest first."""
+        found = (_FILE_RE.match(name) for name in os.listdir(self.directory))
+        return sorted(match.group(1) for match in found if match)
+
+    def is_sealed(self, month: str) -> bool:
+        with self._lock:
+            if month in self._sealed:
+                return True
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.path(month))}?mode=ro", uri=True)
+        try:
+            sealed = conn.execute("PRAGMA user_version").fetchone()[0] == SEALED_USER_VERSION
+        finally:
+            conn.close()
+        if sealed:
+            with self._lock:
+                self._sealed.add(month)
+        return sealed
+
+    # Attaching
+    @staticmethod
+    def attached(conn) -> Dict[str, str]:
+        """schema -> file of the shards attached to conn."""
+        return {name: path for _, name, path in conn.execute("PRAGMA database_list")
+                if name.startswith(SCHEMA_PREFIX)}
+
+    def attach(self, conn, month: str, create: bool = False) -> Optional[str]:
+        """Attach a month's shard and return its schema name (None if it doesn't exist)."""
+        schema = schema_name(month)
+        if schema in self.attached(conn):
+            return schema
+        path = self.path(month)
+        if not create and not os.path.exists(path):
+            return None
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        if create:
+            # auto_vacuum only takes effect if set before the first table is created
+            conn.execute(f"PRAGMA {schema}.auto_vacuum=INCREMENTAL")
+            conn.execute(f"PRAGMA {schema}.journal_mode={self.journal_mode}")
+            for statement in SHARD_SCHEMA_SQL:
+                conn.execute(statement.format(schema=schema))
+        return schema
+
+    def retain(self, conn, months: Iterable[str]) -> None:
+        """Detach every shard not in `months`."""
+        keep = {schema_name(month) for month in months}
+        for schema in self.attached(conn):
+            if schema not in keep:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+    def prepare_writer(self, conn, today: Optional[date] = None) -> None:
+        """Attach the current month (created if missing) and the previous one, detach the rest.
+
+        Events are stamped with the current time, so a write lands in the current
+        month or, for a batch straddling midnight at month end, the previous one.
+        """
+        current = month_of_day(day_number(today or event_today()))
+        months = [current]
+        if self.attach(conn, previous_month(current)) is not None:
+            months.append(previous_month(current))
+        self.retain(conn, months)
+        self.attach(conn, current, create=True)
+
+    def attach_window(self, conn, days: int) -> List[str]:
+        """Attach the unsealed shards overlapping the last `days` days; returns their months."""
+        first = month_of_day(day_number(event_today() - timedelta(days=days)))
+        months = [month for month in self.months() if month >= first and not self.is_sealed(month)]
+        self.retain(conn, months)
+        for month in months:
+            self.attach(conn, month)
+        return months
+
+    @staticmethod
+    def window_sql(months: Iterable[str]) -> str:
+        """UNION ALL of main.usage_events and the attached shards, for use as a subquery."""
+        tables = ["main.usage_events"] + [f"{schema_name(month)}.usage_events" for month in months]
+        # Named columns: tables upgraded by migrations don't share the create_all column order
+        return "\nUNION ALL\n".join(f"SELECT {EVENT_TABLE_COLUMNS} FROM {table}" for table in tables)
+
+    # Sealing
+    def sealable(self, month: str, today: Optional[date] = None) -> bool:
+        """True once the writer can no longer touch the month (older than last month)."""
+        current = month_of_day(day_number(today or event_today()))
+        return month < previous_month(current) and not self.is_sealed(month)
+
+    def seal(self, month: str) -> None:
+        """Compact a finished shard and mark it immutable.
+
+        Raises sqlite3.OperationalError while another connection still has the
+        shard open in WAL mode; the caller retries on a later run.
+        """
+        path = self.path(month)
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("ANALYZE")
+            conn.execute("VACUUM")
+            conn.execute(f"PRAGMA user_version={SEALED_USER_VERSION}")
+        finally:
+            conn.close()
+        if self.seal_read_only:
+            os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        with self._lock:
+            self._sealed.add(month)
+
+    @contextmanager
+    def writable(self, month: str) -> Iterator[None]:
+        """Temporarily lift the read-only file mode of a sealed shard (retention scrubs)."""
+        path = self.path(month)
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode | stat.S_IWUSR)
+        try:
+            yield
+        finally:
+            os.chmod(path, mode)
+
+    def drop(self, month: str) -> int:
+        """Delete a shard file (and any -wal/-shm); returns the bytes freed."""
+        freed = 0
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            path = self.path(month) + suffix
+            if os.path.exists(path):
+                freed += os.path.getsize(path)
+                os.remove(path)
+        with self._lock:
+            self._sealed.discard(month)
+        return freed
+
+    def stats(self) -> Dict[str, Any]:
+        months = self.months()
+        sealed = [month for month in months if self.is_sealed(month)]
+        return {
+            "directory": self.directory,
+            "shards": len(months),
+            "sealed": len(sealed),
+            "open": [month for month in months if month not in sealed],
+            "bytes": sum(os.path.getsize(self.path(month)) for month in months),
+        }
@@ -84,6 +84,7 @@ function init() {
             body: JSON.stringify({
               events: [{
                 user_id: 'user_123',
+                event_id: crypto.randomUUID(), // lets the backend drop retried sends
                 event_type: 'content_analysis',
                 domain: window.location.hostname,
                 url: window.location.href,